@@ -0,0 +1,247 @@
+"""asyncio front end for CORSRequestHandler.
+
+Connections are coroutines on one event loop instead of one OS thread
+each. Each request is read off the socket by the loop and then handed,
+already buffered, to CORSRequestHandler running in a bounded thread pool,
+so every route behaves exactly as under the threaded server. Routes that
+block on Claude (pool='claude' in handler.routes) get a pool of their own
+so they cannot starve graph requests. Event stream clients
+(/v1/loop/stream, /v1/tasks/<id>/stream) are plain coroutines draining
+their event hub queue, and followed logs (/v1/tasks/<id>/log?follow=1)
+coroutines polling the file; neither holds a thread while idle.
+"""
+
+import asyncio
+import http.client
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from handler import FOLLOW_INTERVAL, STREAM_CHUNK_BYTES, CORSRequestHandler, routes
+from sse import KEEPALIVE, KEEPALIVE_SECONDS
+
+# Threads serving ordinary requests (graph reads and writes, listings, files)
+REQUEST_WORKERS = int(os.environ.get('GPT_GRAPH_WORKERS', '32'))
+# Threads serving requests that wait on a Claude subprocess
+CLAUDE_WORKERS = int(os.environ.get('GPT_GRAPH_CLAUDE_WORKERS', '4'))
+# Requests queued or running per pool before new ones are turned away with 503
+QUEUE_LIMIT = int(os.environ.get('GPT_GRAPH_QUEUE_LIMIT', '256'))
+
+# Largest request line plus headers accepted
+MAX_HEAD_BYTES = 64 * 1024
+# Writes from a handler are passed to the event loop in pieces of about this size
+WRITE_BUFFER_BYTES = 64 * 1024
+
+
+class _LoopWriter:
+    """wfile for a handler running in a worker thread.
+
+    Buffers writes and hands them to the event loop on flush (or once
+    WRITE_BUFFER_BYTES have accumulated), blocking the worker until the
+    socket has drained, so a slow client slows its own response only.
+    """
+
+    def __init__(self, loop, writer, timeout):
+        self.loop = loop
+        self.writer = writer
+        self.timeout = timeout
+        self._buffer = []
+        self._size = 0
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._size += len(data)
+        if self._size >= WRITE_BUFFER_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer, self._size = [], 0
+        asyncio.run_coroutine_threadsafe(self._send(data), self.loop).result(self.timeout)
+
+    async def _send(self, data):
+        if self.writer.is_closing():
+            raise BrokenPipeError('client disconnected')
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+class _AsyncRequestHandler(CORSRequestHandler):
+    """CORSRequestHandler serving one already-read request from memory."""
+
+    def __init__(self, request_bytes, wfile, client_address, server):
+        self.rfile = io.BytesIO(request_bytes)
+        self.wfile = wfile
+        self.client_address = client_address
+        self.server = server
+        self.close_connection = True
+        self.event_stream = False
+        self.followed_file = None
+
+    def handle_one_request(self):
+        # The body has already been read off the socket, so an unread one is harmless
+        self._body_consumed = True
+        try:
+            super(CORSRequestHandler, self).handle_one_request()
+        finally:
+            # Error responses (send_error) return without flushing
+            self.wfile.flush()
+
+    def handle_expect_100(self):
+        # Answered by the connection coroutine before it read the body
+        return True
+
+    def _serve_event_stream(self):
+        # The connection coroutine takes over once this request returns
+        self.event_stream = True
+        self.close_connection = True
+
+    def _follow_file(self, f, follow_until):
+        # Likewise; the chunked response can be followed by more requests on the connection
+        self.followed_file = (f, follow_until)
+
+
+class AsyncServer:
+    """Serve CORSRequestHandler routes from an asyncio event loop."""
+
+    def __init__(self, host='localhost', port=8765):
+        self.host = host
+        self.port = port
+        self.server_address = (host, port)
+        self.pools = {
+            'requests': ThreadPoolExecutor(REQUEST_WORKERS, thread_name_prefix='request'),
+            'claude': ThreadPoolExecutor(CLAUDE_WORKERS, thread_name_prefix='claude')
+        }
+        self._waiting = {name: 0 for name in self.pools}
+        self.loop = None
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                            limit=MAX_HEAD_BYTES)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), CORSRequestHandler.timeout)
+                except asyncio.LimitOverrunError:
+                    await self._reject(writer, 431, 'Request Header Fields Too Large')
+                    return
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                request_line, _, header_bytes = head.partition(b'\r\n')
+                headers = http.client.parse_headers(io.BytesIO(header_bytes))
+                if 'chunked' in (headers.get('Transfer-Encoding') or '').lower():
+                    await self._reject(writer, 411, 'Length Required')
+                    return
+                try:
+                    length = int(headers.get('Content-Length') or 0)
+                except ValueError:
+                    await self._reject(writer, 400, 'Bad Request')
+                    return
+                if length and (headers.get('Expect') or '').lower() == '100-continue':
+                    writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                body = await reader.readexactly(length) if length else b''
+
+                request = _AsyncRequestHandler(head + body, _LoopWriter(self.loop, writer, CORSRequestHandler.timeout),
+                                               client_address, self)
+                pool = self._pool_for(request_line)
+                if self._waiting[pool] >= QUEUE_LIMIT:
+                    await self._reject(writer, 503, 'Service Unavailable')
+                    return
+                self._waiting[pool] += 1
+                try:
+                    await self.loop.run_in_executor(self.pools[pool], request.handle_one_request)
+                finally:
+                    self._waiting[pool] -= 1
+                if request.event_stream:
+                    await self._stream_events(writer, request.event_hub, request.event_subscriber)
+                    return
+                if request.followed_file:
+                    await self._follow_file(writer, *request.followed_file)
+                if request.close_connection:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, TimeoutError):
+            pass
+        except Exception as e:
+            print(f"Connection error from {client_address[0]}: {e}")
+        finally:
+            writer.close()
+
+    def _pool_for(self, request_line):
+        """The pool named by the route's pool option (e.g. pool='claude'), else 'requests'."""
+        parts = request_line.decode('latin-1').split(' ')
+        if len(parts) < 2:
+            return 'requests'
+        route, _ = routes.match(parts[0], parts[1].split('?', 1)[0])
+        pool = route.options.get('pool') if route is not None else None
+        return pool if pool in self.pools else 'requests'
+
+    async def _reject(self, writer, code, reason):
+        writer.write(f'HTTP/1.1 {code} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n'
+                     f'Access-Control-Allow-Origin: *\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+
+    async def _stream_events(self, writer, hub, subscriber):
+        """Write an event stream subscriber's events until it ends or is dropped."""
+        ready = asyncio.Event()
+
+        def wake():
+            # Called from publishing threads; the loop may already be shutting down
+            try:
+                self.loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass
+
+        subscriber.wake = wake
+        try:
+            while not subscriber.closed:
+                ready.clear()
+                events = subscriber.drain()
+                if not events and subscriber.closed:
+                    break
+                if not events:
+                    try:
+                        await asyncio.wait_for(ready.wait(), KEEPALIVE_SECONDS)
+                        continue
+                    except asyncio.TimeoutError:
+                        events = [KEEPALIVE]
+                writer.write(b''.join(events))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            hub.unsubscribe(subscriber)
+
+    async def _follow_file(self, writer, f, follow_until):
+        """Send what is appended to a followed file as chunks until follow_until() is true."""
+        try:
+            while True:
+                done = follow_until()
+                data = f.read(STREAM_CHUNK_BYTES)
+                if data:
+                    writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    await writer.drain()
+                elif done:
+                    break
+                else:
+                    await asyncio.sleep(FOLLOW_INTERVAL)
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        finally:
+            f.close()
+
+
+def run_async_server(port=8765, host='localhost'):
+    """Block serving on host:port."""
+    AsyncServer(host, port).serve_forever()
@@ -3,9 +3,14 @@
 import json
 import os
 import shutil
+import signal
 import subprocess
 import threading
 import time
+from collections import deque
+
+from sse import EventHub
+from task_scheduler import TaskCancelled, TaskScheduler
 
 # Task persistence - per workspace
 TASKS_DIR = os.path.expanduser("~/.gpt-graph/tasks")
@@ -14,6 +19,22 @@ os.makedirs(TASKS_DIR, exist_ok=True)
 # Track active tasks (flat dict, workspace stored in each task)
 active_tasks = {}  # task_id -> task info
 
+# Status changes and output chunks for /v1/tasks/<id>/stream, published under the task id
+task_events = EventHub()
+
+# Lines of output kept in a task's last_output
+LAST_OUTPUT_LINES = 20
+# Statuses after which a task does not change again
+FINISHED_STATUSES = ('completed', 'failed', 'interrupted', 'cancelled')
+# Seconds a Claude process may run before the watchdog stops it (0: no limit)
+TASK_TIMEOUT = int(os.environ.get('GPT_GRAPH_TASK_TIMEOUT', '1800'))
+# Seconds between asking a task's processes to stop and killing them
+KILL_GRACE_SECONDS = 5
+
+# Claude processes of running tasks, and tasks asked to stop
+_processes = {}  # task_id -> Popen
+_cancelled = set()
+
 
 def _tasks_file(workspace='default'):
     """Get the tasks file path for a workspace."""
@@ -53,8 +74,9 @@ def _load_tasks():
                         workspace_tasks = json.load(f)
                     for task_id, task in workspace_tasks.items():
                         task['workspace'] = workspace
-                        if task.get('status') in ('running', 'starting'):
+                        if task.get('status') in ('queued', 'running', 'starting'):
                             task['status'] = 'interrupted'
+                            task['revision'] = task.get('revision', 0) + 1
                         active_tasks[task_id] = task
                 except Exception as e:
                     print(f"Failed to load tasks from {filepath}: {e}")
@@ -104,10 +126,94 @@ def create_task(task_id: str, task_info: dict):
     # Ensure workspace is set
     if 'workspace' not in task_info:
         task_info['workspace'] = 'default'
+    task_info.setdefault('revision', 0)
     active_tasks[task_id] = task_info
     _save_tasks()
 
 
+def update_task(task_id: str, **fields):
+    """Set fields on a task and bump its revision (clients use it to tell if a task changed).
+
+    A status or queue position change is pushed to the task's stream,
+    which ends once the task has finished. Returns the task, or None if
+    there is no such task.
+    """
+    task = active_tasks.get(task_id)
+    if task is None:
+        return None
+    task.update(fields)
+    task['revision'] = task.get('revision', 0) + 1
+    if 'status' in fields or 'queue_position' in fields:
+        task_events.publish('status', task_view(task), task_id)
+        if task['status'] in FINISHED_STATUSES:
+            task_events.end_topic(task_id)
+    return task
+
+
+def task_finished(task_id):
+    """True if the task has finished or does not exist."""
+    task = active_tasks.get(task_id)
+    return task is None or task.get('status') in FINISHED_STATUSES
+
+
+def task_view(task):
+    """The fields of a task served by /v1/tasks/<id> and its status events."""
+    view = {
+        'id': task['id'],
+        'status': task['status'],
+        'queue_position': task.get('queue_position'),
+        'working_dir': task.get('working_dir'),
+        'output_lines': task.get('output_lines', 0),
+        'last_output': task.get('last_output', ''),
+        'files': task.get('files', []),
+        'created_at': task.get('created_at'),
+        'completed_at': task.get('completed_at'),
+        'error': task.get('error')
+    }
+    if task['status'] == 'completed' and 'result' in task:
+        view['result'] = task['result']
+    return view
+
+
+class _OutputTail:
+    """The last LAST_OUTPUT_LINES lines of a task's output and its line count.
+
+    Keeps what ''.join(texts).split('\n')[-LAST_OUTPUT_LINES:] would give
+    without holding or re-splitting the whole output.
+    """
+
+    def __init__(self):
+        self.lines = deque([''], maxlen=LAST_OUTPUT_LINES)
+        self.count = 1
+
+    def add(self, text):
+        pieces = text.split('\n')
+        self.lines[-1] += pieces[0]
+        self.lines.extend(pieces[1:])
+        self.count += len(pieces) - 1
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+
+def _signal_group(process, sig):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _stop_process(process):
+    """Terminate a task's process group (claude and every tool it started) without waiting.
+
+    Whatever is still alive after KILL_GRACE_SECONDS is killed.
+    """
+    _signal_group(process, signal.SIGTERM)
+    timer = threading.Timer(KILL_GRACE_SECONDS, _signal_group, (process, signal.SIGKILL))
+    timer.daemon = True
+    timer.start()
+
+
 def find_claude_binary() -> str:
     """Find Claude binary path automatically."""
     if 'CLAUDE_BINARY_PATH' in os.environ:
@@ -141,7 +247,7 @@ def call_claude(prompt: str, model: str = "claude-opus-4-6") -> str:
         "--dangerously-skip-permissions"
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.getcwd())
+    result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.getcwd(), timeout=TASK_TIMEOUT or None)
 
     if result.returncode != 0:
         print(f"ERROR: {result.stderr}")
@@ -176,11 +282,10 @@ def execute_claude_task(prompt: str, working_dir: str = None, model: str = "clau
     print(f"{'='*60}")
 
     if task_id and task_id in active_tasks:
-        active_tasks[task_id]['status'] = 'running'
-        active_tasks[task_id]['working_dir'] = cwd
-        active_tasks[task_id]['log_file'] = log_file
-        active_tasks[task_id]['started_at'] = time.time()
+        update_task(task_id, status='running', working_dir=cwd, log_file=log_file, started_at=time.time())
         _save_tasks()
+    if task_id in _cancelled:
+        _finish_cancelled(task_id)
 
     # Write prompt to a temp file to avoid ARG_MAX limits
     prompt_dir = os.path.expanduser("~/claude-projects/.logs")
@@ -218,12 +323,39 @@ def execute_claude_task(prompt: str, working_dir: str = None, model: str = "clau
             stderr=stderr_log,
             cwd=cwd,
             text=True,
-            bufsize=1
+            bufsize=1,
+            # Its own process group, so stopping the task stops the tools claude started too
+            start_new_session=True
         )
+        if task_id:
+            _processes[task_id] = process
+            if task_id in _cancelled:
+                # Cancelled while the process was being started
+                _stop_process(process)
+
+        # A process that keeps streaming never reaches EOF, so the deadline is enforced from outside
+        timed_out = threading.Event()
+
+        def deadline_passed():
+            timed_out.set()
+            print(f"Task {task_id} ran past {TASK_TIMEOUT}s, stopping it")
+            _stop_process(process)
+
+        watchdog = threading.Timer(TASK_TIMEOUT, deadline_passed) if TASK_TIMEOUT > 0 else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
 
         output_texts = []
+        tail = _OutputTail()
         exit_code = None
 
+        def add_output(text):
+            output_texts.append(text)
+            tail.add(text)
+            if task_id:
+                task_events.publish('output', {'text': text, 'output_lines': tail.count}, task_id)
+
         try:
             while True:
                 line = process.stdout.readline()
@@ -243,7 +375,7 @@ def execute_claude_task(prompt: str, working_dir: str = None, model: str = "clau
                         for block in message.get('content', []):
                             if block.get('type') == 'text':
                                 text = block.get('text', '')
-                                output_texts.append(text)
+                                add_output(text)
                                 log.write(f"\n{'─'*50}\n")
                                 log.write(f"ASSISTANT:\n{text}\n")
                             elif block.get('type') == 'tool_use':
@@ -280,34 +412,42 @@ def execute_claude_task(prompt: str, working_dir: str = None, model: str = "clau
                         delta = chunk.get('delta', {})
                         if delta.get('type') == 'text_delta':
                             text = delta.get('text', '')
-                            output_texts.append(text)
+                            add_output(text)
                             log.write(text)
 
                     elif chunk_type == 'result':
                         result_text = chunk.get('result', '')
                         if result_text and result_text not in ''.join(output_texts):
-                            output_texts.append(result_text)
+                            add_output(result_text)
                             log.write(f"\n\n{'═'*50}\nFINAL RESULT:\n{result_text}\n")
 
                     log.flush()
 
                     if task_id and task_id in active_tasks:
-                        full_output = ''.join(output_texts)
-                        lines = full_output.split('\n')
-                        active_tasks[task_id]['last_output'] = '\n'.join(lines[-20:])
-                        active_tasks[task_id]['output_lines'] = len(lines)
+                        update_task(task_id, last_output=tail.text(), output_lines=tail.count)
 
                 except json.JSONDecodeError:
                     log.write(line_str + '\n')
                     log.flush()
 
-            process.wait(timeout=600)
+            process.wait()
             exit_code = process.returncode
 
-        except subprocess.TimeoutExpired:
-            process.kill()
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            if process.poll() is None:
+                # Left early on an error; don't leave the process running
+                _stop_process(process)
+            _processes.pop(task_id, None)
+
+        if timed_out.is_set():
             log.write("\n\n=== TASK TIMED OUT ===\n")
-            raise
+            _cancelled.discard(task_id)
+            raise subprocess.TimeoutExpired(CLAUDE_BINARY, TASK_TIMEOUT)
+        if task_id in _cancelled:
+            log.write("\n\n=== TASK CANCELLED ===\n")
+            _finish_cancelled(task_id)
 
         try:
             with open(stderr_file, 'r') as sf:
@@ -342,13 +482,7 @@ def execute_claude_task(prompt: str, working_dir: str = None, model: str = "clau
     except Exception as e:
         print(f"Error listing files: {e}")
 
-    if task_id and task_id in active_tasks:
-        active_tasks[task_id]['status'] = 'completed'
-        active_tasks[task_id]['completed_at'] = time.time()
-        active_tasks[task_id]['files'] = files_created[:50]
-        _save_tasks()
-
-    return {
+    result = {
         "response": response,
         "working_dir": cwd,
         "files": files_created[:50],
@@ -357,20 +491,77 @@ def execute_claude_task(prompt: str, working_dir: str = None, model: str = "clau
         "task_id": task_id
     }
 
+    if task_id and task_id in active_tasks:
+        # Result and status together, so no one sees a completed task without its result
+        update_task(task_id, status='completed', completed_at=time.time(), files=files_created[:50], result=result)
+        _save_tasks()
+
+    return result
+
+
+def _finish_cancelled(task_id):
+    """Record that a cancelled task has stopped and raise TaskCancelled."""
+    _cancelled.discard(task_id)
+    update_task(task_id, status='cancelled', completed_at=time.time(), queue_position=None)
+    _save_tasks()
+    raise TaskCancelled(f"Task {task_id} was cancelled")
+
+
+def _queue_changed(started, positions):
+    """Keep the status and queue_position of queued tasks up to date."""
+    for task_id in started:
+        if task_id in active_tasks:
+            update_task(task_id, status='starting', queue_position=None)
+    for task_id, position in positions.items():
+        task = active_tasks.get(task_id)
+        if task is not None and task.get('queue_position') != position:
+            update_task(task_id, queue_position=position)
+
 
-def start_task_async(prompt: str, working_dir: str, model: str, task_id: str):
-    """Start a task in a background thread."""
+# Runs every task; GPT_GRAPH_MAX_TASKS of them at a time
+scheduler = TaskScheduler(on_change=_queue_changed)
+
+
+def _submit(task_id, fn, priority):
+    return scheduler.submit(task_id, fn, priority, active_tasks[task_id].get('workspace', 'default'))
+
+
+def start_task_async(prompt: str, working_dir: str, model: str, task_id: str, priority: str = 'chat'):
+    """Queue a task to run in the background once the scheduler has a free slot."""
     def run():
         try:
-            result = execute_claude_task(prompt, working_dir, model, task_id)
-            active_tasks[task_id]['result'] = result
-            active_tasks[task_id]['status'] = 'completed'
-            _save_tasks()
+            execute_claude_task(prompt, working_dir, model, task_id)
+        except TaskCancelled:
+            pass
         except Exception as e:
-            active_tasks[task_id]['status'] = 'failed'
-            active_tasks[task_id]['error'] = str(e)
+            update_task(task_id, status='failed', error=str(e))
             _save_tasks()
 
-    thread = threading.Thread(target=run, daemon=True)
-    thread.start()
-    return thread
+    return _submit(task_id, run, priority)
+
+
+def run_task(prompt: str, working_dir: str, model: str, task_id: str, priority: str = 'chat') -> dict:
+    """Queue a task and wait for its result, like execute_claude_task; raises TaskCancelled."""
+    return _submit(task_id, lambda: execute_claude_task(prompt, working_dir, model, task_id), priority).wait()
+
+
+def cancel_task(task_id):
+    """Cancel a queued or running task.
+
+    A queued task is dropped from the queue; a running one has its Claude
+    process group terminated and is marked cancelled once it has exited.
+    Returns False if the task does not exist or has already finished.
+    """
+    task = active_tasks.get(task_id)
+    if task is None or task['status'] in FINISHED_STATUSES:
+        return False
+    _cancelled.add(task_id)
+    if scheduler.cancel(task_id) is not None:
+        _cancelled.discard(task_id)
+        update_task(task_id, status='cancelled', completed_at=time.time(), queue_position=None)
+        _save_tasks()
+        return True
+    process = _processes.get(task_id)
+    if process is not None:
+        _stop_process(process)
+    return True
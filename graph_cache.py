@@ -0,0 +1,129 @@
+"""Process-wide LRU cache of parsed graphs and their derived indexes."""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Memory budget for cached graphs (approximate, see _estimate_cost)
+CACHE_BUDGET_BYTES = int(os.environ.get('GPT_GRAPH_CACHE_MB', '512')) * 1024 * 1024
+
+# Parsed JSON takes several times its on-disk size once it is a tree of dicts
+_MEMORY_FACTOR = 4
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) for a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def files_signature(*paths):
+    """Combined signature of several files (e.g. a snapshot and its delta log)."""
+    return tuple(file_signature(p) for p in paths)
+
+
+def signature_json(signature):
+    """A signature in the form it takes after a JSON round trip (for sidecar files)."""
+    return json.loads(json.dumps(signature))
+
+
+def _estimate_cost(signature):
+    """Estimate the in-memory size of a graph from its files' signature."""
+    if not signature:
+        return 0
+    return sum(sig[1] for sig in signature if sig) * _MEMORY_FACTOR
+
+
+class CacheEntry:
+    """A parsed graph plus the signature of the files it was read from."""
+
+    __slots__ = ('graph', 'signature', 'cost', 'index')
+
+    def __init__(self, graph, signature, index=None):
+        self.graph = graph
+        self.signature = signature
+        self.cost = _estimate_cost(signature)
+        self.index = index  # GraphIndex, built lazily by the query functions
+
+
+class GraphCache:
+    """LRU cache keyed by graph file path, validated against mtime and size.
+
+    signature_fn(path) returns the current signature of the file(s) backing
+    a graph; an entry is only served while it still matches. Entries are
+    evicted least-recently-used first once the estimated memory
+    of all cached graphs exceeds the budget. The most recently used entry is
+    always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes=CACHE_BUDGET_BYTES, signature_fn=files_signature):
+        self.budget_bytes = budget_bytes
+        self.signature_fn = signature_fn
+        self._entries = OrderedDict()  # path -> CacheEntry
+        self._total_cost = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Return the entry for path if it still matches the file on disk."""
+        signature = self.signature_fn(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.signature != signature:
+                # File changed outside of save/merge (or was deleted)
+                self._remove(path)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def put(self, path, graph, signature=None, index=None):
+        """Cache a graph for path. Signature defaults to the files' current one."""
+        if signature is None:
+            signature = self.signature_fn(path)
+        entry = CacheEntry(graph, signature, index)
+        with self._lock:
+            self._remove(path)
+            self._entries[path] = entry
+            self._total_cost += entry.cost
+            self._evict()
+        return entry
+
+    def invalidate(self, path):
+        """Drop the cached entry for path, if any."""
+        with self._lock:
+            self._remove(path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_cost = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'estimated_bytes': self._total_cost,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total_cost -= entry.cost
+
+    def _evict(self):
+        while self._total_cost > self.budget_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._total_cost -= entry.cost
@@ -0,0 +1,313 @@
+"""Per-graph changelog: what each revision added, changed or removed, for delta sync.
+
+Every write to a graph bumps its 'revision' and appends one record here. A
+record holds the nodes and relationships that revision upserted (whole
+objects; nodes keyed by id, relationships by edge_key) and the keys it
+removed, or {"reset": true} when the change could not be expressed that way.
+Clients send their changes against the revision they last saw and pull
+"changes since revision N" from this log.
+"""
+
+import json
+import os
+import re
+
+from graph_index import edge_key
+
+# Trim a graph's changelog to its newest half once it grows past this size.
+# Clients whose revision falls off the end reload the whole graph.
+CHANGELOG_MAX_BYTES = int(os.environ.get('GPT_GRAPH_CHANGELOG_BYTES', str(8 * 1024 * 1024)))
+
+CHANGE_FIELDS = ('nodes', 'removed_nodes', 'relationships', 'removed_relationships')
+
+# Records are written with 'revision' first, so old lines can be skipped unparsed
+_REVISION_RE = re.compile(r'\{"revision":(\d+)')
+
+
+class ChangeConflict(Exception):
+    """Pushed changes overlap changes made since the revision they were based on.
+
+    nodes and relationships list the overlapping keys; reset means the
+    changelog no longer covers the base revision, so the client has to
+    reload the graph before it can push.
+    """
+
+    def __init__(self, revision, nodes=(), relationships=(), reset=False):
+        super().__init__(f"Changes conflict with revision {revision}"
+                         + (" (base revision no longer available)" if reset else ""))
+        self.revision = revision
+        self.nodes = sorted(nodes)
+        self.relationships = sorted(list(key) for key in relationships)
+        self.reset = reset
+
+
+def changes_file(graph_path):
+    """Get the changelog path for a graph snapshot path."""
+    return graph_path[:-len('.json')] + '.changes'
+
+
+def _node_id(value):
+    """A node id usable as a change key, or raise ValueError."""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ValueError(f"node ids must be strings or integers, got {value!r}")
+    return value
+
+
+def _rel_key(value):
+    """A removed_relationships entry ([source, target, type]) as an edge_key tuple."""
+    if not isinstance(value, (list, tuple)) or len(value) != 3:
+        raise ValueError(f"removed relationships must be [source, target, type], got {value!r}")
+    return (str(value[0]), str(value[1]), str(value[2]).lower())
+
+
+def normalize(data):
+    """Validate the change fields of a request body and return them as a change dict."""
+    change = {}
+    for field in CHANGE_FIELDS:
+        value = data.get(field) or []
+        if not isinstance(value, list):
+            raise ValueError(f"'{field}' must be a list")
+        change[field] = value
+    for node in change['nodes']:
+        if not isinstance(node, dict):
+            raise ValueError("'nodes' must contain objects")
+        _node_id(node.get('id'))
+    for node_id in change['removed_nodes']:
+        _node_id(node_id)
+    for rel in change['relationships']:
+        if not isinstance(rel, dict):
+            raise ValueError("'relationships' must contain objects")
+    change['removed_relationships'] = [list(_rel_key(key)) for key in change['removed_relationships']]
+    return change
+
+
+def is_empty(change):
+    return not any(change.get(field) for field in CHANGE_FIELDS)
+
+
+def touched(change):
+    """(node ids, edge keys) a change upserts or removes; node ids as strings."""
+    nodes = {str(node['id']) for node in change.get('nodes', [])}
+    nodes.update(str(node_id) for node_id in change.get('removed_nodes', []))
+    rels = {edge_key(rel) for rel in change.get('relationships', [])}
+    rels.update(_rel_key(key) for key in change.get('removed_relationships', []))
+    return nodes, rels
+
+
+def conflicts(records, change):
+    """(node ids, edge keys) of change that records also touched.
+
+    A pushed relationship whose endpoint was removed by a record counts too.
+    """
+    changed_nodes, changed_rels = set(), set()
+    removed_nodes = set()
+    for record in records:
+        nodes, rels = touched(record)
+        changed_nodes |= nodes
+        changed_rels |= rels
+        removed_nodes.update(str(node_id) for node_id in record.get('removed_nodes', []))
+    nodes, rels = touched(change)
+    rel_clashes = rels & changed_rels
+    for rel in change.get('relationships', []):
+        key = edge_key(rel)
+        if key[0] in removed_nodes or key[1] in removed_nodes:
+            rel_clashes.add(key)
+    return nodes & changed_nodes, rel_clashes
+
+
+def _nodes_by_id(graph):
+    nodes = {}
+    for node in graph.get('nodes', []):
+        node_id = node.get('id')
+        if isinstance(node_id, bool) or not isinstance(node_id, (str, int)) or node_id in nodes:
+            return None
+        nodes[node_id] = node
+    return nodes
+
+
+def _rels_by_key(graph):
+    rels = {}
+    for rel in graph.get('relationships', []):
+        rels.setdefault(edge_key(rel), []).append(rel)
+    return rels
+
+
+def diff(old, new):
+    """The change that turns graph old into graph new.
+
+    Returns None if it cannot be expressed as one: a node without a usable
+    or unique id, or several relationships with the same edge key in new
+    that differ from old.
+    """
+    old_nodes, new_nodes = _nodes_by_id(old), _nodes_by_id(new)
+    if old_nodes is None or new_nodes is None:
+        return None
+    old_rels, new_rels = _rels_by_key(old), _rels_by_key(new)
+    change = {
+        'nodes': [node for node_id, node in new_nodes.items() if old_nodes.get(node_id) != node],
+        'removed_nodes': [node_id for node_id in old_nodes if node_id not in new_nodes],
+        'relationships': [],
+        'removed_relationships': [list(key) for key in old_rels if key not in new_rels]
+    }
+    for key, rels in new_rels.items():
+        if old_rels.get(key) != rels:
+            if len(rels) > 1:
+                return None
+            change['relationships'].append(rels[0])
+    return change
+
+
+def is_append_only(graph, index, change):
+    """True if change only adds nodes and relationships graph does not have yet."""
+    if change['removed_nodes'] or change['removed_relationships']:
+        return False
+    ids = set()
+    for node in change['nodes']:
+        if node['id'] in index.by_id or node['id'] in ids:
+            return False
+        ids.add(node['id'])
+    keys = set()
+    for rel in change['relationships']:
+        key = edge_key(rel)
+        if key in index.edge_keys or key in keys:
+            return False
+        keys.add(key)
+    return True
+
+
+def apply(graph, change):
+    """Return a copy of graph with change applied, and the change as applied.
+
+    Removals are applied before upserts, so a node both removed and
+    upserted ends up upserted. Upserting a relationship replaces every
+    relationship with the same edge key. Relationships attached to removed
+    nodes are removed as well, and reported in the returned change. The
+    graph's own lists and dicts are left untouched.
+    """
+    upserts = {node['id']: node for node in change['nodes']}
+    removed = {node_id for node_id in change['removed_nodes'] if node_id not in upserts}
+    nodes = []
+    for node in graph.get('nodes', []):
+        node_id = node.get('id')
+        if isinstance(node_id, (str, int)) and node_id in upserts:
+            nodes.append(upserts.pop(node_id))
+        elif not (isinstance(node_id, (str, int)) and node_id in removed):
+            nodes.append(node)
+    nodes.extend(upserts.values())
+
+    rel_upserts = {edge_key(rel): rel for rel in change['relationships']}
+    removed_rels = {_rel_key(key) for key in change['removed_relationships']}
+    removed_ids = {str(node_id) for node_id in removed}
+    cascaded = []
+    placed = set()
+    rels = []
+    for rel in graph.get('relationships', []):
+        key = edge_key(rel)
+        if key in rel_upserts:
+            if key not in placed:
+                rels.append(rel_upserts[key])
+                placed.add(key)
+        elif key in removed_rels:
+            continue
+        elif key[0] in removed_ids or key[1] in removed_ids:
+            if key not in removed_rels:
+                removed_rels.add(key)
+                cascaded.append(list(key))
+        else:
+            rels.append(rel)
+    rels.extend(rel for key, rel in rel_upserts.items() if key not in placed)
+
+    applied = dict(change, removed_relationships=change['removed_relationships'] + cascaded)
+    return dict(graph, nodes=nodes, relationships=rels), applied
+
+
+def append(path, record, max_bytes=None):
+    """Append one record as a JSON line, trimming the log if it grew too large."""
+    max_bytes = max_bytes or CHANGELOG_MAX_BYTES
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with open(path, 'a') as f:
+        f.write(line)
+        size = f.tell()
+    if size > max_bytes:
+        _trim(path, max_bytes // 2)
+
+
+def _trim(path, keep_bytes):
+    """Rewrite a changelog keeping only its newest records (at least one)."""
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    kept, size = [], 0
+    for line in reversed(lines):
+        size += len(line)
+        if kept and size > keep_bytes:
+            break
+        kept.append(line)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.writelines(reversed(kept))
+    os.replace(tmp_path, path)
+
+
+def read_since(path, since, revision):
+    """Records for the revisions after since, up to revision, oldest first.
+
+    Returns None if the log does not cover all of them: since is not a
+    revision of this graph, older records were trimmed, a write did not get
+    logged, or one of them is a reset.
+    """
+    if since == revision:
+        return []
+    if not isinstance(since, int) or isinstance(since, bool) or since < 0 or since > revision:
+        return None
+    records = []
+    try:
+        f = open(path, 'r')
+    except FileNotFoundError:
+        return None
+    with f:
+        for line in f:
+            match = _REVISION_RE.match(line)
+            if match is None or int(match.group(1)) <= since:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                return None
+    expected = since
+    for record in records:
+        if record.get('revision') != expected + 1 or record.get('reset'):
+            return None
+        expected += 1
+    return records if expected == revision else None
+
+
+def collapse(records):
+    """Fold consecutive records into one change with the net effect of all of them."""
+    nodes, removed_nodes = {}, {}
+    rels, removed_rels = {}, {}
+    meta = {}
+    for record in records:
+        for node_id in record.get('removed_nodes', []):
+            nodes.pop(str(node_id), None)
+            removed_nodes[str(node_id)] = node_id
+        for node in record.get('nodes', []):
+            removed_nodes.pop(str(node['id']), None)
+            nodes[str(node['id'])] = node
+        for key in record.get('removed_relationships', []):
+            key = _rel_key(key)
+            rels.pop(key, None)
+            removed_rels[key] = list(key)
+        for rel in record.get('relationships', []):
+            key = edge_key(rel)
+            removed_rels.pop(key, None)
+            rels[key] = rel
+        meta.update(record.get('meta', {}))
+    change = {
+        'nodes': list(nodes.values()),
+        'removed_nodes': list(removed_nodes.values()),
+        'relationships': list(rels.values()),
+        'removed_relationships': list(removed_rels.values())
+    }
+    if meta:
+        change['meta'] = meta
+    return change
@@ -0,0 +1,298 @@
+"""Compact binary graph snapshots (.ggb) with lazy, memory-mapped reads.
+
+Layout (little-endian):
+
+    header      magic, counts and section offsets (see _HEADER)
+    strings     interned string table: (count + 1) u64 offsets, then UTF-8 data
+    node cols   id kind (u8), id (i64), name (i32), type (i32), flags (u8)
+    edge cols   source kind/value/field, target kind/value/field, type, flags
+    props       (nodes + edges + 1) u64 offsets, then one JSON object per
+                node/edge holding every key not stored in a column
+    meta        JSON object of the graph's top-level keys (title, next_id, ...)
+
+Names and types are string-table references, so summaries, label counts and
+name searches never parse the per-node JSON.
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from graph_index import node_name, node_type, rel_type
+
+MAGIC = b'GGB\x01'
+
+# magic, node count, edge count, string count, then section offsets:
+# strings, node columns, edge columns, props, meta, meta length
+_HEADER = struct.Struct('<4sIII6Q')
+
+# Value kinds for ids and relationship endpoints
+_NONE, _INT, _STR = 0, 1, 2
+
+# Node flags: the column value is also a literal top-level key of the node
+_NAME_KEY, _TYPE_KEY = 1, 2
+
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+_ENDPOINT_ALIASES = (('source', 'startNode', 'startNodeId', 'from'),
+                     ('target', 'endNode', 'endNodeId', 'to'))
+
+
+def binary_file(graph_path):
+    """Get the binary snapshot path for a graph's .json path."""
+    return graph_path[:-len('.json')] + '.ggb'
+
+
+class _Strings:
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def ref(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+def _value_column(value, strings):
+    """Encode an id/endpoint as (kind, i64) or None if it needs the props JSON."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            return _INT, value
+        return None
+    if isinstance(value, str):
+        return _STR, strings.ref(value)
+    return None
+
+
+def encode(graph):
+    """Serialize a graph dict to the binary format."""
+    strings = _Strings()
+    nodes = graph.get('nodes', [])
+    rels = graph.get('relationships', [])
+
+    n_id_kind, n_id = array('B'), array('q')
+    n_name, n_type, n_flags = array('i'), array('i'), array('B')
+    e_cols = [array('B'), array('q'), array('i'), array('B'), array('q'), array('i')]
+    e_type, e_flags = array('i'), array('B')
+    props = []
+
+    for node in nodes:
+        rest = dict(node)
+        col = _value_column(node.get('id'), strings) if 'id' in node else None
+        if col:
+            rest.pop('id')
+        kind, value = col or (_NONE, 0)
+        n_id_kind.append(kind)
+        n_id.append(value)
+        name, ntype, flags = node_name(node), node_type(node), 0
+        if rest.get('name') == name and isinstance(name, str) and name:
+            rest.pop('name')
+            flags |= _NAME_KEY
+        if rest.get('type') == ntype and isinstance(ntype, str):
+            rest.pop('type')
+            flags |= _TYPE_KEY
+        n_name.append(strings.ref(name) if isinstance(name, str) else -1)
+        n_type.append(strings.ref(ntype) if isinstance(ntype, str) else -1)
+        n_flags.append(flags)
+        props.append(rest)
+
+    for rel in rels:
+        rest = dict(rel)
+        for side, aliases in enumerate(_ENDPOINT_ALIASES):
+            kind, value, field = _NONE, 0, -1
+            for alias in aliases:
+                if rel.get(alias):
+                    col = _value_column(rel[alias], strings)
+                    if col:
+                        kind, value = col
+                        field = strings.ref(alias)
+                        rest.pop(alias)
+                    break
+            e_cols[side * 3].append(kind)
+            e_cols[side * 3 + 1].append(value)
+            e_cols[side * 3 + 2].append(field)
+        rtype, flags = rel_type(rel), 0
+        if rest.get('type') == rtype:
+            rest.pop('type')
+            flags |= _TYPE_KEY
+        e_type.append(strings.ref(rtype) if isinstance(rtype, str) else -1)
+        e_flags.append(flags)
+        props.append(rest)
+
+    meta = {k: v for k, v in graph.items() if k not in ('nodes', 'relationships')}
+
+    encoded_strings = [s.encode('utf-8') for s in strings.values]
+    string_offsets = array('Q', [0])
+    for data in encoded_strings:
+        string_offsets.append(string_offsets[-1] + len(data))
+    encoded_props = [json.dumps(p, separators=(',', ':')).encode('utf-8') if p else b'' for p in props]
+    prop_offsets = array('Q', [0])
+    for data in encoded_props:
+        prop_offsets.append(prop_offsets[-1] + len(data))
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+
+    sections = [
+        string_offsets.tobytes() + b''.join(encoded_strings),
+        b''.join(a.tobytes() for a in (n_id_kind, n_id, n_name, n_type, n_flags)),
+        b''.join(a.tobytes() for a in e_cols + [e_type, e_flags]),
+        prop_offsets.tobytes() + b''.join(encoded_props),
+        meta_bytes
+    ]
+    offsets = []
+    pos = _HEADER.size
+    for section in sections:
+        offsets.append(pos)
+        pos += len(section)
+    header = _HEADER.pack(MAGIC, len(nodes), len(rels), len(strings.values),
+                          *offsets, len(meta_bytes))
+    return header + b''.join(sections)
+
+
+def write(path, graph):
+    """Write a binary snapshot atomically (temp file + rename)."""
+    data = encode(graph)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _column(buf, offset, typecode, count):
+    col = array(typecode)
+    col.frombytes(buf[offset:offset + col.itemsize * count])
+    return col, offset + col.itemsize * count
+
+
+class BinaryGraph:
+    """Read-only view of a binary snapshot.
+
+    The file is memory-mapped; the integer columns are read eagerly (they are
+    small), strings are decoded on demand and per-node JSON is only parsed
+    for the nodes and edges that are actually requested.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.signature = (st.st_mtime_ns, st.st_size)
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.node_count, self.edge_count, self.string_count,
+         strings_off, nodes_off, edges_off, props_off, meta_off, meta_len) = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary graph snapshot")
+        self._strings = {}
+        self._string_offsets, self._string_data = _column(self._buf, strings_off, 'Q', self.string_count + 1)
+
+        n = self.node_count
+        self._n_id_kind, off = _column(self._buf, nodes_off, 'B', n)
+        self._n_id, off = _column(self._buf, off, 'q', n)
+        self._n_name, off = _column(self._buf, off, 'i', n)
+        self._n_type, off = _column(self._buf, off, 'i', n)
+        self._n_flags, off = _column(self._buf, off, 'B', n)
+
+        e = self.edge_count
+        off = edges_off
+        self._e_cols = []
+        for typecode in ('B', 'q', 'i', 'B', 'q', 'i', 'i', 'B'):
+            col, off = _column(self._buf, off, typecode, e)
+            self._e_cols.append(col)
+
+        self._prop_offsets, self._prop_data = _column(self._buf, props_off, 'Q', n + e + 1)
+        self._meta = json.loads(self._buf[meta_off:meta_off + meta_len])
+
+    def close(self):
+        self._buf.close()
+
+    def string(self, i):
+        if i < 0:
+            return None
+        value = self._strings.get(i)
+        if value is None:
+            start = self._string_data + self._string_offsets[i]
+            end = self._string_data + self._string_offsets[i + 1]
+            value = self._strings[i] = self._buf[start:end].decode('utf-8')
+        return value
+
+    def _value(self, kind, value):
+        if kind == _INT:
+            return value
+        if kind == _STR:
+            return self.string(value)
+        return None
+
+    def _props(self, i):
+        start = self._prop_data + self._prop_offsets[i]
+        end = self._prop_data + self._prop_offsets[i + 1]
+        return json.loads(self._buf[start:end]) if end > start else {}
+
+    def meta(self):
+        """Top-level graph metadata (title, description, timestamps, ...)."""
+        return dict(self._meta)
+
+    def node_id(self, i):
+        return self._value(self._n_id_kind[i], self._n_id[i])
+
+    def node_name(self, i):
+        return self.string(self._n_name[i]) or ''
+
+    def node_type(self, i):
+        return self.string(self._n_type[i])
+
+    def rel_type(self, i):
+        return self.string(self._e_cols[6][i])
+
+    def node_properties(self, i):
+        """The node's 'properties' dict, parsed on demand."""
+        return self._props(i).get('properties', {})
+
+    def node(self, i):
+        """Materialize node i as the dict it was written from."""
+        node = {}
+        kind = self._n_id_kind[i]
+        if kind != _NONE:
+            node['id'] = self._value(kind, self._n_id[i])
+        flags = self._n_flags[i]
+        if flags & _NAME_KEY:
+            node['name'] = self.node_name(i)
+        if flags & _TYPE_KEY:
+            node['type'] = self.node_type(i)
+        node.update(self._props(i))
+        return node
+
+    def relationship(self, i):
+        """Materialize relationship i as the dict it was written from."""
+        cols = self._e_cols
+        rel = {}
+        for side in (0, 1):
+            kind, value, field = cols[side * 3][i], cols[side * 3 + 1][i], cols[side * 3 + 2][i]
+            if kind != _NONE:
+                rel[self.string(field)] = self._value(kind, value)
+        if cols[7][i] & _TYPE_KEY:
+            rel['type'] = self.rel_type(i)
+        rel.update(self._props(self.node_count + i))
+        return rel
+
+    def to_graph(self):
+        """Materialize the whole graph as a regular dict."""
+        graph = self.meta()
+        graph['nodes'] = [self.node(i) for i in range(self.node_count)]
+        graph['relationships'] = [self.relationship(i) for i in range(self.edge_count)]
+        return graph
+
+
+def read(path):
+    """Read a binary snapshot fully into a graph dict."""
+    view = BinaryGraph(path)
+    try:
+        return view.to_graph()
+    finally:
+        view.close()
@@ -0,0 +1,341 @@
+"""Normalized lookup index over a graph: ids, names and typed adjacency."""
+
+import bisect
+import json
+import os
+from datetime import datetime, timezone
+
+from graph_cache import signature_json
+
+
+def rel_endpoints(rel):
+    """Get (source, target) of a relationship, whichever field names it uses."""
+    src = rel.get('source') or rel.get('startNode') or rel.get('startNodeId') or rel.get('from')
+    tgt = rel.get('target') or rel.get('endNode') or rel.get('endNodeId') or rel.get('to')
+    return src, tgt
+
+
+# Field names a relationship may use for its endpoints
+ENDPOINT_FIELDS = ('source', 'startNode', 'startNodeId', 'from',
+                   'target', 'endNode', 'endNodeId', 'to')
+
+
+def rel_type(rel):
+    """Get the type of a relationship."""
+    return rel.get('type') or rel.get('label') or 'RELATED_TO'
+
+
+def node_name(node):
+    """Extract name from node (handles different formats)."""
+    return node.get('name') or node.get('properties', {}).get('name', '')
+
+
+def node_type(node):
+    """Extract type/label from node."""
+    if 'type' in node:
+        return node['type']
+    labels = node.get('labels', [])
+    return labels[0] if labels else 'Unknown'
+
+
+def node_property(node, key):
+    """Value of a node attribute as queries see it: name, type and id are
+    resolved like everywhere else, other keys come from properties first."""
+    if key == 'name':
+        return node_name(node)
+    if key in ('type', 'label'):
+        return node_type(node)
+    if key == 'id':
+        return node.get('id')
+    properties = node.get('properties') or {}
+    if key in properties:
+        return properties[key]
+    return node.get(key)
+
+
+def hashable_value(value):
+    """A dict key for a property value (lists become tuples), or None if it has none."""
+    if isinstance(value, list):
+        items = tuple(hashable_value(v) for v in value)
+        return None if None in items else items
+    if isinstance(value, dict):
+        return None
+    return value
+
+
+def range_value(value):
+    """A number to order a property value by (ISO 8601 dates as epoch seconds, UTC unless
+    they say otherwise), or None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def edge_key(rel, endpoints=None):
+    """Normalized (source, target, type) key used to dedupe relationships."""
+    src, tgt = endpoints or rel_endpoints(rel)
+    return (str(src), str(tgt), rel_type(rel).lower())
+
+
+def node_key(node):
+    """Get a unique key for a node (id > name > label > properties.name)."""
+    # Prefer explicit id for dedup
+    if node.get('id'):
+        return ('id', str(node['id']))
+    # Then try name
+    name = node.get('name') or node.get('properties', {}).get('name')
+    if name:
+        return ('name', name)
+    # Then try label
+    if node.get('label'):
+        return ('label', node['label'])
+    return ('none', None)
+
+
+def _add_edge(adjacency, node_id, rtype, other_id, rel):
+    by_type = adjacency.get(node_id)
+    if by_type is None:
+        by_type = adjacency[node_id] = {}
+    key = rtype.lower()
+    if key not in by_type:
+        by_type[key] = []
+    by_type[key].append((rtype, other_id, rel))
+
+
+class PropertyIndex:
+    """Hash index from one node property's value to the nodes that have it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.values = {}  # hashable_value(value) -> [node, ...]
+
+    @classmethod
+    def factory(cls, key):
+        """A GraphIndex.secondary() factory for this property."""
+        def build(nodes):
+            index = cls(key)
+            for node in nodes:
+                index.add_node(node)
+            return index
+        return build
+
+    def add_node(self, node):
+        value = hashable_value(node_property(node, self.key))
+        if value is None:
+            return
+        if value not in self.values:
+            self.values[value] = []
+        self.values[value].append(node)
+
+    def lookup(self, value):
+        value = hashable_value(value)
+        return self.values.get(value, []) if value is not None else []
+
+
+class RangeIndex:
+    """Sorted index over one node property's numeric (or date) values."""
+
+    def __init__(self, key):
+        self.key = key
+        self.values = []  # range_value() of each indexed node, ascending
+        self.nodes = []   # node for each entry of values
+
+    @classmethod
+    def factory(cls, key):
+        """A GraphIndex.secondary() factory for this property."""
+        def build(nodes):
+            index = cls(key)
+            entries = []
+            for position, node in enumerate(nodes):
+                value = range_value(node_property(node, key))
+                if value is not None:
+                    entries.append((value, position, node))
+            entries.sort(key=lambda e: (e[0], e[1]))
+            index.values = [e[0] for e in entries]
+            index.nodes = [e[2] for e in entries]
+            return index
+        return build
+
+    def add_node(self, node):
+        value = range_value(node_property(node, self.key))
+        if value is None:
+            return
+        i = bisect.bisect_right(self.values, value)
+        self.values.insert(i, value)
+        self.nodes.insert(i, node)
+
+    def span(self, low=None, high=None, include_low=True, include_high=True):
+        """(start, end) positions of the entries between low and high (None = unbounded)."""
+        start, end = 0, len(self.values)
+        if low is not None:
+            start = (bisect.bisect_left if include_low else bisect.bisect_right)(self.values, low)
+        if high is not None:
+            end = (bisect.bisect_right if include_high else bisect.bisect_left)(self.values, high)
+        return start, max(start, end)
+
+    def range(self, low=None, high=None, include_low=True, include_high=True):
+        """Nodes whose value is between low and high, in ascending order."""
+        start, end = self.span(low, high, include_low, include_high)
+        return self.nodes[start:end]
+
+
+class GraphIndex:
+    """Indexes for one version of a graph.
+
+    Built once per cached graph and updated in place as nodes and
+    relationships are merged, so lookups cost time proportional to the
+    result rather than to the size of the graph.
+    """
+
+    def __init__(self):
+        self.by_id = {}          # node id -> node
+        self.by_name = {}        # lowercased name -> [node, ...] in file order
+        self.outgoing = {}       # source id -> {rel type (lower): [(rel_type, target_id, rel)]}
+        self.incoming = {}       # target id -> {rel type (lower): [(rel_type, source_id, rel)]}
+        self.by_key = {}         # merge dedup key (see node_key) -> node
+        self.edge_keys = set()   # edge_key() of every relationship
+        self.node_types = {}     # node type -> count
+        self.by_type = {}        # lowercased node type -> [node, ...]
+        self.rel_types = {}      # rel type -> count
+        self.next_id = 1         # one past the highest integer node id
+        self.nodes = []          # every node, in file order
+        self._secondary = {}     # name -> lazily built index kept in sync by add_node
+
+    @classmethod
+    def build(cls, graph):
+        index = cls()
+        for node in graph.get('nodes', []):
+            index.add_node(node)
+        for rel in graph.get('relationships', []):
+            index.add_relationship(rel)
+        return index
+
+    def add_node(self, node):
+        self.nodes.append(node)
+        for secondary in self._secondary.values():
+            secondary.add_node(node)
+        nid = node.get('id')
+        if nid is not None:
+            self.by_id[nid] = node
+        if isinstance(nid, int) and nid >= self.next_id:
+            self.next_id = nid + 1
+        key = node_key(node)
+        if key[1]:
+            self.by_key[key] = node
+        if node.get('_original_id'):
+            # Sub-agents keep referring to nodes by the string ids they emitted
+            self.by_key[('id', str(node['_original_id']))] = node
+        name = node_name(node)
+        if name:
+            key = name.lower()
+            if key not in self.by_name:
+                self.by_name[key] = []
+            self.by_name[key].append(node)
+        ntype = node_type(node)
+        self.node_types[ntype] = self.node_types.get(ntype, 0) + 1
+        key = str(ntype).lower()
+        if key not in self.by_type:
+            self.by_type[key] = []
+        self.by_type[key].append(node)
+
+    def add_relationship(self, rel, endpoints=None):
+        src, tgt = endpoints or rel_endpoints(rel)
+        rtype = rel_type(rel)
+        self.edge_keys.add(edge_key(rel, (src, tgt)))
+        _add_edge(self.outgoing, src, rtype, tgt, rel)
+        _add_edge(self.incoming, tgt, rtype, src, rel)
+        self.rel_types[rtype] = self.rel_types.get(rtype, 0) + 1
+
+    def secondary(self, name, factory=None):
+        """Get a derived index (e.g. full-text), building it on first use.
+
+        factory(nodes) builds it from the current nodes; the result must have
+        an add_node(node) method, which is called for every node merged later.
+        Without a factory, returns None if the index has not been built.
+        """
+        secondary = self._secondary.get(name)
+        if secondary is None and factory is not None:
+            secondary = self._secondary.setdefault(name, factory(self.nodes))
+        return secondary
+
+    def property_index(self, key):
+        """Hash index over a node property, built on first use and kept current."""
+        return self.secondary(f'prop:{key}', PropertyIndex.factory(key))
+
+    def range_index(self, key):
+        """Sorted index over a numeric or date node property, built on first use and kept current."""
+        return self.secondary(f'range:{key}', RangeIndex.factory(key))
+
+    def node_by_name(self, name):
+        """Find a node by case-insensitive name. Later nodes win on duplicates."""
+        nodes = self.by_name.get(name.lower()) if name else None
+        return nodes[-1] if nodes else None
+
+    def edges(self, node_id, direction='out', rel_types=None):
+        """Yield (rel_type, other_id, rel, direction) for edges of a node.
+
+        Args:
+            direction: 'in', 'out', or 'both'
+            rel_types: Optional set of lowercased relationship types to follow
+        """
+        sides = []
+        if direction in ('out', 'both'):
+            sides.append((self.outgoing, 'out'))
+        if direction in ('in', 'both'):
+            sides.append((self.incoming, 'in'))
+        for adjacency, side in sides:
+            by_type = adjacency.get(node_id)
+            if not by_type:
+                continue
+            if rel_types is None:
+                groups = by_type.values()
+            else:
+                groups = [by_type[t] for t in rel_types if t in by_type]
+            for group in groups:
+                for rtype, other_id, rel in group:
+                    yield rtype, other_id, rel, side
+
+    # ── Persistence ──────────────────────────────────────────────────────
+
+    def save(self, path, graph, signature):
+        """Save the index next to its graph file, tagged with the graph's signature.
+
+        Only the resolved relationship endpoints are stored; loading needs the
+        parsed graph but skips the alias scan over every relationship.
+        """
+        data = {
+            'signature': signature_json(signature),
+            'edges': [list(rel_endpoints(rel)) for rel in graph.get('relationships', [])]
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, graph, signature):
+        """Load a saved index, or return None if missing or stale."""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        rels = graph.get('relationships', [])
+        if data.get('signature') != signature_json(signature) or len(data.get('edges', [])) != len(rels):
+            return None
+        index = cls()
+        for node in graph.get('nodes', []):
+            index.add_node(node)
+        for rel, (src, tgt) in zip(rels, data['edges']):
+            index.add_relationship(rel, (src, tgt))
+        return index
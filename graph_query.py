@@ -0,0 +1,705 @@
+"""A small Cypher-like pattern query language over a GraphIndex.
+
+    MATCH (t:Task {status: "pending"})-[:DEPENDS_ON]->(d:Task)
+    WHERE d.status = "failed" AND t.name CONTAINS "auth"
+    RETURN t.name, d.name AS blocker, t.priority
+    ORDER BY t.priority DESC
+    LIMIT 20
+
+Supported:
+    patterns    a single chain of (var:Type|Type {key: value}) nodes joined by
+                -[var:TYPE|TYPE {key: value}]->, <-[...]-, -[...]- (either
+                direction), or the short forms -->, <--, --
+    WHERE       AND, OR, NOT, parentheses; =, <>, !=, <, <=, >, >=,
+                CONTAINS, STARTS WITH, ENDS WITH, IN [...], IS [NOT] NULL
+    values      'strings', "strings", numbers, true, false, null, [lists],
+                $params, var.key, id(var), type(var), toLower(x), toUpper(x), size(x)
+    RETURN      [DISTINCT] expressions with optional AS aliases; a bare node
+                or relationship variable returns the whole element
+    ORDER BY    expressions, each ASC (default) or DESC
+    LIMIT       integer
+
+Node attributes: name, type (or label) and id resolve as elsewhere in the
+server; any other key is read from properties, then the node itself.
+
+The planner anchors the match on the node pattern with the fewest
+candidates according to the indexes (id, name, any property equality,
+a numeric range, type) and expands from there along the chain; each WHERE condition is
+checked as soon as the variables it uses are bound.
+"""
+
+import itertools
+import json
+import re
+
+from graph_index import node_name, node_property, node_type, rel_endpoints, rel_type
+
+# Upper bound on partial matches examined per query
+MAX_STEPS = 1000000
+# Rows returned when the query has no LIMIT
+DEFAULT_LIMIT = 1000
+
+
+class QueryError(ValueError):
+    """Raised for queries that do not parse or reference unknown names."""
+
+
+# ── Tokenizer ────────────────────────────────────────────────────────────
+
+_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+\.\d+|\d+)
+  | (?P<param>\$[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*|`[^`]+`)
+  | (?P<op><>|!=|<=|>=|[-<>=(){}\[\]:,.|*])
+''', re.VERBOSE)
+
+_KEYWORDS = {'MATCH', 'WHERE', 'RETURN', 'LIMIT', 'ORDER', 'BY', 'ASC', 'DESC', 'AND', 'OR', 'NOT',
+             'CONTAINS', 'STARTS', 'ENDS', 'WITH', 'IN', 'IS', 'NULL', 'TRUE', 'FALSE', 'AS', 'DISTINCT'}
+
+_FUNCTIONS = {'id', 'type', 'tolower', 'toupper', 'size'}
+
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+
+def _unquote(text):
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), text[1:-1], flags=re.DOTALL)
+
+
+def _tokenize(text):
+    """[(kind, value, start, end)]; keywords are kind 'kw' with an upper-case value."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise QueryError(f"Unexpected character {text[pos]!r} at position {pos}")
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'string':
+            value = _unquote(value)
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'param':
+            value = value[1:]
+        elif kind == 'ident':
+            if value[0] == '`':
+                value = value[1:-1]
+            elif value.upper() in _KEYWORDS:
+                kind, value = 'kw', value.upper()
+        if kind != 'ws':
+            tokens.append((kind, value, match.start(), match.end()))
+        pos = match.end()
+    tokens.append(('end', None, len(text), len(text)))
+    return tokens
+
+
+# ── Parser ───────────────────────────────────────────────────────────────
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.anonymous = 0
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def at(self, kind, value=None, offset=0):
+        token = self.peek(offset)
+        return token[0] == kind and (value is None or token[1] == value)
+
+    def accept(self, kind, value=None):
+        if self.at(kind, value):
+            return self.next()
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            found = self.peek()
+            wanted = value or kind
+            got = 'end of query' if found[0] == 'end' else repr(found[1])
+            raise QueryError(f"Expected {wanted} at position {found[2]}, found {got}")
+        return token
+
+    def name(self):
+        """An identifier where keywords are also allowed (labels, property keys)."""
+        if self.at('kw'):
+            token = self.next()
+            return self.text[token[2]:token[3]]
+        return self.expect('ident')[1]
+
+    def fresh_var(self):
+        self.anonymous += 1
+        return f' anon{self.anonymous}'
+
+    # query := MATCH pattern [WHERE expr] RETURN [DISTINCT] items [ORDER BY ...] [LIMIT n]
+    def query(self):
+        self.expect('kw', 'MATCH')
+        nodes, rels = self.pattern()
+        where = None
+        if self.accept('kw', 'WHERE'):
+            where = self.expr()
+        self.expect('kw', 'RETURN')
+        distinct = bool(self.accept('kw', 'DISTINCT'))
+        items = [self.return_item()]
+        while self.accept('op', ','):
+            items.append(self.return_item())
+        order = []
+        if self.accept('kw', 'ORDER'):
+            self.expect('kw', 'BY')
+            while True:
+                expr = self.expr()
+                descending = bool(self.accept('kw', 'DESC'))
+                if not descending:
+                    self.accept('kw', 'ASC')
+                order.append((expr, descending))
+                if not self.accept('op', ','):
+                    break
+        limit = None
+        if self.accept('kw', 'LIMIT'):
+            limit = self.expect('number')[1]
+            if not isinstance(limit, int):
+                raise QueryError("LIMIT must be an integer")
+        self.expect('end')
+        return {'nodes': nodes, 'rels': rels, 'where': where, 'distinct': distinct,
+                'items': items, 'order': order, 'limit': limit}
+
+    def pattern(self):
+        nodes = [self.node_pattern()]
+        rels = []
+        while self.at('op', '-') or self.at('op', '<'):
+            rels.append(self.rel_pattern())
+            nodes.append(self.node_pattern())
+        return nodes, rels
+
+    def labels_and_props(self):
+        labels = []
+        if self.accept('op', ':'):
+            labels.append(self.name())
+            while self.accept('op', '|'):
+                self.accept('op', ':')
+                labels.append(self.name())
+        props = {}
+        if self.accept('op', '{'):
+            if not self.at('op', '}'):
+                while True:
+                    key = self.name()
+                    self.expect('op', ':')
+                    props[key] = self.value()
+                    if not self.accept('op', ','):
+                        break
+            self.expect('op', '}')
+        return labels, props
+
+    def node_pattern(self):
+        self.expect('op', '(')
+        var = self.accept('ident')
+        labels, props = self.labels_and_props()
+        self.expect('op', ')')
+        return {'var': var[1] if var else self.fresh_var(), 'labels': labels, 'props': props}
+
+    def rel_pattern(self):
+        # -[...]->, <-[...]-, -[...]-, -->, <--, --
+        incoming = bool(self.accept('op', '<'))
+        self.expect('op', '-')
+        var, types, props = None, [], {}
+        if self.accept('op', '['):
+            var = self.accept('ident')
+            types, props = self.labels_and_props()
+            if self.at('op', '*'):
+                raise QueryError("Variable-length relationships are not supported; use /v1/graph/paths")
+            self.expect('op', ']')
+        self.expect('op', '-')
+        outgoing = bool(self.accept('op', '>'))
+        if incoming and outgoing:
+            raise QueryError("A relationship cannot point both ways")
+        direction = 'out' if outgoing else 'in' if incoming else 'both'
+        return {'var': var[1] if var else self.fresh_var(), 'types': types, 'props': props,
+                'direction': direction}
+
+    def value(self):
+        """A literal or $param (used in {key: value} maps)."""
+        expr = self.atom()
+        if expr[0] not in ('lit', 'param', 'list'):
+            raise QueryError("Pattern properties must be literals or $parameters")
+        return expr
+
+    def return_item(self):
+        start = self.peek()[2]
+        expr = self.expr()
+        end = self.tokens[self.pos - 1][3]
+        name = self.text[start:end].strip()
+        if self.accept('kw', 'AS'):
+            name = self.expect('ident')[1]
+        return name, expr
+
+    # expr := or
+    def expr(self):
+        parts = [self.and_expr()]
+        while self.accept('kw', 'OR'):
+            parts.append(self.and_expr())
+        return parts[0] if len(parts) == 1 else ('or', parts)
+
+    def and_expr(self):
+        parts = [self.not_expr()]
+        while self.accept('kw', 'AND'):
+            parts.append(self.not_expr())
+        return parts[0] if len(parts) == 1 else ('and', parts)
+
+    def not_expr(self):
+        if self.accept('kw', 'NOT'):
+            return ('not', self.not_expr())
+        return self.comparison()
+
+    def comparison(self):
+        left = self.atom()
+        token = self.peek()
+        if token[0] == 'op' and token[1] in ('=', '<>', '!=', '<', '<=', '>', '>='):
+            self.next()
+            op = '<>' if token[1] == '!=' else token[1]
+            return ('cmp', op, left, self.atom())
+        if self.accept('kw', 'CONTAINS'):
+            return ('cmp', 'contains', left, self.atom())
+        if self.accept('kw', 'STARTS'):
+            self.expect('kw', 'WITH')
+            return ('cmp', 'starts', left, self.atom())
+        if self.accept('kw', 'ENDS'):
+            self.expect('kw', 'WITH')
+            return ('cmp', 'ends', left, self.atom())
+        if self.accept('kw', 'IN'):
+            return ('cmp', 'in', left, self.atom())
+        if self.accept('kw', 'IS'):
+            negate = bool(self.accept('kw', 'NOT'))
+            self.expect('kw', 'NULL')
+            return ('isnull', left, negate)
+        return left
+
+    def atom(self):
+        token = self.next()
+        kind, value = token[0], token[1]
+        if kind in ('string', 'number'):
+            return ('lit', value)
+        if kind == 'param':
+            return ('param', value)
+        if kind == 'kw' and value in ('TRUE', 'FALSE', 'NULL'):
+            return ('lit', {'TRUE': True, 'FALSE': False, 'NULL': None}[value])
+        if kind == 'op' and value == '-' and self.at('number'):
+            return ('lit', -self.next()[1])
+        if kind == 'op' and value == '(':
+            expr = self.expr()
+            self.expect('op', ')')
+            return expr
+        if kind == 'op' and value == '[':
+            items = []
+            if not self.at('op', ']'):
+                items.append(self.expr())
+                while self.accept('op', ','):
+                    items.append(self.expr())
+            self.expect('op', ']')
+            return ('list', items)
+        if kind == 'ident':
+            if self.at('op', '('):
+                if value.lower() not in _FUNCTIONS:
+                    raise QueryError(f"Unknown function {value}()")
+                self.next()
+                args = [self.expr()]
+                self.expect('op', ')')
+                return ('fn', value.lower(), args)
+            if self.accept('op', '.'):
+                return ('prop', value, self.name())
+            return ('var', value)
+        got = 'end of query' if kind == 'end' else repr(value)
+        raise QueryError(f"Unexpected {got} at position {token[2]}")
+
+
+def parse(text):
+    """Parse a query into its AST (a dict; see _Parser.query)."""
+    return _Parser(text).query()
+
+
+# ── Evaluation ───────────────────────────────────────────────────────────
+
+def _variables(expr):
+    kind = expr[0]
+    if kind in ('var', 'prop'):
+        return {expr[1]}
+    if kind in ('and', 'or', 'list'):
+        return set().union(*[_variables(e) for e in expr[1]]) if expr[1] else set()
+    if kind == 'not':
+        return _variables(expr[1])
+    if kind == 'cmp':
+        return _variables(expr[2]) | _variables(expr[3])
+    if kind == 'isnull':
+        return _variables(expr[1])
+    if kind == 'fn':
+        return _variables(expr[2][0])
+    return set()
+
+
+def _rel_property(rel, key):
+    if key in ('type', 'label'):
+        return rel_type(rel)
+    properties = rel.get('properties') or {}
+    if key in properties:
+        return properties[key]
+    return rel.get(key)
+
+
+def _compare(op, left, right):
+    if op == 'in':
+        return isinstance(right, (list, tuple)) and left in right
+    if left is None or right is None:
+        return None
+    if op == '=':
+        return left == right
+    if op == '<>':
+        return left != right
+    if op in ('contains', 'starts', 'ends'):
+        if not isinstance(left, str) or not isinstance(right, str):
+            return None
+        return {'contains': right in left, 'starts': left.startswith(right), 'ends': left.endswith(right)}[op]
+    try:
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+    except TypeError:
+        return None
+
+
+class _Context:
+    def __init__(self, params, rel_vars):
+        self.params = params
+        self.rel_vars = rel_vars
+
+    def eval(self, expr, binding):
+        kind = expr[0]
+        if kind == 'lit':
+            return expr[1]
+        if kind == 'param':
+            if expr[1] not in self.params:
+                raise QueryError(f"Missing parameter ${expr[1]}")
+            return self.params[expr[1]]
+        if kind == 'var':
+            return binding[expr[1]]
+        if kind == 'prop':
+            element = binding[expr[1]]
+            if element is None:
+                return None
+            if expr[1] in self.rel_vars:
+                return _rel_property(element, expr[2])
+            return node_property(element, expr[2])
+        if kind == 'list':
+            return [self.eval(e, binding) for e in expr[1]]
+        if kind == 'and':
+            return all(self.eval(e, binding) for e in expr[1])
+        if kind == 'or':
+            return any(self.eval(e, binding) for e in expr[1])
+        if kind == 'not':
+            return not self.eval(expr[1], binding)
+        if kind == 'cmp':
+            return _compare(expr[1], self.eval(expr[2], binding), self.eval(expr[3], binding))
+        if kind == 'isnull':
+            is_null = self.eval(expr[1], binding) is None
+            return not is_null if expr[2] else is_null
+        if kind == 'fn':
+            arg = expr[2][0]
+            name = expr[1]
+            if name in ('id', 'type') and arg[0] == 'var':
+                element = binding[arg[1]]
+                if name == 'id':
+                    return element.get('id') if arg[1] not in self.rel_vars else None
+                return rel_type(element) if arg[1] in self.rel_vars else node_type(element)
+            value = self.eval(arg, binding)
+            if name == 'tolower':
+                return value.lower() if isinstance(value, str) else None
+            if name == 'toupper':
+                return value.upper() if isinstance(value, str) else None
+            if name == 'size':
+                return len(value) if isinstance(value, (str, list, tuple)) else None
+            raise QueryError(f"{name}() expects a variable")
+        raise QueryError(f"Cannot evaluate {kind}")
+
+    def project(self, expr, binding):
+        """A RETURN value: bare variables become the node/relationship they are bound to."""
+        if expr[0] == 'var':
+            element = binding[expr[1]]
+            if expr[1] in self.rel_vars:
+                src, tgt = rel_endpoints(element)
+                return {'source': src, 'target': tgt, 'type': rel_type(element),
+                        'properties': element.get('properties', {})}
+            return {'id': element.get('id'), 'name': node_name(element), 'type': node_type(element),
+                    'properties': element.get('properties', {})}
+        return self.eval(expr, binding)
+
+
+def _sort_key(value):
+    if value is None:
+        return (3,)
+    if isinstance(value, (bool, int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (2, json.dumps(value, sort_keys=True, default=str))
+
+
+class _Descending:
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+# ── Planning and matching ────────────────────────────────────────────────
+
+def _conjuncts(expr):
+    if expr is None:
+        return []
+    if expr[0] == 'and':
+        return [c for part in expr[1] for c in _conjuncts(part)]
+    return [expr]
+
+
+def _equalities(conjuncts, var):
+    """{key: value expr} for WHERE conditions var.key = <literal or $param>."""
+    found = {}
+    for c in conjuncts:
+        if c[0] != 'cmp' or c[1] != '=':
+            continue
+        for left, right in ((c[2], c[3]), (c[3], c[2])):
+            if right[0] not in ('lit', 'param'):
+                continue
+            if left[0] == 'prop' and left[1] == var:
+                found.setdefault(left[2], right)
+            elif left[0] == 'fn' and left[1] == 'id' and left[2][0] == ('var', var):
+                found.setdefault('id', right)
+    return found
+
+
+# Comparison seen from the property's side, for `literal < var.key` conditions
+_FLIPPED = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+def _ranges(conjuncts, var):
+    """{key: [(op, value expr)]} for WHERE conditions var.key < <literal or $param> (and <=, >, >=)."""
+    found = {}
+    for c in conjuncts:
+        if c[0] != 'cmp' or c[1] not in _FLIPPED:
+            continue
+        for left, right, op in ((c[2], c[3], c[1]), (c[3], c[2], _FLIPPED[c[1]])):
+            if left[0] == 'prop' and left[1] == var and right[0] in ('lit', 'param'):
+                found.setdefault(left[2], []).append((op, right))
+    return found
+
+
+def _candidates(index, pattern, equalities, ranges, ctx):
+    """(estimated count, description, nodes) of the cheapest lookup for a node pattern."""
+    options = []
+    for key, comparisons in ranges.items():
+        low = high = None
+        include_low = include_high = True
+        for op, value_expr in comparisons:
+            value = ctx.eval(value_expr, {})
+            # Only numbers: the range index orders dates as numbers, WHERE compares them as text
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if op in ('>', '>=') and (low is None or value >= low):
+                low, include_low = value, op == '>='
+            elif op in ('<', '<=') and (high is None or value <= high):
+                high, include_high = value, op == '<='
+        if low is not None or high is not None:
+            range_index = index.range_index(key)
+            start, end = range_index.span(low, high, include_low, include_high)
+            options.append((end - start, f'range {key}', itertools.islice(range_index.nodes, start, end)))
+    for key, value_expr in equalities.items():
+        value = ctx.eval(value_expr, {})
+        if key == 'id':
+            node = index.by_id.get(value) if isinstance(value, (int, str)) else None
+            options.append((1 if node else 0, 'id', [node] if node else []))
+        elif key == 'name':
+            nodes = index.by_name.get(value.lower(), []) if isinstance(value, str) else []
+            options.append((len(nodes), 'name', nodes))
+        elif key in ('type', 'label'):
+            nodes = index.by_type.get(str(value).lower(), [])
+            options.append((len(nodes), 'type', nodes))
+        else:
+            nodes = index.property_index(key).lookup(value)
+            options.append((len(nodes), f'property {key}', nodes))
+    if pattern['labels']:
+        nodes = []
+        for label in pattern['labels']:
+            nodes.extend(index.by_type.get(label.lower(), []))
+        options.append((len(nodes), 'type', nodes))
+    options.append((len(index.nodes), 'scan', index.nodes))
+    return min(options, key=lambda o: o[0])
+
+
+def _node_matches(node, pattern, ctx):
+    if pattern['labels']:
+        ntype = str(node_type(node)).lower()
+        if not any(ntype == label.lower() for label in pattern['labels']):
+            return False
+    for key, value_expr in pattern['props'].items():
+        if node_property(node, key) != ctx.eval(value_expr, {}):
+            return False
+    return True
+
+
+def _rel_matches(rel, pattern, ctx):
+    for key, value_expr in pattern['props'].items():
+        if _rel_property(rel, key) != ctx.eval(value_expr, {}):
+            return False
+    return True
+
+
+def execute(index, text, params=None, limit=None, max_steps=MAX_STEPS):
+    """Run a query against a GraphIndex.
+
+    Returns:
+        dict with 'columns', 'rows' (one dict per match, keyed by column),
+        'plan' (anchor variable, lookup used, estimated candidates),
+        'steps' (partial matches examined) and 'truncated' (True if
+        max_steps or the row limit cut the result short).
+    """
+    ast = parse(text)
+    nodes, rels = ast['nodes'], ast['rels']
+    node_vars = [n['var'] for n in nodes]
+    rel_vars = {r['var'] for r in rels}
+    if len(set(node_vars)) != len(node_vars) or rel_vars & set(node_vars) or len(rel_vars) != len(rels):
+        raise QueryError("Each variable may appear only once in the pattern")
+    known = set(node_vars) | rel_vars
+    ctx = _Context(params or {}, rel_vars)
+
+    # ORDER BY may name a RETURN alias instead of repeating the expression
+    aliases = {name: expr for name, expr in ast['items']}
+    order = [(aliases[e[1]] if e[0] == 'var' and e[1] not in known and e[1] in aliases else e, desc)
+             for e, desc in ast['order']]
+
+    conjuncts = _conjuncts(ast['where'])
+    for expr in conjuncts + [e for _, e in ast['items']] + [e for e, _ in order]:
+        unknown = {v for v in _variables(expr) if v not in known}
+        if unknown:
+            raise QueryError(f"Unknown variable {sorted(unknown)[0]}")
+
+    # Anchor on the most selective node pattern
+    best = None
+    for pos, pattern in enumerate(nodes):
+        equalities = dict(_equalities(conjuncts, pattern['var']))
+        for key, value_expr in pattern['props'].items():
+            equalities.setdefault(key, value_expr)
+        estimate, lookup, candidates = _candidates(index, pattern, equalities,
+                                                   _ranges(conjuncts, pattern['var']), ctx)
+        if best is None or estimate < best[0]:
+            best = (estimate, lookup, candidates, pos)
+    estimate, lookup, candidates, anchor = best
+
+    # Expansion order: right along the chain from the anchor, then left
+    steps = [(pos, pos + 1, rels[pos]['direction']) for pos in range(anchor, len(rels))]
+    steps += [(pos + 1, pos, {'out': 'in', 'in': 'out', 'both': 'both'}[rels[pos]['direction']])
+              for pos in range(anchor - 1, -1, -1)]
+
+    # Check every WHERE condition right after the step that binds its last variable
+    bound_after = [{node_vars[anchor]}]
+    for src, dst, _ in steps:
+        rel = rels[min(src, dst)]
+        bound_after.append(bound_after[-1] | {rel['var'], node_vars[dst]})
+    checks = [[] for _ in bound_after]
+    for c in conjuncts:
+        needed = _variables(c)
+        stage = next(i for i, bound in enumerate(bound_after) if needed <= bound)
+        checks[stage].append(c)
+
+    rel_types = [{t.lower() for t in r['types']} or None for r in rels]
+    budget = {'steps': 0, 'exhausted': False}
+
+    def passes(stage, binding):
+        return all(ctx.eval(c, binding) for c in checks[stage])
+
+    def expand(stage, binding):
+        if stage == len(steps):
+            yield binding
+            return
+        src, dst, direction = steps[stage]
+        rel_pos = min(src, dst)
+        for _, other_id, rel, _ in index.edges(binding[node_vars[src]].get('id'), direction, rel_types[rel_pos]):
+            budget['steps'] += 1
+            if budget['steps'] > max_steps:
+                budget['exhausted'] = True
+                return
+            node = index.by_id.get(other_id)
+            if node is None or not _node_matches(node, nodes[dst], ctx) or not _rel_matches(rel, rels[rel_pos], ctx):
+                continue
+            # A relationship is used at most once per match
+            if any(binding.get(r['var']) is rel for r in rels):
+                continue
+            binding[rels[rel_pos]['var']] = rel
+            binding[node_vars[dst]] = node
+            if passes(stage + 1, binding):
+                yield from expand(stage + 1, binding)
+            if budget['exhausted']:
+                return
+            binding[rels[rel_pos]['var']] = None
+            binding[node_vars[dst]] = None
+
+    def matches():
+        for node in candidates:
+            budget['steps'] += 1
+            if budget['steps'] > max_steps:
+                budget['exhausted'] = True
+                return
+            if not _node_matches(node, nodes[anchor], ctx):
+                continue
+            binding = dict.fromkeys(known)
+            binding[node_vars[anchor]] = node
+            if passes(0, binding):
+                yield from expand(0, binding)
+            if budget['exhausted']:
+                return
+
+    row_limit = ast['limit'] if ast['limit'] is not None else (limit if limit is not None else DEFAULT_LIMIT)
+    if limit is not None:
+        row_limit = min(row_limit, limit)
+    columns = [name for name, _ in ast['items']]
+    rows, seen, order_keys = [], set(), []
+    truncated = False
+    for binding in matches():
+        row = {name: ctx.project(expr, binding) for name, expr in ast['items']}
+        if ast['distinct']:
+            key = json.dumps(row, sort_keys=True, default=str)
+            if key in seen:
+                continue
+            seen.add(key)
+        if order:
+            keys = [_sort_key(ctx.eval(e, binding)) for e, _ in order]
+            order_keys.append(tuple(_Descending(k) if desc else k for k, (_, desc) in zip(keys, order)))
+        elif len(rows) >= row_limit:
+            truncated = True
+            break
+        rows.append(row)
+
+    if order:
+        ranked = sorted(range(len(rows)), key=lambda i: order_keys[i])
+        truncated = len(rows) > row_limit
+        rows = [rows[i] for i in ranked[:row_limit]]
+
+    return {
+        'columns': columns,
+        'rows': rows,
+        'count': len(rows),
+        'plan': {'anchor': node_vars[anchor].strip(), 'lookup': lookup, 'candidates': estimate},
+        'steps': budget['steps'],
+        'truncated': truncated or budget['exhausted']
+    }
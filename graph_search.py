@@ -0,0 +1,168 @@
+"""Inverted text index over node names, descriptions and properties, ranked with BM25."""
+
+import bisect
+import math
+import re
+
+from graph_index import node_name, node_type
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Field weights: a term in the name counts for more than one in a property
+FIELD_WEIGHTS = (('name', 3.0), ('description', 1.5), ('properties', 1.0))
+
+# How much a term matched other than exactly contributes, relative to exact
+PREFIX_WEIGHT = 0.8
+INFIX_WEIGHT = 0.5
+FUZZY_WEIGHT = 0.6
+
+_MAX_EXPANSIONS = 50    # vocabulary terms a single query term may expand to
+_FUZZY_MIN_SIMILARITY = 0.4
+
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _property_text(value):
+    """Flatten property values (nested dicts/lists included) into searchable text."""
+    if isinstance(value, dict):
+        return ' '.join(_property_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(_property_text(v) for v in value)
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return str(value)
+    return ''
+
+
+def _node_fields(node):
+    properties = node.get('properties') or {}
+    description = node.get('description') or properties.get('description') or ''
+    return {
+        'name': str(node_name(node) or ''),
+        'description': description if isinstance(description, str) else '',
+        'properties': _property_text({k: v for k, v in properties.items() if k not in ('name', 'description')})
+    }
+
+
+def node_text(node):
+    """All of a node's searchable text as one string (used for embeddings)."""
+    fields = _node_fields(node)
+    return ' '.join(filter(None, (fields['name'], str(node_type(node)), fields['description'], fields['properties'])))
+
+
+class TextIndex:
+    """Token and trigram postings for one graph, updated as nodes are added."""
+
+    def __init__(self):
+        self.nodes = []            # doc id -> node
+        self.doc_lengths = []      # doc id -> weighted token count
+        self.postings = {}         # token -> {doc id: weighted term frequency}
+        self.vocabulary = []       # sorted tokens, for prefix lookups
+        self.trigrams = {}         # trigram -> set of tokens, for infix/fuzzy lookups
+        self.total_length = 0.0
+
+    @classmethod
+    def build(cls, nodes):
+        index = cls()
+        for node in nodes:
+            index.add_node(node)
+        return index
+
+    def add_node(self, node):
+        doc_id = len(self.nodes)
+        self.nodes.append(node)
+        fields = _node_fields(node)
+        term_freqs = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields[field]):
+                term_freqs[token] = term_freqs.get(token, 0.0) + weight
+                length += weight
+        for token, tf in term_freqs.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+                for gram in _trigrams(token):
+                    self.trigrams.setdefault(gram, set()).add(token)
+            postings[doc_id] = tf
+        self.doc_lengths.append(length)
+        self.total_length += length
+
+    def _expand(self, term, prefix=True, fuzzy=True):
+        """Map a query term to [(vocabulary token, weight)]."""
+        expansions = {}
+        if term in self.postings:
+            expansions[term] = 1.0
+        if prefix:
+            i = bisect.bisect_left(self.vocabulary, term)
+            while i < len(self.vocabulary) and len(expansions) < _MAX_EXPANSIONS:
+                token = self.vocabulary[i]
+                if not token.startswith(term):
+                    break
+                expansions.setdefault(token, PREFIX_WEIGHT)
+                i += 1
+        if len(term) < 3:
+            return list(expansions.items())
+
+        # Tokens sharing trigrams with the term: substring matches, then near misses
+        term_grams = _trigrams(term)
+        inner_grams = {g for g in term_grams if ' ' not in g}
+        shared = {}
+        for gram in term_grams:
+            for token in self.trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        for token, count in sorted(shared.items(), key=lambda x: -x[1]):
+            if len(expansions) >= _MAX_EXPANSIONS:
+                break
+            if token in expansions:
+                continue
+            if count >= len(inner_grams) and term in token:
+                expansions[token] = INFIX_WEIGHT
+            elif fuzzy:
+                similarity = count / (len(term_grams) + len(_trigrams(token)) - count)
+                if similarity >= _FUZZY_MIN_SIMILARITY:
+                    expansions[token] = FUZZY_WEIGHT * similarity
+        return list(expansions.items())
+
+    def search(self, query, limit=50, node_types=None, prefix=True, fuzzy=True):
+        """Rank nodes against a query. Returns [(score, node)], best first.
+
+        Args:
+            node_types: Optional set of lowercased node types to keep
+            prefix: Also match vocabulary terms starting with a query term
+            fuzzy: Also match terms within a small trigram distance
+        """
+        n_docs = len(self.nodes)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            term_scores = {}
+            for token, weight in self._expand(term, prefix, fuzzy):
+                postings = self.postings[token]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = 1 - _BM25_B + _BM25_B * self.doc_lengths[doc_id] / avg_length
+                    score = weight * idf * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * norm)
+                    # A document matching several expansions of one term keeps the best
+                    if score > term_scores.get(doc_id, 0.0):
+                        term_scores[doc_id] = score
+            for doc_id, score in term_scores.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+
+        if node_types:
+            scores = {d: s for d, s in scores.items()
+                      if str(node_type(self.nodes[d])).lower() in node_types}
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:limit]
+        return [(score, self.nodes[doc_id]) for doc_id, score in ranked]
@@ -0,0 +1,341 @@
+"""Iterative graph traversal with bounded frontiers and work budgets."""
+
+import heapq
+from collections import deque
+
+DEFAULT_MAX_PATHS = 100
+DEFAULT_MAX_NODES = 10000
+DEFAULT_MAX_EDGES = 100000
+
+ORDERS = ('dfs', 'bfs', 'best')
+
+
+def edge_weight(rel):
+    """Numeric weight of a relationship for best-first order (default 1.0)."""
+    props = rel.get('properties') or {}
+    for key in ('weight', 'confidence', 'strength'):
+        value = rel.get(key, props.get(key))
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return 1.0
+
+
+def _unwind(entry):
+    """Turn a (node_id, rel_type, parent) chain into [node_id, rel_type, node_id, ...]."""
+    steps = []
+    while entry is not None:
+        node_id, rtype, entry = entry
+        steps.append(node_id)
+        if rtype is not None:
+            steps.append(rtype)
+    steps.reverse()
+    return steps
+
+
+def traverse(index, start_id, direction='out', depth=3, rel_types=None, order='dfs',
+             max_paths=DEFAULT_MAX_PATHS, max_nodes=DEFAULT_MAX_NODES,
+             max_edges=DEFAULT_MAX_EDGES, weight_fn=edge_weight):
+    """Walk out from start_id, reaching each node at most once.
+
+    Every node reached (other than the start) contributes the path it was
+    reached by, so 'dfs' gives the same paths a recursive preorder walk
+    would, 'bfs' gives fewest-hop paths and 'best' expands the path with the
+    highest product of edge weights first.
+
+    The walk stops as soon as a path past max_paths is reached, max_nodes
+    nodes are expanded or max_edges edges are examined (None disables a
+    limit).
+
+    Args:
+        index: GraphIndex of the graph
+        direction: 'in', 'out', or 'both'
+        rel_types: Optional set of lowercased relationship types to follow
+
+    Returns:
+        dict with 'paths' ([node_id, rel_type, node_id, ...] each),
+        'nodes_visited', 'edges_examined', 'truncated' and 'truncated_by'
+        (the limit that stopped the walk, or None if it ran to completion).
+    """
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {', '.join(ORDERS)}")
+
+    counter = 0  # insertion order, to break ties in the best-first heap
+    start = (start_id, None, None)
+    if order == 'best':
+        frontier = [(-1.0, 0, start, 0)]
+    else:
+        frontier = deque([(start, 0)])
+
+    visited = set()
+    paths = []
+    edges_examined = 0
+    truncated_by = None
+
+    while frontier:
+        if order == 'best':
+            neg_score, _, entry, d = heapq.heappop(frontier)
+        elif order == 'bfs':
+            entry, d = frontier.popleft()
+        else:
+            entry, d = frontier.pop()
+        node_id = entry[0]
+        if node_id in visited or node_id not in index.by_id:
+            continue
+        if max_nodes is not None and len(visited) >= max_nodes:
+            truncated_by = 'max_nodes'
+            break
+        visited.add(node_id)
+
+        if d > 0:
+            # Only reported as truncated once a path beyond the limit is actually reached
+            if max_paths is not None and len(paths) >= max_paths:
+                truncated_by = 'max_paths'
+                break
+            paths.append(_unwind(entry))
+        if d >= depth:
+            continue
+
+        children = []
+        for rtype, next_id, rel, _ in index.edges(node_id, direction, rel_types):
+            if max_edges is not None and edges_examined >= max_edges:
+                truncated_by = 'max_edges'
+                break
+            edges_examined += 1
+            if next_id not in visited:
+                children.append(((next_id, rtype, entry), rel))
+        if order == 'best':
+            for child, rel in children:
+                counter += 1
+                heapq.heappush(frontier, (neg_score * weight_fn(rel), counter, child, d + 1))
+        elif order == 'bfs':
+            frontier.extend((child, d + 1) for child, _ in children)
+        else:
+            # Pushed in reverse so the first edge is explored first, as in recursion
+            frontier.extend((child, d + 1) for child, _ in reversed(children))
+        if truncated_by:
+            break
+
+    return {
+        'paths': paths,
+        'nodes_visited': len(visited),
+        'edges_examined': edges_examined,
+        'truncated': truncated_by is not None,
+        'truncated_by': truncated_by
+    }
+
+
+_REVERSE = {'out': 'in', 'in': 'out', 'both': 'both'}
+
+
+def _join(forward, backward, meet):
+    """Join two BFS parent maps at meet into ([node_id, ...], [(rel_type, side), ...])."""
+    nodes, edges = [meet], []
+    node = meet
+    while forward[node] is not None:
+        node, rtype, side = forward[node]
+        nodes.append(node)
+        edges.append((rtype, side))
+    nodes.reverse()
+    edges.reverse()
+    node = meet
+    while backward[node] is not None:
+        node, rtype, side = backward[node]
+        nodes.append(node)
+        edges.append((rtype, side))
+    return nodes, edges
+
+
+def shortest_path(index, source_id, target_id, direction='out', rel_types=None,
+                  max_depth=None, max_nodes=DEFAULT_MAX_NODES):
+    """Fewest-hop path between two nodes, by bidirectional BFS.
+
+    Both ends are expanded a whole level at a time, always the end with the
+    smaller frontier, until they meet.
+
+    Returns:
+        dict with 'nodes' ([node_id, ...]) and 'edges' ([(rel_type, side), ...],
+        side 'out' if the relationship points along the path), or None if
+        there is no path (within max_depth hops and the max_nodes budget).
+        'truncated_by' says which limit, if any, cut the search short.
+    """
+    if source_id == target_id:
+        return {'nodes': [source_id], 'edges': [], 'nodes_visited': 1, 'truncated_by': None}
+
+    # parents[node] = (neighbor towards the search's root, rel_type, side along the path)
+    forward, backward = {source_id: None}, {target_id: None}
+    dist_f, dist_b = {source_id: 0}, {target_id: 0}
+    frontier_f, frontier_b = [source_id], [target_id]
+    depth_f = depth_b = 0
+    truncated_by = None
+
+    while frontier_f and frontier_b:
+        if max_depth is not None and depth_f + depth_b >= max_depth:
+            truncated_by = 'max_depth'
+            break
+        if max_nodes is not None and len(forward) + len(backward) >= max_nodes:
+            truncated_by = 'max_nodes'
+            break
+        expand_forward = len(frontier_f) <= len(frontier_b)
+        if expand_forward:
+            parents, other, dist, other_dist = forward, backward, dist_f, dist_b
+            frontier, walk = frontier_f, direction
+            depth_f += 1
+            level = depth_f
+        else:
+            parents, other, dist, other_dist = backward, forward, dist_b, dist_f
+            frontier, walk = frontier_b, _REVERSE[direction]
+            depth_b += 1
+            level = depth_b
+
+        next_frontier = []
+        best = None
+        for node_id in frontier:
+            for rtype, next_id, _, side in index.edges(node_id, walk, rel_types):
+                if next_id in parents or next_id not in index.by_id:
+                    continue
+                # Sides are recorded relative to the source -> target direction
+                along = side if expand_forward else _REVERSE[side]
+                parents[next_id] = (node_id, rtype, along)
+                dist[next_id] = level
+                next_frontier.append(next_id)
+                if next_id in other:
+                    total = level + other_dist[next_id]
+                    if best is None or total < best[0]:
+                        best = (total, next_id)
+        if best is not None:
+            nodes, edges = _join(forward, backward, best[1])
+            return {'nodes': nodes, 'edges': edges,
+                    'nodes_visited': len(forward) + len(backward), 'truncated_by': None}
+        if expand_forward:
+            frontier_f = next_frontier
+        else:
+            frontier_b = next_frontier
+
+    return {'nodes': None, 'edges': None,
+            'nodes_visited': len(forward) + len(backward), 'truncated_by': truncated_by}
+
+
+def _distances_to(index, target_id, direction, rel_types, max_hops):
+    """Hops from each node to target_id (following direction), up to max_hops."""
+    dist = {target_id: 0}
+    queue = deque([target_id])
+    walk = _REVERSE[direction]
+    while queue:
+        node_id = queue.popleft()
+        d = dist[node_id]
+        if d >= max_hops:
+            continue
+        for _, next_id, _, _ in index.edges(node_id, walk, rel_types):
+            if next_id not in dist and next_id in index.by_id:
+                dist[next_id] = d + 1
+                queue.append(next_id)
+    return dist
+
+
+def all_paths(index, source_id, target_id, max_length=4, direction='out', rel_types=None,
+              max_paths=DEFAULT_MAX_PATHS, max_edges=DEFAULT_MAX_EDGES):
+    """Every simple path of at most max_length hops from source to target.
+
+    A bounded BFS back from the target first gives each node's distance to
+    it, so the depth-first enumeration never enters a branch that cannot
+    reach the target in the hops left.
+
+    Returns:
+        dict with 'paths' (each {'nodes': [...], 'edges': [(rel_type, side), ...]}),
+        'edges_examined', 'truncated' and 'truncated_by'.
+    """
+    remaining_to_target = _distances_to(index, target_id, direction, rel_types, max_length)
+    paths = []
+    edges_examined = 0
+    truncated_by = None
+    if source_id not in remaining_to_target:
+        return {'paths': paths, 'edges_examined': 0, 'truncated': False, 'truncated_by': None}
+
+    path_nodes, path_edges = [source_id], []
+    on_path = {source_id}
+    stack = [index.edges(source_id, direction, rel_types)]
+    while stack:
+        step = next(stack[-1], None)
+        if step is None:
+            stack.pop()
+            on_path.discard(path_nodes.pop())
+            if path_edges:
+                path_edges.pop()
+            continue
+        if max_edges is not None and edges_examined >= max_edges:
+            truncated_by = 'max_edges'
+            break
+        edges_examined += 1
+        rtype, next_id, _, side = step
+        hops_left = max_length - len(path_edges) - 1
+        if next_id in on_path or remaining_to_target.get(next_id, hops_left + 1) > hops_left:
+            continue
+        if next_id == target_id:
+            if max_paths is not None and len(paths) >= max_paths:
+                truncated_by = 'max_paths'
+                break
+            paths.append({'nodes': path_nodes + [next_id], 'edges': path_edges + [(rtype, side)]})
+            continue
+        path_nodes.append(next_id)
+        path_edges.append((rtype, side))
+        on_path.add(next_id)
+        stack.append(index.edges(next_id, direction, rel_types))
+
+    return {'paths': paths, 'edges_examined': edges_examined,
+            'truncated': truncated_by is not None, 'truncated_by': truncated_by}
+
+
+def neighborhood(index, center_id, hops=2, direction='both', rel_types=None,
+                 fan_out=None, max_nodes=DEFAULT_MAX_NODES, max_edges=DEFAULT_MAX_EDGES):
+    """The subgraph within k hops of a node.
+
+    Args:
+        fan_out: Max new neighbors taken from each node, either one number
+            for every hop or a list with one number per hop (None = no limit)
+
+    Returns:
+        dict with 'depths' ({node_id: hops from center}, in discovery order),
+        'relationships' ([(source_id, rel_type, target_id)] among those
+        nodes), 'truncated' and 'truncated_by'.
+    """
+    if isinstance(fan_out, (list, tuple)):
+        limits = list(fan_out) + [fan_out[-1] if fan_out else None] * hops
+    else:
+        limits = [fan_out] * hops
+
+    depths = {center_id: 0}
+    frontier = deque([center_id])
+    truncated_by = None
+    while frontier:
+        node_id = frontier.popleft()
+        d = depths[node_id]
+        if d >= hops:
+            continue
+        taken = 0
+        for _, next_id, _, _ in index.edges(node_id, direction, rel_types):
+            if next_id in depths or next_id not in index.by_id:
+                continue
+            if limits[d] is not None and taken >= limits[d]:
+                truncated_by = truncated_by or 'fan_out'
+                break
+            if max_nodes is not None and len(depths) >= max_nodes:
+                truncated_by = 'max_nodes'
+                frontier.clear()
+                break
+            depths[next_id] = d + 1
+            frontier.append(next_id)
+            taken += 1
+
+    # Every relationship between nodes of the neighborhood (induced subgraph)
+    relationships = []
+    for node_id in depths:
+        for rtype, next_id, _, _ in index.edges(node_id, 'out', rel_types):
+            if next_id in depths:
+                relationships.append((node_id, rtype, next_id))
+        if max_edges is not None and len(relationships) > max_edges:
+            del relationships[max_edges:]
+            truncated_by = truncated_by or 'max_edges'
+            break
+
+    return {'depths': depths, 'relationships': relationships,
+            'truncated': truncated_by is not None, 'truncated_by': truncated_by}
@@ -0,0 +1,241 @@
+"""Node embeddings and top-k cosine similarity search.
+
+Vectors come from a pluggable embedder; the default hashes words and word
+pairs into a fixed number of dimensions, so it needs no model and works
+offline. To use another embedder, point GPT_GRAPH_EMBEDDER at a
+'module:attribute' that is (or returns when called) an object with:
+
+    name            identifies the embedder in saved vector files
+    dim             vector length
+    embed(texts)    list of vectors (sequences of floats), one per text
+
+NumPy is used for the similarity matrix when installed; without it the
+same queries run in pure Python, just more slowly.
+"""
+
+import hashlib
+import heapq
+import importlib
+import json
+import math
+import os
+import tempfile
+import zlib
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from graph_index import node_type
+from graph_search import node_text, tokenize
+
+EMBEDDER = os.environ.get('GPT_GRAPH_EMBEDDER', '')
+
+_VEC_MAGIC = 'gpt-graph-vectors/1'
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and adjacent word pairs, L2-normalized."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    def _vector(self, text):
+        vec = [0.0] * self.dim
+        tokens = tokenize(text)
+        counts = {}
+        for i, token in enumerate(tokens):
+            counts[token] = counts.get(token, 0) + 1
+            if i:
+                pair = tokens[i - 1] + ' ' + token
+                counts[pair] = counts.get(pair, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode('utf-8'))
+            # Sublinear term frequency; the sign bit keeps collisions from only adding up
+            vec[h % self.dim] += (1 + math.log(count)) * (1 if h & 0x80000000 else -1)
+        norm = math.sqrt(sum(v * v for v in vec))
+        return [v / norm for v in vec] if norm else vec
+
+    def embed(self, texts):
+        return [self._vector(t) for t in texts]
+
+
+def load_embedder(spec=None):
+    """Resolve GPT_GRAPH_EMBEDDER ('module:attribute'), defaulting to HashingEmbedder."""
+    spec = EMBEDDER if spec is None else spec
+    if not spec:
+        return HashingEmbedder()
+    module_name, _, attr = spec.partition(':')
+    embedder = getattr(importlib.import_module(module_name), attr or 'embedder')
+    return embedder() if isinstance(embedder, type) or not hasattr(embedder, 'embed') else embedder
+
+
+_embedder = None
+
+
+def get_embedder():
+    """The process-wide embedder, created on first use."""
+    global _embedder
+    if _embedder is None:
+        _embedder = load_embedder()
+        print(f"Using embedder {_embedder.name} ({_embedder.dim} dimensions)")
+    return _embedder
+
+
+def _normalize(vec):
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec] if norm else list(vec)
+
+
+def _text_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+class VectorIndex:
+    """One row of the similarity matrix per node, in graph order.
+
+    Rows are looked up by a hash of the text they were embedded from, so a
+    rebuild after the graph is rewritten only embeds nodes whose text
+    changed (see load_cache/save).
+    """
+
+    def __init__(self, embedder, cache=None):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.nodes = []
+        self.types = []          # lowercased node type per row, for filtering
+        self.keys = []           # text hash per row
+        self.cache = cache or {}  # text hash -> vector, from a saved file
+        self.unsaved = 0         # rows embedded since the vectors were last saved
+        self._count = 0
+        if np is not None:
+            self._matrix = np.zeros((64, self.dim), dtype=np.float32)
+        else:
+            self._rows = []
+
+    @classmethod
+    def build(cls, nodes, embedder=None, cache=None):
+        index = cls(embedder or get_embedder(), cache)
+        index.add_nodes(nodes)
+        return index
+
+    def add_node(self, node):
+        self.add_nodes([node])
+
+    def add_nodes(self, nodes):
+        texts = [node_text(n) for n in nodes]
+        keys = [_text_key(t) for t in texts]
+        pending = {}
+        for text, key in zip(texts, keys):
+            if key not in self.cache:
+                pending.setdefault(key, text)
+        if pending:
+            vectors = self.embedder.embed(list(pending.values()))
+            for key, vec in zip(pending, vectors):
+                self.cache[key] = array('f', _normalize(vec))
+            self.unsaved += len(pending)
+        for node, key in zip(nodes, keys):
+            self._append(self.cache[key])
+            self.nodes.append(node)
+            self.types.append(str(node_type(node)).lower())
+            self.keys.append(key)
+        # Saved vectors are only needed while (re)building; rows now hold them
+        self.cache = {}
+
+    def _append(self, vec):
+        if np is None:
+            self._rows.append(vec)
+        else:
+            if self._count == len(self._matrix):
+                grown = np.zeros((len(self._matrix) * 2, self.dim), dtype=np.float32)
+                grown[:self._count] = self._matrix[:self._count]
+                self._matrix = grown
+            self._matrix[self._count] = vec
+        self._count += 1
+
+    def embed_query(self, text):
+        return _normalize(self.embedder.embed([text])[0])
+
+    def row(self, i):
+        return list(self._matrix[i]) if np is not None else list(self._rows[i])
+
+    def top_k(self, query_vec, k=10, node_types=None, exclude=None):
+        """Return [(score, node)] for the k rows most similar to query_vec.
+
+        Args:
+            node_types: Optional set of lowercased node types to keep
+            exclude: Optional row number to leave out (the query node itself)
+        """
+        if not self._count or k <= 0:
+            return []
+
+        def wanted(i):
+            return i != exclude and (not node_types or self.types[i] in node_types)
+
+        if np is not None:
+            scores = self._matrix[:self._count] @ np.asarray(query_vec, dtype=np.float32)
+            if not node_types and exclude is None and k < self._count:
+                top = np.argpartition(-scores, k)[:k]
+                order = top[np.argsort(-scores[top], kind='stable')]
+            else:
+                order = np.argsort(-scores, kind='stable')
+            results = []
+            for i in order:
+                i = int(i)
+                if wanted(i):
+                    results.append((float(scores[i]), self.nodes[i]))
+                    if len(results) >= k:
+                        break
+            return results
+
+        scored = ((sum(a * b for a, b in zip(row, query_vec)), i)
+                  for i, row in enumerate(self._rows) if wanted(i))
+        return [(score, self.nodes[i]) for score, i in heapq.nlargest(k, scored, key=lambda x: x[0])]
+
+    # ── Persistence ──────────────────────────────────────────────────────
+
+    def save(self, path):
+        """Write every row (keyed by text hash) to path, atomically."""
+        header = {'format': _VEC_MAGIC, 'embedder': self.embedder.name,
+                  'dim': self.dim, 'count': self._count}
+        if np is not None:
+            data = self._matrix[:self._count].astype('<f4').tobytes()
+        else:
+            rows = array('f')
+            for row in self._rows:
+                rows.extend(row)
+            data = rows.tobytes()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(header).encode('utf-8') + b'\n')
+                f.write(b''.join(self.keys))
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.unsaved = 0
+
+    @staticmethod
+    def load_cache(path, embedder):
+        """Read saved vectors as {text hash: vector}; empty if missing or from another embedder."""
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                if (header.get('format') != _VEC_MAGIC or header.get('embedder') != embedder.name
+                        or header.get('dim') != embedder.dim):
+                    return {}
+                count, dim = header['count'], header['dim']
+                keys = f.read(8 * count)
+                data = array('f')
+                data.frombytes(f.read(4 * count * dim))
+        except (OSError, ValueError, KeyError):
+            return {}
+        if len(keys) != 8 * count or len(data) != count * dim:
+            return {}
+        return {keys[i * 8:(i + 1) * 8]: data[i * dim:(i + 1) * dim] for i in range(count)}
@@ -0,0 +1,102 @@
+"""Append-only delta log for graph merges, folded back into snapshots in the background."""
+
+import json
+import os
+import threading
+
+# Compact a graph's log into its snapshot once the log grows past this size
+WAL_COMPACT_BYTES = int(os.environ.get('GPT_GRAPH_WAL_COMPACT_BYTES', str(4 * 1024 * 1024)))
+
+
+def wal_file(graph_path):
+    """Get the delta log path for a graph snapshot path."""
+    return graph_path[:-len('.json')] + '.wal'
+
+
+def append(wal_path, record):
+    """Append one delta record as a JSON line. Returns the log's new size."""
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with open(wal_path, 'a') as f:
+        f.write(line)
+        f.flush()
+        return f.tell()
+
+
+def apply_record(graph, record):
+    """Apply a delta record to a graph dict in place."""
+    graph.setdefault('nodes', []).extend(record.get('nodes', []))
+    graph.setdefault('relationships', []).extend(record.get('relationships', []))
+    graph.update(record.get('meta', {}))
+    if 'history' in record:
+        apply_history(graph, record['history'])
+    graph['wal_seq'] = record['seq']
+
+
+def apply_history(graph, history):
+    """Replace a graph's undo history from history['start'] on with history['entries']."""
+    graph['history'] = graph.get('history', [])[:history['start']] + history['entries']
+
+
+def replay(graph, wal_path):
+    """Apply logged deltas newer than the graph's wal_seq to it in place.
+
+    Returns the (mtime_ns, size) of the log that was read, or None if there
+    is no log. A partially written last line (crash mid-append) is ignored.
+    """
+    try:
+        f = open(wal_path, 'r')
+    except FileNotFoundError:
+        return None
+    with f:
+        st = os.fstat(f.fileno())
+        applied_seq = graph.get('wal_seq', 0)
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            # Records already folded into the snapshot are skipped, so a crash
+            # between writing the snapshot and removing the log is harmless
+            if record.get('seq', 0) > applied_seq:
+                apply_record(graph, record)
+                applied_seq = record['seq']
+    return (st.st_mtime_ns, st.st_size)
+
+
+class Compactor:
+    """Background thread that folds delta logs into snapshots.
+
+    compact_fn(graph_path) does the actual work; it is called at most once
+    at a time, for graphs whose log passed the size threshold.
+    """
+
+    def __init__(self, compact_fn, threshold=WAL_COMPACT_BYTES):
+        self.compact_fn = compact_fn
+        self.threshold = threshold
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def maybe_schedule(self, graph_path, wal_size):
+        """Queue a graph for compaction if its log is over the threshold."""
+        if wal_size < self.threshold:
+            return False
+        with self._cond:
+            if graph_path not in self._pending:
+                self._pending.append(graph_path)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                graph_path = self._pending.pop(0)
+            try:
+                self.compact_fn(graph_path)
+            except Exception as e:
+                print(f"Compaction of {graph_path} failed: {e}")
@@ -1,9 +1,34 @@
 """Graph storage: load, save, delete, merge, list."""
 
+import hashlib
 import json
 import os
 import shutil
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import graph_changes
+import graph_format
+import graph_wal
+from graph_cache import GraphCache, files_signature, signature_json
+from graph_changes import ChangeConflict, changes_file
+from graph_format import BinaryGraph, binary_file
+from graph_wal import wal_file
+from graph_index import (
+    ENDPOINT_FIELDS, GraphIndex, edge_key, node_property, range_value,
+    node_key as _get_node_key, node_name as _get_node_name, node_type as _get_node_type
+)
+from graph_query import QueryError, execute as _execute_query
+from graph_search import TextIndex, tokenize
+from graph_traversal import (
+    DEFAULT_MAX_EDGES, DEFAULT_MAX_NODES, DEFAULT_MAX_PATHS,
+    all_paths, neighborhood, shortest_path, traverse
+)
+from graph_vectors import VectorIndex, get_embedder
 
 # Graph storage directories (separate workspaces)
 GRAPHS_DIR = os.path.expanduser("~/.gpt-graph/graphs")         # Client graphs
@@ -11,6 +36,19 @@ AGENT_GRAPHS_DIR = os.path.expanduser("~/.gpt-graph/agent-graphs")  # Agent-only
 os.makedirs(GRAPHS_DIR, exist_ok=True)
 os.makedirs(AGENT_GRAPHS_DIR, exist_ok=True)
 
+# Snapshot format for new writes: 'json' (pretty-printed) or 'binary' (see graph_format.py).
+# Either format is read regardless of this setting.
+GRAPH_FORMAT = os.environ.get('GPT_GRAPH_FORMAT', 'json')
+
+# Save query indexes next to graph files so cold loads can skip rebuilding them
+PERSIST_INDEX = os.environ.get('GPT_GRAPH_PERSIST_INDEX', '') not in ('', '0')
+
+# Node properties indexed as soon as a graph is loaded; others are indexed on first use.
+# A graph's own "indexes" metadata ({"hash": [...], "range": [...]}) adds to these.
+HASH_INDEXES = [k.strip() for k in os.environ.get('GPT_GRAPH_HASH_INDEXES', 'status,assigned_to').split(',') if k.strip()]
+RANGE_INDEXES = [k.strip() for k in os.environ.get('GPT_GRAPH_RANGE_INDEXES', 'priority,created_at,updated_at').split(',')
+                 if k.strip()]
+
 # Migrate legacy single-file format on startup
 _legacy_file = os.path.expanduser("~/.gpt-graph/graph-state.json")
 if os.path.exists(_legacy_file):
@@ -29,211 +67,868 @@ def _graph_file(graph_id, base_dir=None):
     return os.path.join(directory, f"{safe_id}.json")
 
 
+def _index_file(path):
+    """Get the saved-index path for a graph file."""
+    return path[:-len('.json')] + '.index'
+
+
+def _meta_file(path):
+    """Get the listing sidecar path for a graph file."""
+    return path[:-len('.json')] + '.meta'
+
+
+def _vector_file(path):
+    """Get the saved node-embeddings path for a graph file."""
+    return path[:-len('.json')] + '.vec'
+
+
+def _graph_signature(path):
+    """Signature of a graph's snapshot (either format) plus its delta log."""
+    return files_signature(path, binary_file(path), wal_file(path))
+
+
+# Parsed graphs shared by every request; see graph_cache.py
+_graph_cache = GraphCache(signature_fn=_graph_signature)
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer. Waiting writers block new readers.
+
+    Not reentrant: code holding the lock must not acquire it again.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+# One lock per graph file: queries read, merge/save/delete/compaction write
+_graph_locks = {}
+_graph_locks_guard = threading.Lock()
+
+
+def _graph_lock(path):
+    with _graph_locks_guard:
+        lock = _graph_locks.get(path)
+        if lock is None:
+            lock = _graph_locks[path] = ReadWriteLock()
+        return lock
+
+
+def _atomic_write_json(path, data, **dump_kwargs):
+    """Write JSON to a temp file in the same directory and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _load_entry(path):
+    """Get the cache entry for a graph (snapshot + delta log), reading it on a miss.
+
+    Returns None if the graph does not exist.
+    """
+    entry = _graph_cache.get(path)
+    if entry is not None:
+        return entry
+    signature = _graph_signature(path)
+    graph = None
+    try:
+        with open(path, 'r') as f:
+            graph = json.load(f)
+    except FileNotFoundError:
+        try:
+            graph = graph_format.read(binary_file(path))
+        except FileNotFoundError:
+            pass
+    if graph is None:
+        graph = {"nodes": [], "relationships": []}
+    graph_wal.replay(graph, wal_file(path))
+    if signature == (None, None, None):
+        return None
+    # Signature taken before reading, so a concurrent external write shows
+    # up as a mismatch on the next lookup rather than being missed
+    return _graph_cache.put(path, graph, signature)
+
+
+def _load_indexed(path):
+    """Load a graph and its GraphIndex (built once per cached version)."""
+    entry = _load_entry(path)
+    if entry is None:
+        graph = {"nodes": [], "relationships": []}
+        return graph, GraphIndex.build(graph)
+    if entry.index is None:
+        index = None
+        if PERSIST_INDEX:
+            index = GraphIndex.load(_index_file(path), entry.graph, entry.signature)
+        if index is None:
+            index = GraphIndex.build(entry.graph)
+            if PERSIST_INDEX:
+                try:
+                    index.save(_index_file(path), entry.graph, entry.signature)
+                except OSError as e:
+                    print(f"Failed to save index for {path}: {e}")
+        _build_configured_indexes(entry.graph, index)
+        entry.index = index
+    return entry.graph, entry.index
+
+
+def _build_configured_indexes(graph, index):
+    """Build the property indexes named in HASH_INDEXES/RANGE_INDEXES and the graph's 'indexes'."""
+    config = graph.get('indexes') if isinstance(graph.get('indexes'), dict) else {}
+    for key in HASH_INDEXES + [k for k in config.get('hash', []) if isinstance(k, str)]:
+        index.property_index(key)
+    for key in RANGE_INDEXES + [k for k in config.get('range', []) if isinstance(k, str)]:
+        index.range_index(key)
+
+
+@contextmanager
+def _reading(graph_id, base_dir=None):
+    """Hold a graph's read lock and yield (graph, index)."""
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).read():
+        yield _load_indexed(path)
+
+
+def snapshot_graph_state(graph_id='default', base_dir=None):
+    """Load a consistent copy of a graph that later merges will not change.
+
+    Merges only append to the node/relationship lists and update top-level
+    metadata, so copying the lists under the read lock is enough; the node
+    and relationship dicts themselves are shared.
+    """
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).read():
+        entry = _load_entry(path)
+        if entry is None:
+            return {"nodes": [], "relationships": []}
+        graph = entry.graph
+        return dict(graph, nodes=list(graph.get('nodes', [])),
+                    relationships=list(graph.get('relationships', [])))
+
+
 def load_graph_state(graph_id='default', base_dir=None):
-    """Load graph state from file."""
+    """Load graph state from file, with any logged merges applied.
+
+    The returned dict is shared through the graph cache; treat it as
+    read-only, or save it back with save_graph_state after changing it.
+    """
     path = _graph_file(graph_id, base_dir)
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            return json.load(f)
+    with _graph_lock(path).read():
+        entry = _load_entry(path)
+    if entry is not None:
+        return entry.graph
     return {"nodes": [], "relationships": []}
 
 
 def save_graph_state(state, graph_id='default', base_dir=None):
-    """Save graph state to file."""
-    now = time.time()
-    if 'created_at' not in state:
-        # Preserve existing created_at from disk, or set now
-        path = _graph_file(graph_id, base_dir)
-        if os.path.exists(path):
-            try:
-                with open(path, 'r') as f:
-                    existing = json.load(f)
-                state['created_at'] = existing.get('created_at', now)
-            except Exception:
-                state['created_at'] = now
-        else:
-            state['created_at'] = now
-    state['updated_at'] = now
+    """Save graph state to file, replacing any logged merges."""
     path = _graph_file(graph_id, base_dir)
-    with open(path, 'w') as f:
-        json.dump(state, f, indent=2)
+    with _graph_lock(path).write():
+        now = time.time()
+        existing = _load_entry(path)
+        if 'created_at' not in state:
+            # Preserve existing created_at from disk, or set now
+            state['created_at'] = existing.graph.get('created_at', now) if existing else now
+        state['updated_at'] = now
+        # Keep log sequence numbers monotonic: if we crash before the old log is
+        # removed, its records must not be replayed onto the new snapshot
+        state['wal_seq'] = existing.graph.get('wal_seq', 0) if existing else 0
+        previous = existing.graph if existing else {"nodes": [], "relationships": []}
+        state['revision'] = previous.get('revision', 0) + 1
+        _write_snapshot(path, state)
+        _record_change(path, state, graph_changes.diff(previous, state), previous)
     return state
 
 
+def _write_snapshot(path, state, index=None, fmt=None):
+    """Write a full snapshot, drop the delta log it supersedes, and cache it.
+
+    The snapshot is written in fmt (default GRAPH_FORMAT) and a snapshot in
+    the other format, if any, is removed.
+    """
+    fmt = fmt or GRAPH_FORMAT
+    try:
+        if fmt == 'binary':
+            graph_format.write(binary_file(path), state)
+            stale = [path, wal_file(path)]
+        else:
+            _atomic_write_json(path, state, indent=2)
+            stale = [binary_file(path), wal_file(path)]
+        for stale_path in stale:
+            if os.path.exists(stale_path):
+                os.unlink(stale_path)
+    except Exception:
+        _graph_cache.invalidate(path)
+        raise
+    signature = _graph_signature(path)
+    _graph_cache.put(path, state, signature, index)
+    _write_listing(path, state, signature)
+
+
+def _write_listing(path, graph, signature):
+    """Record what list_graphs reports for a graph in its .meta sidecar.
+
+    The sidecar stores the signature of the files it describes, so a graph
+    changed outside the server is detected and re-read on the next listing.
+    """
+    mtime = max(sig[0] for sig in signature if sig) / 1e9
+    listing = {
+        'title': graph.get('title', ''),
+        'description': graph.get('description', ''),
+        'node_count': len(graph.get('nodes', [])),
+        'relationship_count': len(graph.get('relationships', [])),
+        'created_at': graph.get('created_at', mtime),
+        'updated_at': graph.get('updated_at', mtime),
+        'modified_at': mtime,
+        'signature': signature_json(signature)
+    }
+    try:
+        _atomic_write_json(_meta_file(path), listing)
+    except OSError as e:
+        print(f"Failed to write listing sidecar for {path}: {e}")
+    return listing
+
+
+def _record_change(path, graph, change, previous=None):
+    """Append what graph's current revision changed to its changelog.
+
+    change is None if it cannot be expressed as upserts and removals, which
+    makes clients behind this revision reload the whole graph. Title and
+    description changes are recorded if previous is given.
+    """
+    record = {'revision': graph['revision']}
+    if change is None:
+        record['reset'] = True
+    else:
+        record.update(change)
+        if previous is not None:
+            meta = {key: graph.get(key, '') for key in ('title', 'description')
+                    if graph.get(key, '') != previous.get(key, '')}
+            if meta:
+                record['meta'] = meta
+    try:
+        graph_changes.append(changes_file(path), record)
+    except OSError as e:
+        print(f"Failed to record revision {graph['revision']} of {path}: {e}")
+
+
+def _compact(path):
+    """Fold a graph's delta log into its snapshot (run by the background compactor)."""
+    with _graph_lock(path).write():
+        entry = _load_entry(path)
+        if entry is None or not os.path.exists(wal_file(path)):
+            return
+        _write_snapshot(path, entry.graph, entry.index, _snapshot_format(path))
+        if entry.index is not None:
+            _save_vectors(path, entry.index.secondary('vectors'))
+
+
+def _snapshot_format(path):
+    """The format a graph is currently stored in."""
+    return 'binary' if not os.path.exists(path) and os.path.exists(binary_file(path)) else 'json'
+
+
+@contextmanager
+def _lazy_view(path):
+    """Yield (BinaryGraph, delta) if a graph can be read without materializing it.
+
+    Only applies to binary snapshots that are not already cached; delta holds
+    the nodes, relationships and metadata of merges logged since the snapshot.
+    Yields None otherwise. Call with the graph's read lock held.
+    """
+    if _graph_cache.get(path) is not None or _snapshot_format(path) != 'binary':
+        yield None
+        return
+    try:
+        view = BinaryGraph(binary_file(path))
+    except FileNotFoundError:
+        yield None
+        return
+    try:
+        meta = view.meta()
+        delta = {"nodes": [], "relationships": [], "wal_seq": meta.get('wal_seq', 0)}
+        graph_wal.replay(delta, wal_file(path))
+        yield view, delta
+    finally:
+        view.close()
+
+
+_compactor = graph_wal.Compactor(_compact)
+
+
+def convert_graph(graph_id='default', base_dir=None, fmt='binary'):
+    """Rewrite a stored graph's snapshot in the given format ('json' or 'binary')."""
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).write():
+        entry = _load_entry(path)
+        if entry is None:
+            return False
+        _write_snapshot(path, entry.graph, entry.index, fmt)
+    return True
+
+
 def delete_graph(graph_id, base_dir=None):
     """Delete a graph file."""
     path = _graph_file(graph_id, base_dir)
-    if os.path.exists(path):
-        os.unlink(path)
-        return True
-    return False
-
-
-def _get_node_key(node):
-    """Get a unique key for a node (id > name > label > properties.name)."""
-    # Prefer explicit id for dedup
-    if node.get('id'):
-        return ('id', str(node['id']))
-    # Then try name
-    name = node.get('name') or node.get('properties', {}).get('name')
-    if name:
-        return ('name', name)
-    # Then try label
-    if node.get('label'):
-        return ('label', node['label'])
-    return ('none', None)
-
-
-def merge_into_graph(new_data, graph_id='default', base_dir=None):
-    """Merge new nodes/relationships into existing graph. Deduplicates by id, then name, then label."""
-    current = load_graph_state(graph_id, base_dir)
-
-    # Build index of existing nodes by their keys
-    existing_keys = set()
-    for n in current.get('nodes', []):
-        key = _get_node_key(n)
-        if key[1]:  # Only add if key has a value
-            existing_keys.add(key)
-
-    # Add new nodes that don't already exist
-    new_nodes = new_data.get('nodes', [])
-    for node in new_nodes:
-        key = _get_node_key(node)
-        if key[1] and key not in existing_keys:
+    with _graph_lock(path).write():
+        _graph_cache.invalidate(path)
+        for extra in (_index_file(path), _meta_file(path), _vector_file(path), wal_file(path),
+                      changes_file(path)):
+            if os.path.exists(extra):
+                os.unlink(extra)
+        deleted = False
+        for snapshot in (path, binary_file(path)):
+            if os.path.exists(snapshot):
+                os.unlink(snapshot)
+                deleted = True
+    return deleted
+
+
+def _remap_endpoints(rel, id_map, index):
+    """Point a relationship's endpoints at the integer ids merged nodes were given.
+
+    Endpoints may use the string ids sub-agents emit, either for nodes in
+    this merge (id_map) or for nodes merged earlier (their _original_id).
+    """
+    for field in ENDPOINT_FIELDS:
+        value = rel.get(field)
+        if not isinstance(value, (str, int)) or isinstance(value, bool):
+            continue
+        if value in id_map:
+            rel[field] = id_map[value]
+        elif isinstance(value, str):
+            existing = index.by_key.get(('id', value))
+            if existing is not None and existing.get('id') is not None:
+                rel[field] = existing['id']
+
+
+def merge_into_graph(new_data, graph_id='default', base_dir=None, stats=None):
+    """Merge new nodes/relationships into existing graph. Deduplicates by id, then name, then label.
+
+    Nodes without an integer id get the next value of the graph's id
+    counter (kept in its 'next_id' metadata), and relationships that refer
+    to their original ids are remapped. Relationships already in the graph
+    (same source, target and type) are dropped. The additions are appended
+    to the graph's delta log rather than rewriting the whole file; the
+    compactor folds the log back into the snapshot once it grows large.
+
+    If a stats dict is passed, it is filled with added_nodes,
+    added_relationships and dropped_relationships counts.
+    """
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).write():
+        entry = _load_entry(path)
+        if entry is not None:
+            current, index = _load_indexed(path)
+        else:
+            current = {"nodes": [], "relationships": [], "created_at": time.time()}
+            index = GraphIndex()
+        next_id = max(current.get('next_id', 1), index.next_id)
+
+        # Collect new nodes that don't already exist
+        added_nodes = []
+        added_keys = {}
+        id_map = {}  # id a node arrived with -> id it has in the graph
+        for node in new_data.get('nodes', []):
+            original_id = node.get('id')
+            key = _get_node_key(node)
+            if not key[1]:
+                continue
+            existing = index.by_key.get(key) or added_keys.get(key)
+            if existing is not None:
+                if isinstance(original_id, (str, int)) and existing.get('id') is not None:
+                    id_map[original_id] = existing['id']
+                continue
             # Assign numeric id if not present or if id is string
-            if not isinstance(node.get('id'), int):
-                max_id = max([n.get('id', 0) for n in current['nodes'] if isinstance(n.get('id'), int)] + [0])
-                node['_original_id'] = node.get('id')  # Preserve original id
-                node['id'] = max_id + 1
-            current['nodes'].append(node)
-            existing_keys.add(key)
-
-    # Preserve metadata
-    for key in ('title', 'description'):
-        if key in new_data:
-            current[key] = new_data[key]
-
-    # Add new relationships
-    new_rels = new_data.get('relationships', [])
-    current['relationships'] = current.get('relationships', []) + new_rels
-
-    save_graph_state(current, graph_id, base_dir)
+            if not isinstance(original_id, int):
+                node['_original_id'] = original_id  # Preserve original id
+                node['id'] = next_id
+                if isinstance(original_id, str):
+                    id_map[original_id] = next_id
+            next_id = max(next_id, node['id'] + 1)
+            added_nodes.append(node)
+            added_keys[key] = node
+            if isinstance(original_id, str):
+                added_keys[('id', original_id)] = node
+
+        # Collect relationships, skipping ones the graph (or this merge) already has
+        new_rels = []
+        added_edge_keys = set()
+        dropped_rels = 0
+        for rel in new_data.get('relationships', []):
+            _remap_endpoints(rel, id_map, index)
+            key = edge_key(rel)
+            if key in index.edge_keys or key in added_edge_keys:
+                dropped_rels += 1
+                continue
+            added_edge_keys.add(key)
+            new_rels.append(rel)
+
+        if stats is not None:
+            stats.update({
+                'added_nodes': len(added_nodes),
+                'added_relationships': len(new_rels),
+                'dropped_relationships': dropped_rels
+            })
+
+        # Preserve metadata
+        meta = {key: new_data[key] for key in ('title', 'description', 'indexes') if key in new_data}
+        meta['updated_at'] = time.time()
+        meta['next_id'] = next_id
+        meta['revision'] = current.get('revision', 0) + 1
+        if 'created_at' not in current:
+            meta['created_at'] = meta['updated_at']
+
+        record = {
+            'seq': current.get('wal_seq', 0) + 1,
+            'nodes': added_nodes,
+            'relationships': new_rels,
+            'meta': meta
+        }
+        change = {'nodes': added_nodes, 'removed_nodes': [],
+                  'relationships': new_rels, 'removed_relationships': []}
+        if 'title' in meta or 'description' in meta:
+            change['meta'] = {key: meta[key] for key in ('title', 'description') if key in meta}
+        if entry is None:
+            # New graph: write the first snapshot directly so it gets listed
+            graph_wal.apply_record(current, record)
+            _write_snapshot(path, current)
+            _record_change(path, current, change)
+            return current
+
+        wal_size = graph_wal.append(wal_file(path), record)
+        graph_wal.apply_record(current, record)
+        # Keep the index current instead of rebuilding it on the next query
+        for node in added_nodes:
+            index.add_node(node)
+        for rel in new_rels:
+            index.add_relationship(rel)
+        signature = _graph_signature(path)
+        _graph_cache.put(path, current, signature, index)
+        _write_listing(path, current, signature)
+        _record_change(path, current, change)
+
+    _compactor.maybe_schedule(path, wal_size)
     return current
 
 
+def dedupe_graph(graph_id='default', base_dir=None):
+    """Drop duplicate relationships (same source, target and type) from a stored graph.
+
+    Keeps the first occurrence of each edge and rewrites the snapshot only
+    if something was dropped. Returns the counts before and after.
+    """
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).write():
+        entry = _load_entry(path)
+        if entry is None:
+            return None
+        current = entry.graph
+        rels = current.get('relationships', [])
+        seen = set()
+        kept = []
+        for rel in rels:
+            key = edge_key(rel)
+            if key not in seen:
+                seen.add(key)
+                kept.append(rel)
+        if len(kept) != len(rels):
+            deduped = dict(current, relationships=kept, revision=current.get('revision', 0) + 1)
+            _write_snapshot(path, deduped)
+            _record_change(path, deduped, graph_changes.diff(current, deduped))
+    return {'id': graph_id, 'relationship_count': len(rels), 'dropped_relationships': len(rels) - len(kept)}
+
+
+def push_graph_changes(changes, graph_id='default', base_dir=None):
+    """Apply the nodes and relationships a client changed since base_revision.
+
+    changes holds base_revision, the change fields of graph_changes (nodes
+    and relationships to upsert, removed_nodes ids, removed_relationships
+    [source, target, type] keys) and optionally title, description,
+    historyIndex and the client's undo history from history_start on.
+    Changes made by others since base_revision are kept as long as they
+    touch different nodes and relationships; otherwise ChangeConflict is
+    raised and nothing is written. created_at, if given, must match the
+    graph's, so a graph deleted and recreated under the same id is not
+    mistaken for the one the client has.
+
+    Pure additions are appended to the delta log like merges; updates and
+    removals rewrite the snapshot. Returns the new revision.
+    """
+    change = graph_changes.normalize(changes)
+    base = changes.get('base_revision', 0)
+    history = changes.get('history')
+    if history is not None:
+        start = changes.get('history_start', 0)
+        if not isinstance(history, list) or not isinstance(start, int) or start < 0:
+            raise ValueError("'history' must be a list and 'history_start' a non-negative integer")
+        history = {'start': start, 'entries': history}
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).write():
+        entry = _load_entry(path)
+        if entry is not None:
+            current, index = _load_indexed(path)
+        else:
+            current = {"nodes": [], "relationships": []}
+            index = GraphIndex()
+        revision = current.get('revision', 0)
+        if changes.get('created_at') is not None and changes['created_at'] != current.get('created_at'):
+            raise ChangeConflict(revision, reset=True)
+        if base != revision:
+            records = graph_changes.read_since(changes_file(path), base, revision)
+            if records is None:
+                raise ChangeConflict(revision, reset=True)
+            nodes, rels = graph_changes.conflicts(records, change)
+            if nodes or rels:
+                raise ChangeConflict(revision, nodes, rels)
+
+        meta = {key: changes[key] for key in ('title', 'description', 'historyIndex') if key in changes}
+        changed_meta = {key: meta[key] for key in ('title', 'description')
+                        if key in meta and meta[key] != current.get(key, '')}
+        if changed_meta:
+            change['meta'] = changed_meta
+        meta['updated_at'] = time.time()
+        meta['revision'] = revision + 1
+        if 'created_at' not in current:
+            meta['created_at'] = meta['updated_at']
+        int_ids = [n['id'] for n in change['nodes'] if isinstance(n['id'], int) and not isinstance(n['id'], bool)]
+        if int_ids:
+            meta['next_id'] = max(current.get('next_id', 1), index.next_id, max(int_ids) + 1)
+
+        wal_size = 0
+        if entry is not None and graph_changes.is_append_only(current, index, change):
+            record = {
+                'seq': current.get('wal_seq', 0) + 1,
+                'nodes': change['nodes'],
+                'relationships': change['relationships'],
+                'meta': meta
+            }
+            if history is not None:
+                record['history'] = history
+            wal_size = graph_wal.append(wal_file(path), record)
+            graph_wal.apply_record(current, record)
+            for node in change['nodes']:
+                index.add_node(node)
+            for rel in change['relationships']:
+                index.add_relationship(rel)
+            signature = _graph_signature(path)
+            _graph_cache.put(path, current, signature, index)
+            _write_listing(path, current, signature)
+            updated = current
+        else:
+            updated, change = graph_changes.apply(current, change)
+            updated.update(meta)
+            if history is not None:
+                graph_wal.apply_history(updated, history)
+            _write_snapshot(path, updated, fmt=_snapshot_format(path) if entry is not None else None)
+        _record_change(path, updated, change)
+
+    _compactor.maybe_schedule(path, wal_size)
+    return {
+        'revision': updated['revision'],
+        'base_revision': base,
+        'created_at': updated['created_at'],
+        'node_count': len(updated.get('nodes', [])),
+        'relationship_count': len(updated.get('relationships', []))
+    }
+
+
+def get_graph_changes(graph_id='default', since=0, base_dir=None):
+    """Net changes to a graph after revision since, or None if it does not exist.
+
+    Returns revision, created_at and the change fields of graph_changes,
+    with reset=True (and no changes) if the changelog does not reach back
+    to since; the client then has to reload the whole graph.
+    """
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).read():
+        entry = _load_entry(path)
+        if entry is None:
+            return None
+        revision = entry.graph.get('revision', 0)
+        created_at = entry.graph.get('created_at')
+        records = graph_changes.read_since(changes_file(path), since, revision)
+    result = {'revision': revision, 'since': since, 'created_at': created_at, 'reset': records is None}
+    if records is not None:
+        result.update(graph_changes.collapse(records))
+    return result
+
+
+def _read_listing(path):
+    """Read the metadata and counts list_graphs reports for one graph file."""
+    if _snapshot_format(path) == 'binary':
+        view = BinaryGraph(binary_file(path))
+        try:
+            data = view.meta()
+            node_count, rel_count = view.node_count, view.edge_count
+        finally:
+            view.close()
+        mtime = os.path.getmtime(binary_file(path))
+        data.update(nodes=[], relationships=[])
+    else:
+        with open(path, 'r') as fh:
+            data = json.load(fh)
+        node_count = rel_count = 0
+        mtime = os.path.getmtime(path)
+    if graph_wal.replay(data, wal_file(path)):
+        mtime = max(mtime, os.path.getmtime(wal_file(path)))
+    return {
+        'title': data.get('title', ''),
+        'description': data.get('description', ''),
+        'node_count': node_count + len(data.get('nodes', [])),
+        'relationship_count': rel_count + len(data.get('relationships', [])),
+        'created_at': data.get('created_at', mtime),
+        'updated_at': data.get('updated_at', mtime),
+        'modified_at': mtime
+    }
+
+
 def list_graphs(base_dir=None):
-    """List all available graphs in a directory."""
+    """List all available graphs in a directory.
+
+    Answers from each graph's .meta sidecar; a graph is only parsed if its
+    sidecar is missing or its files changed since the sidecar was written.
+    """
     directory = base_dir or GRAPHS_DIR
     graphs = []
+    for graph_id in _graph_ids(directory):
+        path = os.path.join(directory, f"{graph_id}.json")
+        try:
+            graphs.append(dict(id=graph_id, **_listing(path)))
+        except Exception:
+            graphs.append({'id': graph_id, 'node_count': 0, 'relationship_count': 0})
+    graphs.sort(key=lambda g: g.get('modified_at', 0), reverse=True)
+    return graphs
+
+
+def _graph_ids(directory):
+    """Ids of the graphs stored in a directory, in either snapshot format."""
+    graph_ids = set()
     if not os.path.exists(directory):
-        return graphs
+        return graph_ids
     for f in os.listdir(directory):
         if f.endswith('.json'):
-            graph_id = f[:-5]
-            path = os.path.join(directory, f)
-            try:
-                with open(path, 'r') as fh:
-                    data = json.load(fh)
-                mtime = os.path.getmtime(path)
-                graphs.append({
-                    'id': graph_id,
-                    'title': data.get('title', ''),
-                    'description': data.get('description', ''),
-                    'node_count': len(data.get('nodes', [])),
-                    'relationship_count': len(data.get('relationships', [])),
-                    'created_at': data.get('created_at', mtime),
-                    'updated_at': data.get('updated_at', mtime),
-                    'modified_at': mtime
-                })
-            except Exception:
-                graphs.append({'id': graph_id, 'node_count': 0, 'relationship_count': 0})
-    graphs.sort(key=lambda g: g.get('modified_at', 0), reverse=True)
-    return graphs
+            graph_ids.add(f[:-len('.json')])
+        elif f.endswith('.ggb'):
+            graph_ids.add(f[:-len('.ggb')])
+    return graph_ids
+
+
+def _version_tag(data):
+    return hashlib.blake2b(json.dumps(data).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def graph_version(graph_id='default', base_dir=None):
+    """Opaque tag that changes whenever a graph is saved, merged into or compacted.
+
+    Derived from the signatures of the graph's files, so it costs a few
+    stat calls and survives restarts. Used for HTTP ETags.
+    """
+    return _version_tag(_graph_signature(_graph_file(graph_id, base_dir)))
+
+
+def graphs_version(base_dir=None):
+    """Opaque tag that changes whenever list_graphs(base_dir) could answer differently."""
+    directory = base_dir or GRAPHS_DIR
+    return _version_tag(sorted((graph_id, _graph_signature(os.path.join(directory, f"{graph_id}.json")))
+                               for graph_id in _graph_ids(directory)))
+
+
+def _listing(path):
+    """Get a graph's listing from its sidecar, rebuilding the sidecar if stale."""
+    signature = _graph_signature(path)
+    try:
+        with open(_meta_file(path), 'r') as f:
+            listing = json.load(f)
+        if listing.pop('signature', None) == signature_json(signature):
+            return listing
+    except (OSError, ValueError):
+        pass
+    listing = _read_listing(path)
+    try:
+        _atomic_write_json(_meta_file(path), dict(listing, signature=signature_json(signature)))
+    except OSError as e:
+        print(f"Failed to write listing sidecar for {path}: {e}")
+    return listing
 
 
 # ============ GRANULAR QUERY FUNCTIONS ============
 
-def _get_node_name(node):
-    """Extract name from node (handles different formats)."""
-    return node.get('name') or node.get('properties', {}).get('name', '')
+def get_graph_summary(graph_id='default', base_dir=None):
+    """Get node/relationship counts and the name and type of every node."""
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).read():
+        with _lazy_view(path) as lazy:
+            if lazy:
+                view, delta = lazy
+                nodes = [{"name": view.node_name(i), "type": view.node_type(i)} for i in range(view.node_count)]
+                nodes.extend({"name": _get_node_name(n), "type": _get_node_type(n)} for n in delta['nodes'])
+                return {
+                    "node_count": len(nodes),
+                    "relationship_count": view.edge_count + len(delta['relationships']),
+                    "nodes": nodes
+                }
+        entry = _load_entry(path)
+        graph = entry.graph if entry else {"nodes": [], "relationships": []}
+        return _get_graph_summary(graph, None)
+
+
+def _get_graph_summary(graph, index):
+    return {
+        "node_count": len(graph.get('nodes', [])),
+        "relationship_count": len(graph.get('relationships', [])),
+        "nodes": [{"name": _get_node_name(n), "type": _get_node_type(n)} for n in graph.get('nodes', [])]
+    }
 
 
-def _get_node_type(node):
-    """Extract type/label from node."""
-    if 'type' in node:
-        return node['type']
-    labels = node.get('labels', [])
-    return labels[0] if labels else 'Unknown'
+def search_nodes(graph_id='default', query='', limit=50, base_dir=None, node_type=None):
+    """Search nodes by name, description and properties, best matches first.
 
+    Terms also match by prefix, by substring and approximately (typos).
+    An empty query lists nodes in file order. node_type restricts results to
+    one or more (comma-separated) node types.
+    """
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _search_nodes(graph, index, query, limit, node_type)
+
+
+def _search_nodes(graph, index, query='', limit=50, node_type=None):
+    types = None
+    if node_type:
+        types = {t.strip().lower() for t in node_type.split(',') if t.strip()}
+    text = index.secondary('text', TextIndex.build)
+    if tokenize(query):
+        matches = text.search(query, limit, types)
+    elif types:
+        matches = [(0.0, n) for t in sorted(types) for n in index.by_type.get(t, [])][:limit]
+    else:
+        matches = [(0.0, n) for n in index.nodes[:limit]]
 
-def _build_node_index(graph):
-    """Build indexes for fast lookups."""
-    nodes = graph.get('nodes', [])
-    rels = graph.get('relationships', [])
+    return [{
+        'id': n.get('id'),
+        'name': _get_node_name(n),
+        'type': _get_node_type(n),
+        'properties': n.get('properties', {}),
+        'score': round(score, 4)
+    } for score, n in matches]
 
-    by_id = {}
-    by_name = {}
-    for n in nodes:
-        nid = n.get('id')
-        name = _get_node_name(n)
-        if nid is not None:
-            by_id[nid] = n
-        if name:
-            by_name[name.lower()] = n
 
-    # Build adjacency lists
-    outgoing = {}  # node_id -> [(rel_type, target_id, rel)]
-    incoming = {}  # node_id -> [(rel_type, source_id, rel)]
+def _vector_index(path, index):
+    """Get a graph's VectorIndex, reusing saved embeddings for unchanged nodes.
 
-    for rel in rels:
-        src = rel.get('source') or rel.get('startNode') or rel.get('startNodeId') or rel.get('from')
-        tgt = rel.get('target') or rel.get('endNode') or rel.get('endNodeId') or rel.get('to')
-        rel_type = rel.get('type') or rel.get('label') or 'RELATED_TO'
+    Newly embedded rows are saved right after a build; rows added later by
+    merges are saved when the graph's delta log is compacted.
+    """
+    built = []
 
-        if src not in outgoing:
-            outgoing[src] = []
-        outgoing[src].append((rel_type, tgt, rel))
+    def build(nodes):
+        cache = VectorIndex.load_cache(_vector_file(path), get_embedder())
+        built.append(VectorIndex.build(nodes, cache=cache))
+        return built[0]
 
-        if tgt not in incoming:
-            incoming[tgt] = []
-        incoming[tgt].append((rel_type, src, rel))
+    vectors = index.secondary('vectors', build)
+    if built:
+        _save_vectors(path, vectors)
+    return vectors
 
-    return by_id, by_name, outgoing, incoming
 
+def _save_vectors(path, vectors):
+    if vectors is None or not vectors.unsaved:
+        return
+    try:
+        vectors.save(_vector_file(path))
+    except OSError as e:
+        print(f"Failed to save embeddings for {path}: {e}")
 
-def search_nodes(graph_id='default', query='', limit=50, base_dir=None):
-    """Search nodes by name (case-insensitive substring match)."""
-    graph = load_graph_state(graph_id, base_dir)
-    nodes = graph.get('nodes', [])
-    query_lower = query.lower()
 
-    results = []
-    for n in nodes:
-        name = _get_node_name(n)
-        if query_lower in name.lower():
-            results.append({
-                'id': n.get('id'),
-                'name': name,
-                'type': _get_node_type(n),
-                'properties': n.get('properties', {})
-            })
-            if len(results) >= limit:
-                break
+def similar_nodes(graph_id='default', query=None, node_name=None, k=10, base_dir=None, node_type=None):
+    """Find the k nodes most similar to a text query, or to an existing node.
 
-    return results
+    Ranks by cosine similarity of node embeddings (see graph_vectors.py).
+    Returns None if node_name is given but no such node exists.
+    """
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).read():
+        graph, index = _load_indexed(path)
+        _vector_index(path, index)
+        return _similar_nodes(graph, index, query, node_name, k, node_type)
+
+
+def _similar_nodes(graph, index, query=None, node_name=None, k=10, node_type=None):
+    vectors = index.secondary('vectors', VectorIndex.build)
+    types = None
+    if node_type:
+        types = {t.strip().lower() for t in node_type.split(',') if t.strip()}
+
+    if node_name:
+        node = index.node_by_name(node_name)
+        if node is None:
+            return None
+        row = next(i for i, n in enumerate(vectors.nodes) if n is node)
+        matches = vectors.top_k(vectors.row(row), k, types, exclude=row)
+    else:
+        matches = vectors.top_k(vectors.embed_query(query or ''), k, types)
+
+    return [{
+        'id': n.get('id'),
+        'name': _get_node_name(n),
+        'type': _get_node_type(n),
+        'properties': n.get('properties', {}),
+        'score': round(score, 4)
+    } for score, n in matches]
 
 
 def get_node_with_neighbors(graph_id='default', node_id=None, node_name=None, depth=1, base_dir=None):
     """Get a node and its neighbors up to N levels deep."""
-    graph = load_graph_state(graph_id, base_dir)
-    by_id, by_name, outgoing, incoming = _build_node_index(graph)
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _get_node_with_neighbors(graph, index, node_id, node_name, depth)
 
+
+def _get_node_with_neighbors(graph, index, node_id=None, node_name=None, depth=1):
     # Find the starting node
     start_node = None
     if node_id is not None:
-        start_node = by_id.get(node_id)
+        start_node = index.by_id.get(node_id)
     elif node_name:
-        start_node = by_name.get(node_name.lower())
+        start_node = index.node_by_name(node_name)
 
     if not start_node:
         return None
@@ -242,15 +937,15 @@ def get_node_with_neighbors(graph_id='default', node_id=None, node_name=None, de
     visited_ids = set()
     result_nodes = []
     result_rels = []
-    queue = [(start_node.get('id'), 0)]  # (node_id, current_depth)
+    queue = deque([(start_node.get('id'), 0)])  # (node_id, current_depth)
 
     while queue:
-        nid, d = queue.pop(0)
+        nid, d = queue.popleft()
         if nid in visited_ids:
             continue
         visited_ids.add(nid)
 
-        node = by_id.get(nid)
+        node = index.by_id.get(nid)
         if node:
             result_nodes.append({
                 'id': node.get('id'),
@@ -261,23 +956,13 @@ def get_node_with_neighbors(graph_id='default', node_id=None, node_name=None, de
             })
 
         if d < depth:
-            # Add outgoing neighbors
-            for rel_type, tgt_id, rel in outgoing.get(nid, []):
-                if tgt_id not in visited_ids:
-                    queue.append((tgt_id, d + 1))
-                    result_rels.append({
-                        'source': nid,
-                        'target': tgt_id,
-                        'type': rel_type
-                    })
-
-            # Add incoming neighbors
-            for rel_type, src_id, rel in incoming.get(nid, []):
-                if src_id not in visited_ids:
-                    queue.append((src_id, d + 1))
+            # Add outgoing and incoming neighbors
+            for rel_type, other_id, rel, side in index.edges(nid, 'both'):
+                if other_id not in visited_ids:
+                    queue.append((other_id, d + 1))
                     result_rels.append({
-                        'source': src_id,
-                        'target': nid,
+                        'source': nid if side == 'out' else other_id,
+                        'target': other_id if side == 'out' else nid,
                         'type': rel_type
                     })
 
@@ -298,49 +983,31 @@ def get_nodes_by_relation(graph_id='default', node_name=None, relation_type=None
         relation_type: Type of relationship to filter (or None for all)
         direction: 'in' (pointing to node), 'out' (from node), or 'both'
     """
-    graph = load_graph_state(graph_id, base_dir)
-    by_id, by_name, outgoing, incoming = _build_node_index(graph)
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _get_nodes_by_relation(graph, index, node_name, relation_type, direction)
 
-    center = by_name.get(node_name.lower()) if node_name else None
+
+def _get_nodes_by_relation(graph, index, node_name=None, relation_type=None, direction='both'):
+    center = index.node_by_name(node_name)
     if not center:
         return {'error': f'Node "{node_name}" not found'}
 
-    center_id = center.get('id')
+    rel_types = {relation_type.lower()} if relation_type else None
     results = []
 
-    # Outgoing relations (center -> other)
-    if direction in ('out', 'both'):
-        for rel_type, tgt_id, rel in outgoing.get(center_id, []):
-            if relation_type and rel_type.lower() != relation_type.lower():
-                continue
-            tgt_node = by_id.get(tgt_id)
-            if tgt_node:
-                results.append({
-                    'node': {
-                        'id': tgt_node.get('id'),
-                        'name': _get_node_name(tgt_node),
-                        'type': _get_node_type(tgt_node)
-                    },
-                    'relation': rel_type,
-                    'direction': 'out'
-                })
-
-    # Incoming relations (other -> center)
-    if direction in ('in', 'both'):
-        for rel_type, src_id, rel in incoming.get(center_id, []):
-            if relation_type and rel_type.lower() != relation_type.lower():
-                continue
-            src_node = by_id.get(src_id)
-            if src_node:
-                results.append({
-                    'node': {
-                        'id': src_node.get('id'),
-                        'name': _get_node_name(src_node),
-                        'type': _get_node_type(src_node)
-                    },
-                    'relation': rel_type,
-                    'direction': 'in'
-                })
+    # Outgoing relations (center -> other) first, then incoming (other -> center)
+    for rel_type, other_id, rel, side in index.edges(center.get('id'), direction, rel_types):
+        other = index.by_id.get(other_id)
+        if other:
+            results.append({
+                'node': {
+                    'id': other.get('id'),
+                    'name': _get_node_name(other),
+                    'type': _get_node_type(other)
+                },
+                'relation': rel_type,
+                'direction': side
+            })
 
     return {
         'center': node_name,
@@ -352,26 +1019,33 @@ def get_nodes_by_relation(graph_id='default', node_name=None, relation_type=None
 
 def get_graph_labels(graph_id='default', base_dir=None):
     """Get all unique node types/labels and relationship types in the graph."""
-    graph = load_graph_state(graph_id, base_dir)
-
-    node_types = {}
-    for n in graph.get('nodes', []):
-        t = _get_node_type(n)
-        node_types[t] = node_types.get(t, 0) + 1
-
-    rel_types = {}
-    for r in graph.get('relationships', []):
-        t = r.get('type') or r.get('label') or 'RELATED_TO'
-        rel_types[t] = rel_types.get(t, 0) + 1
-
+    path = _graph_file(graph_id, base_dir)
+    with _graph_lock(path).read():
+        with _lazy_view(path) as lazy:
+            if lazy:
+                view, delta = lazy
+                index = GraphIndex.build(delta)
+                for i in range(view.node_count):
+                    t = view.node_type(i)
+                    index.node_types[t] = index.node_types.get(t, 0) + 1
+                for i in range(view.edge_count):
+                    t = view.rel_type(i)
+                    index.rel_types[t] = index.rel_types.get(t, 0) + 1
+                return _get_graph_labels(None, index)
+        graph, index = _load_indexed(path)
+        return _get_graph_labels(graph, index)
+
+
+def _get_graph_labels(graph, index):
     return {
-        'node_types': [{'type': k, 'count': v} for k, v in sorted(node_types.items(), key=lambda x: -x[1])],
-        'relationship_types': [{'type': k, 'count': v} for k, v in sorted(rel_types.items(), key=lambda x: -x[1])]
+        'node_types': [{'type': k, 'count': v} for k, v in sorted(index.node_types.items(), key=lambda x: -x[1])],
+        'relationship_types': [{'type': k, 'count': v} for k, v in sorted(index.rel_types.items(), key=lambda x: -x[1])]
     }
 
 
 def traverse_graph(graph_id='default', start_name=None, direction='out', depth=3,
-                   relation_filter=None, base_dir=None):
+                   relation_filter=None, base_dir=None, order='dfs',
+                   max_paths=DEFAULT_MAX_PATHS, max_nodes=DEFAULT_MAX_NODES, max_edges=DEFAULT_MAX_EDGES):
     """Traverse the graph from a starting node following relationships.
 
     Args:
@@ -379,60 +1053,461 @@ def traverse_graph(graph_id='default', start_name=None, direction='out', depth=3
         direction: 'in', 'out', or 'both'
         depth: Max traversal depth
         relation_filter: Only follow these relationship types (comma-separated or list)
+        order: 'dfs', 'bfs' or 'best' (heaviest edges first), see graph_traversal.py
+        max_paths, max_nodes, max_edges: Stop early once any is reached
     """
-    graph = load_graph_state(graph_id, base_dir)
-    by_id, by_name, outgoing, incoming = _build_node_index(graph)
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _traverse_graph(graph, index, start_name, direction, depth, relation_filter,
+                               order, max_paths, max_nodes, max_edges)
 
-    start = by_name.get(start_name.lower()) if start_name else None
+
+def _traverse_graph(graph, index, start_name=None, direction='out', depth=3, relation_filter=None,
+                    order='dfs', max_paths=DEFAULT_MAX_PATHS, max_nodes=DEFAULT_MAX_NODES,
+                    max_edges=DEFAULT_MAX_EDGES):
+    start = index.node_by_name(start_name)
     if not start:
         return {'error': f'Node "{start_name}" not found'}
 
-    # Parse relation filter
-    allowed_rels = None
-    if relation_filter:
-        if isinstance(relation_filter, str):
-            allowed_rels = set(r.strip().lower() for r in relation_filter.split(','))
-        else:
-            allowed_rels = set(r.lower() for r in relation_filter)
+    allowed_rels = _parse_relation_filter(relation_filter)
+    result = traverse(index, start.get('id'), direction, depth, allowed_rels, order,
+                      max_paths, max_nodes, max_edges)
 
-    visited = set()
-    paths = []  # List of paths: [(node_name, rel_type, node_name, ...)]
+    # Paths as [node_name, "--[REL]-->", node_name, ...]
+    paths = []
+    for steps in result['paths']:
+        paths.append([_get_node_name(index.by_id[step]) if i % 2 == 0 else f"--[{step}]-->"
+                      for i, step in enumerate(steps)])
+
+    return {
+        'start': start_name,
+        'direction': direction,
+        'depth': depth,
+        'order': order,
+        'relation_filter': relation_filter,
+        'path_count': len(paths),
+        'paths': paths,
+        'nodes_visited': result['nodes_visited'],
+        'edges_examined': result['edges_examined'],
+        'truncated': result['truncated'],
+        'truncated_by': result['truncated_by']
+    }
 
-    def dfs(node_id, path, d):
-        if d > depth or node_id in visited:
-            return
-        visited.add(node_id)
 
-        node = by_id.get(node_id)
+def _parse_relation_filter(relation_filter):
+    """Relationship types to follow (comma-separated string or list) as a lowercased set."""
+    if not relation_filter:
+        return None
+    if isinstance(relation_filter, str):
+        return set(r.strip().lower() for r in relation_filter.split(','))
+    return set(r.lower() for r in relation_filter)
+
+
+def _format_path(index, nodes, edges):
+    """[name, "--[REL]-->", name, ...] with "<--[REL]--" for edges against the path."""
+    steps = [_get_node_name(index.by_id[nodes[0]])]
+    for (rtype, side), node_id in zip(edges, nodes[1:]):
+        steps.append(f"--[{rtype}]-->" if side == 'out' else f"<--[{rtype}]--")
+        steps.append(_get_node_name(index.by_id[node_id]))
+    return steps
+
+
+def _path_result(index, nodes, edges):
+    return {
+        'length': len(edges),
+        'path': _format_path(index, nodes, edges),
+        'nodes': [{'id': nid, 'name': _get_node_name(index.by_id[nid]),
+                   'type': _get_node_type(index.by_id[nid])} for nid in nodes],
+        'relationships': [{'source': a if side == 'out' else b, 'target': b if side == 'out' else a, 'type': rtype}
+                          for (rtype, side), a, b in zip(edges, nodes, nodes[1:])]
+    }
+
+
+def find_shortest_path(graph_id='default', from_name=None, to_name=None, direction='out',
+                       relation_filter=None, max_depth=None, base_dir=None):
+    """Fewest-hop path between two named nodes (bidirectional BFS).
+
+    Args:
+        direction: 'out' follows relationships forward, 'in' backward, 'both' either way
+        relation_filter: Only follow these relationship types (comma-separated or list)
+        max_depth: Give up on paths longer than this many hops
+    """
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _find_shortest_path(graph, index, from_name, to_name, direction, relation_filter, max_depth)
+
+
+def _find_shortest_path(graph, index, from_name=None, to_name=None, direction='out',
+                        relation_filter=None, max_depth=None):
+    source, target = index.node_by_name(from_name), index.node_by_name(to_name)
+    for name, node in ((from_name, source), (to_name, target)):
         if not node:
-            return
+            return {'error': f'Node "{name}" not found'}
 
-        node_name = _get_node_name(node)
-        current_path = path + [node_name]
+    result = shortest_path(index, source.get('id'), target.get('id'), direction,
+                           _parse_relation_filter(relation_filter), max_depth)
+    response = {
+        'from': from_name,
+        'to': to_name,
+        'direction': direction,
+        'relation_filter': relation_filter,
+        'found': result['nodes'] is not None,
+        'nodes_visited': result['nodes_visited'],
+        'truncated_by': result['truncated_by']
+    }
+    if result['nodes'] is not None:
+        response.update(_path_result(index, result['nodes'], result['edges']))
+    return response
 
-        if d > 0:  # Don't record just the start node
-            paths.append(current_path)
 
-        if d < depth:
-            edges = []
-            if direction in ('out', 'both'):
-                edges.extend((rel_type, tgt_id, 'out') for rel_type, tgt_id, _ in outgoing.get(node_id, []))
-            if direction in ('in', 'both'):
-                edges.extend((rel_type, src_id, 'in') for rel_type, src_id, _ in incoming.get(node_id, []))
+def find_all_paths(graph_id='default', from_name=None, to_name=None, max_length=4, direction='out',
+                   relation_filter=None, max_paths=DEFAULT_MAX_PATHS, base_dir=None):
+    """Every simple path of at most max_length hops between two named nodes."""
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _find_all_paths(graph, index, from_name, to_name, max_length, direction,
+                               relation_filter, max_paths)
 
-            for rel_type, next_id, _ in edges:
-                if allowed_rels and rel_type.lower() not in allowed_rels:
-                    continue
-                if next_id not in visited:
-                    dfs(next_id, current_path + [f"--[{rel_type}]-->"], d + 1)
 
-    dfs(start.get('id'), [], 0)
+def _find_all_paths(graph, index, from_name=None, to_name=None, max_length=4, direction='out',
+                    relation_filter=None, max_paths=DEFAULT_MAX_PATHS):
+    source, target = index.node_by_name(from_name), index.node_by_name(to_name)
+    for name, node in ((from_name, source), (to_name, target)):
+        if not node:
+            return {'error': f'Node "{name}" not found'}
 
+    result = all_paths(index, source.get('id'), target.get('id'), max_length, direction,
+                       _parse_relation_filter(relation_filter), max_paths)
     return {
-        'start': start_name,
+        'from': from_name,
+        'to': to_name,
+        'max_length': max_length,
         'direction': direction,
-        'depth': depth,
         'relation_filter': relation_filter,
-        'path_count': len(paths),
-        'paths': paths[:100]  # Limit output
+        'path_count': len(result['paths']),
+        'paths': [_path_result(index, p['nodes'], p['edges']) for p in result['paths']],
+        'edges_examined': result['edges_examined'],
+        'truncated': result['truncated'],
+        'truncated_by': result['truncated_by']
+    }
+
+
+def get_neighborhood(graph_id='default', node_name=None, hops=2, direction='both', relation_filter=None,
+                     fan_out=None, max_nodes=DEFAULT_MAX_NODES, base_dir=None):
+    """The subgraph within k hops of a named node.
+
+    Args:
+        fan_out: Max new neighbors taken per node, one number or one per hop
+        max_nodes: Stop growing the neighborhood at this many nodes
+    """
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _get_neighborhood(graph, index, node_name, hops, direction, relation_filter, fan_out, max_nodes)
+
+
+def _get_neighborhood(graph, index, node_name=None, hops=2, direction='both', relation_filter=None,
+                      fan_out=None, max_nodes=DEFAULT_MAX_NODES):
+    center = index.node_by_name(node_name)
+    if not center:
+        return {'error': f'Node "{node_name}" not found'}
+
+    result = neighborhood(index, center.get('id'), hops, direction,
+                          _parse_relation_filter(relation_filter), fan_out, max_nodes)
+    nodes = []
+    for nid, depth in result['depths'].items():
+        node = index.by_id.get(nid)
+        if node:
+            nodes.append({
+                'id': nid,
+                'name': _get_node_name(node),
+                'type': _get_node_type(node),
+                'properties': node.get('properties', {}),
+                'depth': depth
+            })
+    return {
+        'center': node_name,
+        'hops': hops,
+        'direction': direction,
+        'relation_filter': relation_filter,
+        'fan_out': fan_out,
+        'node_count': len(nodes),
+        'nodes': nodes,
+        'relationships': [{'source': src, 'target': tgt, 'type': rtype}
+                          for src, rtype, tgt in result['relationships']],
+        'truncated': result['truncated'],
+        'truncated_by': result['truncated_by']
     }
+
+
+# ============ PROPERTY FILTERS ============
+
+# key__op suffixes accepted by filter_nodes: op -> (bound it sets, inclusive)
+_RANGE_OPS = {'gt': ('low', False), 'gte': ('low', True), 'lt': ('high', False), 'lte': ('high', True)}
+
+
+def _filter_values(value):
+    """Values an equality filter accepts: a query-string value also as the JSON it spells (3, true)."""
+    values = [value]
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return values
+        if not isinstance(parsed, (dict, list, str)):
+            values.append(parsed)
+    return values
+
+
+def filter_nodes(graph_id='default', node_type=None, filters=None, limit=100, base_dir=None):
+    """Nodes of the given type(s) whose properties match every filter.
+
+    filters maps a property key to the value it must equal, or key__gt,
+    key__gte, key__lt or key__lte to a bound on a numeric or ISO 8601 date
+    property. The lookup starts from whichever type, hash or range index
+    yields the fewest candidates, and the other filters are checked on those.
+
+    Raises:
+        ValueError: for an unknown operator or a bound that is not a number or date
+    """
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _filter_nodes(graph, index, node_type, filters, limit)
+
+
+def _filter_nodes(graph, index, node_type=None, filters=None, limit=100):
+    types = None
+    if node_type:
+        types = {t.strip().lower() for t in node_type.split(',') if t.strip()}
+    equal, ranges = {}, {}
+    for spec, value in (filters or {}).items():
+        key, _, op = spec.partition('__')
+        if not op:
+            equal[key] = _filter_values(value)
+            continue
+        if op not in _RANGE_OPS:
+            raise ValueError(f"Unknown filter operator '{op}' (expected {', '.join(_RANGE_OPS)})")
+        bound = range_value(_filter_values(value)[-1])
+        if bound is None:
+            raise ValueError(f"{spec} needs a number or ISO 8601 date, got {value!r}")
+        low, high, include_low, include_high = ranges.get(key, (None, None, True, True))
+        side, inclusive = _RANGE_OPS[op]
+        if side == 'low':
+            low, include_low = bound, inclusive
+        else:
+            high, include_high = bound, inclusive
+        ranges[key] = (low, high, include_low, include_high)
+
+    # (candidate count, index used, function producing the candidates)
+    options = [(len(index.nodes), 'scan', lambda: index.nodes)]
+    if types:
+        options.append((sum(len(index.by_type.get(t, [])) for t in types), 'type',
+                        lambda: [n for t in sorted(types) for n in index.by_type.get(t, [])]))
+    for key, values in equal.items():
+        hash_index = index.property_index(key)
+        options.append((sum(len(hash_index.lookup(v)) for v in values), f'property {key}',
+                        lambda h=hash_index, vs=values: [n for v in vs for n in h.lookup(v)]))
+    for key, bounds in ranges.items():
+        start, end = index.range_index(key).span(*bounds)
+        options.append((end - start, f'range {key}', lambda r=index.range_index(key), b=bounds: r.range(*b)))
+    estimate, used, candidates = min(options, key=lambda o: o[0])
+
+    def matches(node):
+        if types and str(_get_node_type(node)).lower() not in types:
+            return False
+        for key, values in equal.items():
+            if node_property(node, key) not in values:
+                return False
+        for key, (low, high, include_low, include_high) in ranges.items():
+            value = range_value(node_property(node, key))
+            if value is None:
+                return False
+            if low is not None and (value < low or (value == low and not include_low)):
+                return False
+            if high is not None and (value > high or (value == high and not include_high)):
+                return False
+        return True
+
+    found = [n for n in candidates() if matches(n)]
+    return {
+        'type': node_type,
+        'filters': filters or {},
+        'index': used,
+        'candidates': estimate,
+        'count': len(found),
+        'nodes': [{
+            'id': n.get('id'),
+            'name': _get_node_name(n),
+            'type': _get_node_type(n),
+            'properties': n.get('properties', {})
+        } for n in found[:limit]]
+    }
+
+
+# ============ PATTERN QUERIES ============
+
+def run_query(graph_id='default', query='', params=None, limit=None, base_dir=None):
+    """Run a MATCH ... RETURN pattern query (see graph_query).
+
+    Raises:
+        QueryError: if the query does not parse or is invalid
+    """
+    with _reading(graph_id, base_dir) as (graph, index):
+        return _run_query(graph, index, query, params, limit)
+
+
+def _run_query(graph, index, query='', params=None, limit=None):
+    result = _execute_query(index, query, params, limit)
+    result['query'] = query
+    return result
+
+
+# ============ BATCH QUERIES ============
+
+# Most queries one /v1/graph/batch request may carry
+BATCH_MAX_QUERIES = 200
+
+
+def _int_param(q, key, default=None):
+    value = q.get(key)
+    return default if value is None or value == '' else int(value)
+
+
+def _fan_out_param(q):
+    fan_out = q.get('fan_out')
+    if isinstance(fan_out, str):
+        fan_out = [int(f) for f in fan_out.split(',') if f.strip()]
+    return fan_out or None
+
+
+# op -> fn(graph, index, query); parameter names match the GET endpoints
+_BATCH_OPS = {
+    'summary': lambda g, i, q: _get_graph_summary(g, i),
+    'labels': lambda g, i, q: _get_graph_labels(g, i),
+    'search': lambda g, i, q: _search_nodes(g, i, q.get('q', ''), _int_param(q, 'limit', 50), q.get('type')),
+    'similar': lambda g, i, q: _similar_nodes(g, i, q.get('q', ''), q.get('name'), _int_param(q, 'k', 10),
+                                              q.get('type')),
+    'node': lambda g, i, q: _get_node_with_neighbors(g, i, _int_param(q, 'node_id'), q.get('name', ''),
+                                                     _int_param(q, 'depth', 1)),
+    'relations': lambda g, i, q: _get_nodes_by_relation(g, i, q.get('node', ''), q.get('relation'),
+                                                        q.get('direction', 'both')),
+    'traverse': lambda g, i, q: _traverse_graph(
+        g, i, q.get('start', ''), q.get('direction', 'out'), _int_param(q, 'depth', 3), q.get('relation'),
+        q.get('order', 'dfs'), _int_param(q, 'max_paths', DEFAULT_MAX_PATHS),
+        _int_param(q, 'max_nodes', DEFAULT_MAX_NODES), _int_param(q, 'max_edges', DEFAULT_MAX_EDGES)),
+    'path': lambda g, i, q: _find_shortest_path(g, i, q.get('from', ''), q.get('to', ''),
+                                                q.get('direction', 'out'), q.get('relation'),
+                                                _int_param(q, 'max_depth')),
+    'paths': lambda g, i, q: _find_all_paths(g, i, q.get('from', ''), q.get('to', ''), _int_param(q, 'k', 4),
+                                             q.get('direction', 'out'), q.get('relation'),
+                                             _int_param(q, 'max_paths', DEFAULT_MAX_PATHS)),
+    'neighborhood': lambda g, i, q: _get_neighborhood(g, i, q.get('name', ''), _int_param(q, 'hops', 2),
+                                                      q.get('direction', 'both'), q.get('relation'),
+                                                      _fan_out_param(q), _int_param(q, 'max_nodes', DEFAULT_MAX_NODES)),
+    'nodes': lambda g, i, q: _filter_nodes(g, i, q.get('type'), q.get('filters'), _int_param(q, 'limit', 100)),
+    'query': lambda g, i, q: _run_query(g, i, q.get('q', ''), q.get('params'), _int_param(q, 'limit')),
+}
+
+BATCH_OPS = tuple(_BATCH_OPS)
+
+
+def _run_batch_group(path, queries):
+    """Run [(position, query)] against one graph under a single read lock."""
+    results = []
+    with _graph_lock(path).read():
+        graph, index = _load_indexed(path)
+        if any(q.get('op') == 'similar' for _, q in queries):
+            _vector_index(path, index)
+        for position, q in queries:
+            try:
+                result = _BATCH_OPS[q['op']](graph, index, q)
+            except QueryError as e:
+                results.append((position, {'error': str(e)}))
+                continue
+            except (TypeError, ValueError) as e:
+                results.append((position, {'error': f"Invalid parameters: {e}"}))
+                continue
+            if result is None:
+                result = {'error': 'Node not found'}
+            results.append((position, result))
+    return results
+
+
+def run_batch(queries, graph_id='default', base_dir=None, parallel=False):
+    """Run many read-only queries, loading and indexing each graph once.
+
+    Each query is a dict with 'op' (one of BATCH_OPS), an optional 'graph'
+    (defaults to graph_id) and the same parameters as the matching GET
+    endpoint, e.g. {"op": "search", "q": "auth", "limit": 5}. Results come
+    back in query order; a failed query gets {"error": ...} without
+    affecting the others. With parallel=True, graphs are queried on
+    separate threads.
+    """
+    results = [None] * len(queries)
+    groups = {}
+    for position, q in enumerate(queries):
+        if not isinstance(q, dict) or q.get('op') not in _BATCH_OPS:
+            op = q.get('op') if isinstance(q, dict) else None
+            results[position] = {'error': f"Unknown op {op!r}; expected one of {', '.join(BATCH_OPS)}"}
+            continue
+        path = _graph_file(str(q.get('graph') or graph_id), base_dir)
+        groups.setdefault(path, []).append((position, q))
+
+    if parallel and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(groups), 8)) as pool:
+            done = list(pool.map(lambda item: _run_batch_group(*item), groups.items()))
+    else:
+        done = [_run_batch_group(path, group) for path, group in groups.items()]
+    for group_results in done:
+        for position, result in group_results:
+            results[position] = result
+
+    response = []
+    for q, result in zip(queries, results):
+        q = q if isinstance(q, dict) else {}
+        item = {'op': q.get('op'), 'graph': q.get('graph') or graph_id}
+        if list(result) == ['error']:
+            item['error'] = result['error']
+        else:
+            item['result'] = result
+        response.append(item)
+    return response
+
+
+def _main(argv=None):
+    """Offline maintenance, e.g. python3 graphs.py dedupe --all"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='graphs.py', description='Graph store maintenance')
+    sub = parser.add_subparsers(dest='command', required=True)
+    dedupe = sub.add_parser('dedupe', help='Drop duplicate relationships from stored graphs')
+    convert = sub.add_parser('convert', help='Rewrite stored graphs in another snapshot format')
+    convert.add_argument('--format', choices=('json', 'binary'), required=True)
+    for command in (dedupe, convert):
+        command.add_argument('graph_ids', nargs='*', help='Graphs to process (default: every graph in the directory)')
+        command.add_argument('--dir', help=f'Graph directory (default: {GRAPHS_DIR})')
+        command.add_argument('--all', action='store_true', help='Client graphs plus every agent workspace')
+    args = parser.parse_args(argv)
+
+    if args.all:
+        directories = [GRAPHS_DIR] + [
+            os.path.join(AGENT_GRAPHS_DIR, name) for name in sorted(os.listdir(AGENT_GRAPHS_DIR))
+            if os.path.isdir(os.path.join(AGENT_GRAPHS_DIR, name))
+        ]
+    else:
+        directories = [args.dir or GRAPHS_DIR]
+
+    total_dropped = 0
+    for directory in directories:
+        graph_ids = args.graph_ids or [g['id'] for g in list_graphs(directory)]
+        for graph_id in graph_ids:
+            if args.command == 'convert':
+                converted = convert_graph(graph_id, directory, args.format)
+                print(f"{directory}: {graph_id}: {'converted to ' + args.format if converted else 'not found'}")
+                continue
+            result = dedupe_graph(graph_id, directory)
+            if result is None:
+                print(f"{directory}: {graph_id} not found")
+                continue
+            total_dropped += result['dropped_relationships']
+            print(f"{directory}: {graph_id}: dropped {result['dropped_relationships']} "
+                  f"of {result['relationship_count']} relationships")
+    if args.command == 'dedupe':
+        print(f"Dropped {total_dropped} duplicate relationships")
+
+
+if __name__ == '__main__':
+    _main()
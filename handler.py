@@ -1,28 +1,36 @@
 """HTTP request handler with CORS support."""
 
 import base64
+import itertools
 import json
 import mimetypes
 import os
 import threading
 import time
 import uuid
+import zlib
 from http.server import BaseHTTPRequestHandler
-from urllib.parse import urlparse, unquote
 
 ATTACHMENTS_DIR = os.path.expanduser('~/.gpt-graph/attachments')
 
 from graphs import (
     GRAPHS_DIR, AGENT_GRAPHS_DIR,
-    load_graph_state, save_graph_state, delete_graph,
-    merge_into_graph, list_graphs,
-    search_nodes, get_node_with_neighbors, get_nodes_by_relation,
-    get_graph_labels, traverse_graph
+    snapshot_graph_state, save_graph_state, delete_graph,
+    merge_into_graph, push_graph_changes, get_graph_changes, list_graphs, graph_version, graphs_version,
+    get_graph_summary, search_nodes, filter_nodes, similar_nodes, get_node_with_neighbors, get_nodes_by_relation,
+    get_graph_labels, traverse_graph, find_shortest_path, find_all_paths, get_neighborhood,
+    run_query, run_batch, BATCH_MAX_QUERIES
 )
+from graph_changes import ChangeConflict
+from graph_query import QueryError
+from graph_traversal import ORDERS as TRAVERSAL_ORDERS
+from router import BadRequest, Router, flag, int_list, json_value
+from sse import KEEPALIVE, KEEPALIVE_SECONDS, EventHub, parse_event_id
 from claude_task import (
-    CLAUDE_BINARY, active_tasks, create_task, get_tasks_for_workspace,
-    call_claude, execute_claude_task, start_task_async
+    CLAUDE_BINARY, FINISHED_STATUSES, active_tasks, task_events, task_finished, task_view, cancel_task, create_task,
+    get_tasks_for_workspace, call_claude, run_task, scheduler, start_task_async
 )
+from task_scheduler import PRIORITIES, TaskCancelled
 from thinking_loop import (
     ThinkingLoop, get_workspace_dir, list_workspaces,
     create_workspace, delete_workspace
@@ -33,24 +41,24 @@ thinking_loops = {}
 _loops_lock = threading.Lock()
 
 # ── Shared SSE broadcast ─────────────────────────────────────────────────
-_sse_clients = []
-_sse_lock = threading.Lock()
+event_hub = EventHub()
 
 
 def broadcast_sse(event_type, data):
-    """Send an SSE event to all connected clients."""
-    msg = f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
-    encoded = msg.encode()
-    with _sse_lock:
-        dead = []
-        for client in _sse_clients:
-            try:
-                client.write(encoded)
-                client.flush()
-            except Exception:
-                dead.append(client)
-        for d in dead:
-            _sse_clients.remove(d)
+    """Queue an SSE event for /v1/loop/stream clients; never waits on the network.
+
+    Status events go to every client (dashboards show all loops' states);
+    the rest only to clients subscribed to the event's workspace, or to all.
+    Status and graph updates still queued for a slow client are replaced
+    by newer ones.
+    """
+    workspace = data.get('workspace')
+    if event_type == 'status':
+        event_hub.publish(event_type, data, coalesce=('status', workspace))
+    elif event_type == 'graph_update':
+        event_hub.publish(event_type, data, workspace, coalesce=('graph_update', workspace, data.get('graph_id')))
+    else:
+        event_hub.publish(event_type, data, workspace)
 
 
 def get_loop(workspace='default'):
@@ -64,6 +72,135 @@ def get_loop(workspace='default'):
     return thinking_loops[workspace]
 
 
+# JSON responses larger than this are streamed with chunked encoding as they are serialized
+STREAM_THRESHOLD = 256 * 1024
+# Size of each chunk written while streaming
+STREAM_CHUNK_BYTES = 64 * 1024
+# Smallest response body worth compressing
+COMPRESS_MIN_BYTES = 1024
+# Bytes read at a time when sending files and when looking backward for ?tail= lines
+FILE_BLOCK_BYTES = 64 * 1024
+# Seconds between checks for new bytes while following a file
+FOLLOW_INTERVAL = 0.5
+
+# zlib window bits for each Content-Encoding we can produce, in order of preference
+_ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def _iter_json(value):
+    """Serialize value as JSON text in pieces, the same text json.dumps would give.
+
+    Objects are walked key by key and arrays are encoded a slice at a time,
+    so a large graph is never held as one string.
+    """
+    if isinstance(value, dict):
+        yield '{'
+        for i, (key, item) in enumerate(value.items()):
+            # Non-string keys are converted the way json.dumps converts them
+            yield (', ' if i else '') + json.dumps(key if isinstance(key, str) else json.dumps(key)) + ': '
+            yield from _iter_json(item)
+        yield '}'
+    elif isinstance(value, (list, tuple)):
+        yield '['
+        for start in range(0, len(value), 256):
+            yield (', ' if start else '') + json.dumps(value[start:start + 256])[1:-1]
+        yield ']'
+    else:
+        yield json.dumps(value)
+
+
+# Task ETags include this so revisions counted before a restart never match new ones
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+# Requests whose handler takes longer than this many milliseconds are logged
+SLOW_REQUEST_MS = float(os.environ.get('GPT_GRAPH_SLOW_REQUEST_MS', '1000'))
+
+# Route table; CORSRequestHandler registers its endpoints with @routes.route
+routes = Router()
+
+# Per-route timings for /v1/metrics: name -> {count, total_ms, max_ms}
+_route_stats = {}
+_route_stats_lock = threading.Lock()
+
+
+def _etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header lists etag (weak comparison, as for GET)."""
+    if if_none_match.strip() == '*':
+        return True
+    tags = {t.strip() for t in if_none_match.split(',')}
+    return etag in tags or etag[2:] in tags or 'W/' + etag in tags
+
+
+def _byte_range(header, size):
+    """(start, end) asked for by a single-range 'bytes=' Range header, end inclusive.
+
+    Returns None if there is no usable header (the whole file is sent).
+    start is at or past size when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, sep, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            return (max(size - suffix, 0), size - 1) if suffix > 0 else (size, size)
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if not sep or start < 0 or (last and int(last) < start):
+        return None
+    return start, end
+
+
+def _tail_start(f, size, lines):
+    """Offset in an open binary file where its last `lines` lines start, read backward from the end."""
+    if lines <= 0 or size == 0:
+        return size
+    # A newline at the very end closes the last line rather than starting another
+    f.seek(size - 1)
+    pos = size - 1 if f.read(1) == b'\n' else size
+    found = 0
+    while pos > 0:
+        step = min(FILE_BLOCK_BYTES, pos)
+        pos -= step
+        f.seek(pos)
+        block = f.read(step)
+        i = len(block)
+        while True:
+            i = block.rfind(b'\n', 0, i)
+            if i < 0:
+                break
+            found += 1
+            if found == lines:
+                return pos + i + 1
+    return 0
+
+
+def _quality(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 1.0
+
+
+def _task_etag(task_id):
+    task = active_tasks.get(task_id)
+    return f'W/"task-{_BOOT_ID}-{task.get("revision", 0)}"' if task else None
+
+
+def route_timings():
+    """Per-route request counts and handler times, slowest total first."""
+    with _route_stats_lock:
+        stats = [dict(stat, route=name) for name, stat in _route_stats.items()]
+    for stat in stats:
+        stat['avg_ms'] = round(stat['total_ms'] / stat['count'], 3)
+        stat['total_ms'] = round(stat['total_ms'], 3)
+        stat['max_ms'] = round(stat['max_ms'], 3)
+    stats.sort(key=lambda stat: stat['total_ms'], reverse=True)
+    return stats
+
+
 def _all_loop_statuses():
     """Return status dict for all known loops."""
     statuses = {}
@@ -73,20 +210,32 @@ def _all_loop_statuses():
 
 
 class CORSRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive and chunked responses; every response must say where its body ends
+    protocol_version = 'HTTP/1.1'
+    # Close idle kept-alive connections instead of holding their threads forever
+    timeout = 120
+    # Set per request by the route middleware below
+    request_started = None
+    response_etag = None
+    response_encoding = None
+    event_hub = None
+    event_subscriber = None
+    # Set by responses that go on until the client or the source is done; not timed
+    response_streamed = False
+
+    def handle_one_request(self):
+        self._body_consumed = False
+        super().handle_one_request()
+        # An unread request body would be parsed as the next request on this connection
+        headers = getattr(self, 'headers', None)
+        if headers is not None and not self._body_consumed and int(headers.get('Content-Length') or 0):
+            self.close_connection = True
+
     def _set_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-
-    def _parse_path(self):
-        parsed = urlparse(self.path)
-        params = {}
-        if parsed.query:
-            for part in parsed.query.split('&'):
-                if '=' in part:
-                    k, v = part.split('=', 1)
-                    params[k] = unquote(v)  # Decode URL-encoded values
-        return parsed.path, params
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, If-None-Match, Last-Event-ID, Range')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Content-Range, X-Content-Offset')
 
     def _graph_id(self, params):
         return params.get('id', 'default')
@@ -96,499 +245,936 @@ class CORSRequestHandler(BaseHTTPRequestHandler):
         workspace = params.get('workspace', 'default')
         return get_workspace_dir(workspace)
 
-    def _json_response(self, code, data):
-        self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
+    def _accepted_encoding(self):
+        """The Content-Encoding to compress with ('gzip' or 'deflate'), or None."""
+        accepted = set()
+        for part in (self.headers.get('Accept-Encoding') or '').split(','):
+            name, _, quality = part.partition(';')
+            quality = quality.strip().replace(' ', '')
+            if quality.startswith('q=') and _quality(quality[2:]) == 0:
+                continue
+            accepted.add(name.strip().lower())
+        for encoding in _ENCODINGS:
+            if encoding in accepted:
+                return encoding
+        return None
+
+    def _not_modified(self, etag):
+        """Send 304 and return True if the client's If-None-Match already has this ETag."""
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match or not _etag_matches(if_none_match, etag):
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
         self._set_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
-
-    def _read_body(self):
-        content_length = int(self.headers['Content-Length'])
-        return json.loads(self.rfile.read(content_length).decode('utf-8'))
+        return True
 
-    def do_OPTIONS(self):
-        self.send_response(200)
+    def _empty_response(self, code):
+        self.send_response(code)
         self._set_cors_headers()
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
-    def do_POST(self):
-        path, params = self._parse_path()
-        graph_id = self._graph_id(params)
-
-        if path in ('/v1/completions', '/v1/chat/completions'):
-            try:
-                request = self._read_body()
-                prompt = request.get('prompt', '')
-                if 'messages' in request:
-                    messages = request['messages']
-                    prompt = '\n'.join([m.get('content', '') for m in messages])
-
-                model = request.get('model', 'claude-sonnet-4-20250514')
-                if 'gpt' in model or 'davinci' in model:
-                    model = 'claude-opus-4-6'
-
-                print(f"Calling Claude with prompt length: {len(prompt)}")
-                response_text = call_claude(prompt, model)
-
-                self._json_response(200, {
-                    "id": "claude-response",
-                    "object": "text_completion",
-                    "choices": [{
-                        "text": response_text,
-                        "index": 0,
-                        "finish_reason": "stop"
-                    }]
-                })
-            except Exception as e:
-                print(f"Error: {e}")
-                self._json_response(500, {"error": {"message": str(e)}})
-
-        elif path == '/v1/execute':
-            try:
-                request = self._read_body()
-                prompt = request.get('prompt', '')
-                working_dir = request.get('working_dir', None)
-                model = request.get('model', 'claude-opus-4-6')
-                async_mode = request.get('async', True)
-                task_graph_id = request.get('graph_id', graph_id)
-                task_workspace = request.get('workspace', params.get('workspace', 'default'))
-
-                task_id = str(uuid.uuid4())[:8]
-                create_task(task_id, {
-                    'id': task_id,
-                    'status': 'starting',
-                    'prompt': prompt[:200] + '...' if len(prompt) > 200 else prompt,
-                    'working_dir': os.path.expanduser(working_dir) if working_dir else os.path.expanduser("~/claude-projects"),
-                    'graph_id': task_graph_id,
-                    'workspace': task_workspace,
-                    'created_at': time.time(),
-                    'last_output': '',
-                    'output_lines': 0
-                })
-
-                print(f"Starting task {task_id} (graph: {task_graph_id}) with prompt length: {len(prompt)}")
-
-                if async_mode:
-                    start_task_async(prompt, working_dir, model, task_id)
-                    self._json_response(202, {
-                        "task_id": task_id,
-                        "status": "starting",
-                        "message": f"Task started. Poll /v1/tasks/{task_id} for status."
-                    })
-                else:
-                    result = execute_claude_task(prompt, working_dir, model, task_id)
-                    self._json_response(200, result)
-
-            except Exception as e:
-                print(f"Execute error: {e}")
-                code = 504 if 'TimeoutExpired' in type(e).__name__ else 500
-                self._json_response(code, {"error": {"message": str(e)}})
-
-        elif path == '/v1/graph':
-            try:
-                graph = self._read_body()
-                save_graph_state(graph, graph_id)
-                self._json_response(200, {
-                    "status": "saved",
-                    "node_count": len(graph.get('nodes', [])),
-                    "relationship_count": len(graph.get('relationships', []))
-                })
-            except Exception as e:
-                print(f"Graph save error: {e}")
-                self._json_response(500, {"error": {"message": str(e)}})
-
-        elif path == '/v1/graph/merge':
-            try:
-                new_data = self._read_body()
-                updated_graph = merge_into_graph(new_data, graph_id)
-                self._json_response(200, {
-                    "status": "merged",
-                    "node_count": len(updated_graph.get('nodes', [])),
-                    "relationship_count": len(updated_graph.get('relationships', [])),
-                    "added_nodes": len(new_data.get('nodes', []))
-                })
-            except Exception as e:
-                print(f"Graph merge error: {e}")
-                self._json_response(500, {"error": {"message": str(e)}})
-
-        elif path == '/v1/agent/graph':
-            try:
-                graph = self._read_body()
-                workspace_dir = self._workspace_dir(params)
-                save_graph_state(graph, graph_id, workspace_dir)
-                # Broadcast graph update to connected clients
-                broadcast_sse('graph_update', {
-                    'action': 'save',
-                    'graph_id': graph_id,
-                    'workspace': params.get('workspace', 'default'),
-                    'node_count': len(graph.get('nodes', [])),
-                    'relationship_count': len(graph.get('relationships', []))
-                })
-                self._json_response(200, {
-                    "status": "saved",
-                    "node_count": len(graph.get('nodes', [])),
-                    "relationship_count": len(graph.get('relationships', []))
-                })
-            except Exception as e:
-                self._json_response(500, {"error": {"message": str(e)}})
-
-        elif path == '/v1/agent/graph/merge':
-            try:
-                new_data = self._read_body()
-                workspace_dir = self._workspace_dir(params)
-                updated_graph = merge_into_graph(new_data, graph_id, workspace_dir)
-                # Broadcast graph update to connected clients
-                broadcast_sse('graph_update', {
-                    'action': 'merge',
-                    'graph_id': graph_id,
-                    'workspace': params.get('workspace', 'default'),
-                    'node_count': len(updated_graph.get('nodes', [])),
-                    'relationship_count': len(updated_graph.get('relationships', [])),
-                    'added_nodes': len(new_data.get('nodes', []))
-                })
-                self._json_response(200, {
-                    "status": "merged",
-                    "node_count": len(updated_graph.get('nodes', [])),
-                    "relationship_count": len(updated_graph.get('relationships', []))
-                })
-            except Exception as e:
-                self._json_response(500, {"error": {"message": str(e)}})
-
-        elif path == '/v1/loop/start':
-            try:
-                req = self._read_body()
-                workspace = req.get('workspace', 'default')
-                loop = get_loop(workspace)
-                result = loop.start(
-                    prompt=req.get('prompt', ''),
-                    interval=req.get('interval', 0)
-                )
-                self._json_response(200, result)
-            except Exception as e:
-                self._json_response(500, {"error": str(e)})
-
-        elif path == '/v1/loop/stop':
-            try:
-                req = self._read_body()
-                workspace = req.get('workspace', 'default')
-                loop = get_loop(workspace)
-                result = loop.stop()
-                self._json_response(200, result)
-            except Exception as e:
-                self._json_response(500, {"error": str(e)})
-
-        elif path == '/v1/loop/configure':
-            try:
-                req = self._read_body()
-                workspace = req.get('workspace', 'default')
-                loop = get_loop(workspace)
-                result = loop.configure(
-                    prompt=req.get('prompt'),
-                    interval=req.get('interval')
-                )
-                self._json_response(200, result)
-            except Exception as e:
-                self._json_response(500, {"error": str(e)})
-
-        elif path == '/v1/workspaces':
-            try:
-                req = self._read_body()
-                workspace_name = req.get('name', '').strip()
-                if not workspace_name:
-                    self._json_response(400, {"error": "Workspace name required"})
-                    return
-                result = create_workspace(workspace_name)
-                self._json_response(200, result)
-            except Exception as e:
-                self._json_response(500, {"error": str(e)})
-
-        elif path == '/v1/upload':
-            try:
-                req = self._read_body()
-                filename = req.get('filename', 'file')
-                data_b64 = req.get('data', '')
-
-                # Sanitize filename
-                safe_name = os.path.basename(filename)
-                unique_name = f"{uuid.uuid4().hex[:8]}_{safe_name}"
-
-                os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
-                dest = os.path.join(ATTACHMENTS_DIR, unique_name)
-
-                file_bytes = base64.b64decode(data_b64)
-                with open(dest, 'wb') as f:
-                    f.write(file_bytes)
-
-                # Determine type from extension
-                ext = os.path.splitext(safe_name)[1].lower()
-                image_exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp'}
-                pdf_exts = {'.pdf'}
-                if ext in image_exts:
-                    file_type = 'image'
-                elif ext in pdf_exts:
-                    file_type = 'pdf'
-                else:
-                    file_type = 'file'
-
-                self._json_response(200, {
-                    "path": dest,
-                    "filename": safe_name,
-                    "type": file_type,
-                    "size": len(file_bytes),
-                    "url": f"/v1/attachments/{unique_name}"
-                })
-            except Exception as e:
-                print(f"Upload error: {e}")
-                self._json_response(500, {"error": {"message": str(e)}})
-
+    def _json_response(self, code, data, etag=None):
+        """Send data as JSON, compressed when the client accepts gzip or deflate.
+
+        Bodies that serialize to less than STREAM_THRESHOLD go out in one
+        piece with a Content-Length. Anything larger is sent with chunked
+        encoding while it is being serialized, so the first bytes leave
+        before the whole graph has been encoded. With an etag (by default
+        the route's, for 200s), clients are told to revalidate with
+        If-None-Match (see _not_modified).
+        """
+        encoding = self.response_encoding
+        if etag is None and code == 200:
+            etag = self.response_etag
+        pieces = _iter_json(data)
+        buffered, size = [], 0
+        for piece in pieces:
+            buffered.append(piece)
+            size += len(piece)
+            if size >= STREAM_THRESHOLD:
+                break
         else:
-            self.send_response(404)
+            body = ''.join(buffered).encode()
+            compress = encoding is not None and len(body) >= COMPRESS_MIN_BYTES
+            if compress:
+                compressor = zlib.compressobj(6, zlib.DEFLATED, _ENCODINGS[encoding])
+                body = compressor.compress(body) + compressor.flush()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self._send_validator(etag)
+            if compress:
+                self.send_header('Content-Encoding', encoding)
+            if encoding is not None:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', str(len(body)))
+            self._set_cors_headers()
             self.end_headers()
+            self.wfile.write(body)
+            return
 
-    def do_GET(self):
-        path, params = self._parse_path()
-        graph_id = self._graph_id(params)
-
-        if path == '/health':
-            self._json_response(200, {"status": "ok", "claude_binary": CLAUDE_BINARY})
-
-        elif path == '/v1/graphs':
-            self._json_response(200, {"graphs": list_graphs()})
-
-        elif path == '/v1/graph':
-            self._json_response(200, load_graph_state(graph_id))
-
-        elif path == '/v1/graph/summary':
-            graph = load_graph_state(graph_id)
-            summary = {
-                "node_count": len(graph.get('nodes', [])),
-                "relationship_count": len(graph.get('relationships', [])),
-                "nodes": [
-                    {
-                        "name": n.get('name', n.get('properties', {}).get('name', '')),
-                        "type": n.get('type', n.get('labels', ['Unknown'])[0] if isinstance(n.get('labels'), list) else 'Unknown')
-                    }
-                    for n in graph.get('nodes', [])
-                ]
-            }
-            self._json_response(200, summary)
-
-        # ============ GRANULAR GRAPH QUERY ENDPOINTS ============
-
-        elif path == '/v1/graph/search':
-            # Search nodes by name: GET /v1/graph/search?id=X&q=query&limit=50
-            query = params.get('q', '')
-            limit = int(params.get('limit', '50'))
-            results = search_nodes(graph_id, query, limit)
-            self._json_response(200, {"query": query, "count": len(results), "nodes": results})
-
-        elif path == '/v1/graph/node':
-            # Get node with neighbors: GET /v1/graph/node?id=X&name=Y&depth=2
-            node_name = params.get('name', '')
-            node_id = params.get('node_id')
-            if node_id:
-                node_id = int(node_id)
-            depth = int(params.get('depth', '1'))
-            result = get_node_with_neighbors(graph_id, node_id, node_name, depth)
-            if result:
-                self._json_response(200, result)
-            else:
-                self._json_response(404, {"error": "Node not found"})
-
-        elif path == '/v1/graph/relations':
-            # Get nodes by relation: GET /v1/graph/relations?id=X&node=Y&relation=Z&direction=both
-            node_name = params.get('node', '')
-            relation = params.get('relation')
-            direction = params.get('direction', 'both')
-            result = get_nodes_by_relation(graph_id, node_name, relation, direction)
-            if 'error' in result:
-                self._json_response(404, result)
-            else:
-                self._json_response(200, result)
-
-        elif path == '/v1/graph/labels':
-            # Get all labels/types: GET /v1/graph/labels?id=X
-            result = get_graph_labels(graph_id)
-            self._json_response(200, result)
-
-        elif path == '/v1/graph/traverse':
-            # Traverse from node: GET /v1/graph/traverse?id=X&start=Y&direction=out&depth=3&relation=Z
-            start_name = params.get('start', '')
-            direction = params.get('direction', 'out')
-            depth = int(params.get('depth', '3'))
-            relation_filter = params.get('relation')
-            result = traverse_graph(graph_id, start_name, direction, depth, relation_filter)
-            if 'error' in result:
-                self._json_response(404, result)
-            else:
-                self._json_response(200, result)
-
-        elif path == '/v1/workspaces':
-            self._json_response(200, {"workspaces": list_workspaces()})
-
-        elif path == '/v1/agent/graphs':
-            workspace_dir = self._workspace_dir(params)
-            self._json_response(200, {"graphs": list_graphs(workspace_dir)})
-
-        elif path == '/v1/agent/graph':
-            workspace_dir = self._workspace_dir(params)
-            self._json_response(200, load_graph_state(graph_id, workspace_dir))
-
-        elif path == '/v1/tasks':
-            workspace = params.get('workspace')
-            if workspace:
-                tasks = get_tasks_for_workspace(workspace)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self._send_validator(etag)
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._set_cors_headers()
+        self.end_headers()
+        compressor = zlib.compressobj(6, zlib.DEFLATED, _ENCODINGS[encoding]) if encoding else None
+        pending, pending_size = [], 0
+        try:
+            for piece in itertools.chain(buffered, pieces):
+                data_bytes = piece.encode()
+                if compressor is not None:
+                    data_bytes = compressor.compress(data_bytes)
+                pending.append(data_bytes)
+                pending_size += len(data_bytes)
+                if pending_size >= STREAM_CHUNK_BYTES:
+                    self._write_chunk(b''.join(pending))
+                    pending, pending_size = [], 0
+            if compressor is not None:
+                pending.append(compressor.flush())
+            self._write_chunk(b''.join(pending))
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            # Headers are already out: all we can do is cut the response short
+            print(f"Error streaming response for {self.path}: {e}")
+            self.close_connection = True
+
+    def _send_validator(self, etag):
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if self.request_started is not None:
+            # Time spent in the handler before the body, for the browser's network panel
+            elapsed = (time.perf_counter() - self.request_started) * 1000
+            self.send_header('Server-Timing', f'app;dur={elapsed:.1f}')
+
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _send_file(self, filepath, content_type, tail=None, follow_until=None):
+        """Send a file from disk without reading it into memory.
+
+        A single-range Range header gets a 206 with just those bytes (416
+        when it starts past the end). tail sends the file's last tail lines
+        instead. With follow_until, the response is chunked and goes on
+        with whatever is appended to the file until follow_until() is true.
+        X-Content-Offset is the offset of the first byte sent, so a client
+        can ask for what it has not seen with Range: bytes=<offset + length>-.
+        """
+        f = open(filepath, 'rb')
+        try:
+            size = os.fstat(f.fileno()).st_size
+            code, start, end = 200, 0, size - 1
+            if tail is not None:
+                start = _tail_start(f, size, tail)
             else:
-                tasks = active_tasks
-            tasks_summary = [{
-                'id': t['id'],
-                'status': t['status'],
-                'workspace': t.get('workspace', 'default'),
-                'working_dir': t.get('working_dir'),
-                'output_lines': t.get('output_lines', 0),
-                'created_at': t.get('created_at'),
-                'completed_at': t.get('completed_at')
-            } for t in tasks.values()]
-            # Sort by created_at descending
-            tasks_summary.sort(key=lambda x: x.get('created_at', 0), reverse=True)
-            self._json_response(200, {"tasks": tasks_summary})
-
-        elif path == '/v1/loop/status':
-            workspace = params.get('workspace')
-            if workspace:
-                # Single workspace status
-                loop = get_loop(workspace)
-                self._json_response(200, loop.status())
+                byte_range = _byte_range(self.headers.get('Range'), size)
+                if byte_range is not None and follow_until is not None:
+                    # Following starts wherever the client left off, even at the end
+                    start = min(byte_range[0], size)
+                elif byte_range is not None:
+                    start, end = byte_range
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', '0')
+                        self._set_cors_headers()
+                        self.end_headers()
+                        return
+                    code = 206
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('X-Content-Offset', str(start))
+            if code == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            if follow_until is None:
+                self.send_header('Content-Length', str(end - start + 1))
             else:
-                # All loops status
-                self._json_response(200, {"loops": _all_loop_statuses()})
-
-        elif path == '/v1/loop/actions':
-            workspace = params.get('workspace', 'default')
-            loop = get_loop(workspace)
-            limit = int(params.get('limit', '50'))
-            self._json_response(200, {"actions": loop.actions[-limit:]})
-
-        elif path == '/v1/loop/stream':
+                self.send_header('Transfer-Encoding', 'chunked')
+            self._send_validator(None)
+            self._set_cors_headers()
+            self.end_headers()
+            f.seek(start)
+            if follow_until is not None:
+                self.response_streamed = True
+                follow, f = f, None
+                self._follow_file(follow, follow_until)
+                return
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(FILE_BLOCK_BYTES, remaining))
+                if not data:
+                    break
+                self.wfile.write(data)
+                remaining -= len(data)
+        finally:
+            if f is not None:
+                f.close()
+
+    def _follow_file(self, f, follow_until):
+        """Send what is appended to an open file as chunks until follow_until() is true; closes f.
+
+        Holds the request's thread meanwhile; the asyncio server
+        (async_server.py) overrides this with a coroutine.
+        """
+        try:
+            while True:
+                # Checked before reading, so bytes written just before the end are still sent
+                done = follow_until()
+                data = f.read(STREAM_CHUNK_BYTES)
+                if data:
+                    self._write_chunk(data)
+                    self.wfile.flush()
+                elif done:
+                    break
+                else:
+                    time.sleep(FOLLOW_INTERVAL)
+            self.wfile.write(b'0\r\n\r\n')
+        finally:
+            f.close()
+
+    def _start_event_stream(self, hub, topic, params, snapshot):
+        """Subscribe to topic on hub and send the stream headers and where the client starts from.
+
+        A client resuming with Last-Event-ID (or ?last_event_id=, for
+        clients that cannot set headers) is sent the events it missed;
+        any other client gets the (event type, data) snapshot() returns.
+        snapshot is called after subscribing, so no change can fall
+        between it and the queued events. Returns the subscriber.
+        """
+        last_event_id = parse_event_id(self.headers.get('Last-Event-ID') or params.get('last_event_id'))
+        self.response_streamed = True
+        self.event_hub = hub
+        self.event_subscriber, replay = hub.subscribe(topic, last_event_id)
+        try:
             self.send_response(200)
             self.send_header('Content-Type', 'text/event-stream')
             self.send_header('Cache-Control', 'no-cache')
-            self.send_header('Connection', 'keep-alive')
+            # Unframed stream: it ends when the connection does
+            self.send_header('Connection', 'close')
             self._set_cors_headers()
             self.end_headers()
 
-            # Send initial all_status event with all loop statuses
-            all_status = _all_loop_statuses()
-            init_msg = f"event: all_status\ndata: {json.dumps(all_status)}\n\n"
-            self.wfile.write(init_msg.encode())
+            if replay is None:
+                self.wfile.write(hub.snapshot(self.event_subscriber, *snapshot(), last_event_id=last_event_id))
+            else:
+                self.wfile.write(b''.join(replay))
             self.wfile.flush()
+        except Exception:
+            hub.unsubscribe(self.event_subscriber)
+            raise
+        return self.event_subscriber
+
+    def _serve_event_stream(self):
+        """Write this connection's queued events until it closes or falls too far behind.
+
+        The request's thread is the client's writer for the life of the
+        stream; the asyncio server (async_server.py) overrides this with a
+        coroutine.
+        """
+        subscriber = self.event_subscriber
+        try:
+            while not subscriber.closed:
+                events = subscriber.get(KEEPALIVE_SECONDS)
+                if not events and subscriber.closed:
+                    break
+                self.wfile.write(b''.join(events) if events else KEEPALIVE)
+                self.wfile.flush()
+        except Exception:
+            pass
+        finally:
+            self.event_hub.unsubscribe(subscriber)
+            self.close_connection = True
 
-            with _sse_lock:
-                _sse_clients.append(self.wfile)
+    def _read_body(self):
+        content_length = int(self.headers['Content-Length'])
+        self._body_consumed = True
+        return json.loads(self.rfile.read(content_length).decode('utf-8'))
 
-            try:
-                while True:
-                    time.sleep(1)
-                    self.wfile.write(b": keepalive\n\n")
-                    self.wfile.flush()
-            except Exception:
-                pass
-            finally:
-                with _sse_lock:
-                    if self.wfile in _sse_clients:
-                        _sse_clients.remove(self.wfile)
-            return
+    def do_OPTIONS(self):
+        self._empty_response(200)
 
-        elif path.startswith('/v1/attachments/'):
-            filename = path.split('/v1/attachments/', 1)[1]
-            safe_name = os.path.basename(filename)
-            filepath = os.path.join(ATTACHMENTS_DIR, safe_name)
-            if os.path.isfile(filepath):
-                mime_type = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
-                self.send_response(200)
-                self.send_header('Content-Type', mime_type)
-                self._set_cors_headers()
-                self.end_headers()
-                with open(filepath, 'rb') as f:
-                    self.wfile.write(f.read())
-            else:
-                self._json_response(404, {"error": "File not found"})
-
-        elif path.startswith('/v1/tasks/'):
-            task_id = path.split('/')[-1]
-
-            if '/log' in path:
-                task_id = path.split('/')[3]
-                task = active_tasks.get(task_id)
-                if task and task.get('log_file') and os.path.exists(task['log_file']):
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'text/plain')
-                    self._set_cors_headers()
-                    self.end_headers()
-                    with open(task['log_file'], 'r') as f:
-                        self.wfile.write(f.read().encode())
-                else:
-                    self._json_response(404, {"error": "Log not found"})
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        # Per-request state set by middleware; the handler object lives as long as the connection
+        self.request_started = None
+        self.response_etag = None
+        self.response_encoding = None
+        self.response_streamed = False
+        try:
+            routes.dispatch(self, method, self.path, lambda: self._empty_response(404))
+        except BadRequest as e:
+            self._json_response(400, {"error": str(e)})
+
+    # ============ COMPLETIONS AND TASK EXECUTION ============
+
+    @routes.route('POST', '/v1/completions', pool='claude')
+    @routes.route('POST', '/v1/chat/completions', pool='claude')
+    def _post_completions(self, params):
+        try:
+            request = self._read_body()
+            prompt = request.get('prompt', '')
+            if 'messages' in request:
+                messages = request['messages']
+                prompt = '\n'.join([m.get('content', '') for m in messages])
+
+            model = request.get('model', 'claude-sonnet-4-20250514')
+            if 'gpt' in model or 'davinci' in model:
+                model = 'claude-opus-4-6'
+
+            print(f"Calling Claude with prompt length: {len(prompt)}")
+            response_text = call_claude(prompt, model)
+
+            self._json_response(200, {
+                "id": "claude-response",
+                "object": "text_completion",
+                "choices": [{
+                    "text": response_text,
+                    "index": 0,
+                    "finish_reason": "stop"
+                }]
+            })
+        except Exception as e:
+            print(f"Error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('POST', '/v1/execute', pool='claude')
+    def _post_execute(self, params):
+        try:
+            request = self._read_body()
+            prompt = request.get('prompt', '')
+            working_dir = request.get('working_dir', None)
+            model = request.get('model', 'claude-opus-4-6')
+            async_mode = request.get('async', True)
+            task_graph_id = request.get('graph_id', self._graph_id(params))
+            task_workspace = request.get('workspace', params.get('workspace', 'default'))
+            # chat (default), loop or batch; higher priorities start first when tasks queue up
+            priority = request.get('priority', 'chat')
+            if priority not in PRIORITIES:
+                self._json_response(400, {"error": f"Unknown priority {priority!r}"})
                 return
 
-            task = active_tasks.get(task_id)
-            if task:
-                response_data = {
-                    'id': task['id'],
-                    'status': task['status'],
-                    'working_dir': task.get('working_dir'),
-                    'output_lines': task.get('output_lines', 0),
-                    'last_output': task.get('last_output', ''),
-                    'files': task.get('files', []),
-                    'created_at': task.get('created_at'),
-                    'completed_at': task.get('completed_at'),
-                    'error': task.get('error')
-                }
-                if task['status'] == 'completed' and 'result' in task:
-                    response_data['result'] = task['result']
-                self._json_response(200, response_data)
+            task_id = str(uuid.uuid4())[:8]
+            create_task(task_id, {
+                'id': task_id,
+                'status': 'queued',
+                'priority': priority,
+                'prompt': prompt[:200] + '...' if len(prompt) > 200 else prompt,
+                'working_dir': os.path.expanduser(working_dir) if working_dir else os.path.expanduser("~/claude-projects"),
+                'graph_id': task_graph_id,
+                'workspace': task_workspace,
+                'created_at': time.time(),
+                'last_output': '',
+                'output_lines': 0
+            })
+
+            print(f"Starting task {task_id} (graph: {task_graph_id}) with prompt length: {len(prompt)}")
+
+            if async_mode:
+                start_task_async(prompt, working_dir, model, task_id, priority)
+                task = active_tasks[task_id]
+                self._json_response(202, {
+                    "task_id": task_id,
+                    "status": task['status'],
+                    "queue_position": task.get('queue_position'),
+                    "message": f"Task started. Poll /v1/tasks/{task_id} for status."
+                })
             else:
-                self._json_response(404, {"error": "Task not found"})
+                result = run_task(prompt, working_dir, model, task_id, priority)
+                self._json_response(200, result)
 
+        except TaskCancelled as e:
+            self._json_response(409, {"error": {"message": str(e)}})
+        except Exception as e:
+            print(f"Execute error: {e}")
+            code = 504 if 'TimeoutExpired' in type(e).__name__ else 500
+            self._json_response(code, {"error": {"message": str(e)}})
+
+    @routes.route('GET', '/v1/tasks')
+    def _get_tasks(self, params):
+        workspace = params.get('workspace')
+        if workspace:
+            tasks = get_tasks_for_workspace(workspace)
         else:
-            self.send_response(404)
-            self.end_headers()
-
-    def do_DELETE(self):
-        path, params = self._parse_path()
+            tasks = active_tasks
+        tasks_summary = [{
+            'id': t['id'],
+            'status': t['status'],
+            'queue_position': t.get('queue_position'),
+            'workspace': t.get('workspace', 'default'),
+            'working_dir': t.get('working_dir'),
+            'output_lines': t.get('output_lines', 0),
+            'created_at': t.get('created_at'),
+            'completed_at': t.get('completed_at')
+        } for t in tasks.values()]
+        # Sort by created_at descending
+        tasks_summary.sort(key=lambda x: x.get('created_at', 0), reverse=True)
+        self._json_response(200, {"tasks": tasks_summary, "scheduler": scheduler.stats()})
+
+    @routes.route('GET', '/v1/tasks/{task_id}', etag=lambda self, params: _task_etag(params['task_id']))
+    def _get_task(self, params):
+        task = active_tasks.get(params['task_id'])
+        if task:
+            self._json_response(200, task_view(task))
+        else:
+            self._json_response(404, {"error": "Task not found"})
+
+    @routes.route('DELETE', '/v1/tasks/{task_id}')
+    def _delete_task(self, params):
+        # Cancels a queued or running task; a running one reports 'cancelled' once its process has exited
+        task_id = params['task_id']
+        task = active_tasks.get(task_id)
+        if not task:
+            self._json_response(404, {"error": "Task not found"})
+        elif not cancel_task(task_id):
+            self._json_response(409, {"error": f"Task already {task['status']}"})
+        else:
+            self._json_response(202, task_view(task))
+
+    @routes.route('GET', '/v1/tasks/{task_id}/stream', compress=False)
+    def _get_task_stream(self, params):
+        # Task progress as SSE: a 'status' event with the task as GET /v1/tasks/<id> returns it,
+        # then 'output' events ({"text", "output_lines"}) as output is parsed and 'status' on
+        # every status change. The stream ends after the task finishes.
+        task_id = params['task_id']
+        task = active_tasks.get(task_id)
+        if not task:
+            self._json_response(404, {"error": "Task not found"})
+            return
+        subscriber = self._start_event_stream(task_events, task_id, params, lambda: ('status', task_view(task)))
+        if task['status'] in FINISHED_STATUSES:
+            subscriber.end()
+        self._serve_event_stream()
+
+    @routes.route('GET', '/v1/tasks/{task_id}/log', query={'tail': int, 'follow': flag}, compress=False)
+    def _get_task_log(self, params):
+        # Whole log, a Range of it, or its last lines: GET /v1/tasks/<id>/log?tail=200
+        # ?follow=1 keeps sending what is appended until the task finishes
+        task_id = params['task_id']
+        task = active_tasks.get(task_id)
+        if task and task.get('log_file') and os.path.exists(task['log_file']):
+            follow_until = (lambda: task_finished(task_id)) if params.get('follow') else None
+            self._send_file(task['log_file'], 'text/plain; charset=utf-8', params.get('tail'), follow_until)
+        else:
+            self._json_response(404, {"error": "Log not found"})
+
+    # ============ GRAPH STORAGE ============
+
+    # Versions are read (by the caching middleware) before the data, so a write in
+    # between only costs one extra download
+    @routes.route('GET', '/v1/graphs', etag=lambda self, params: f'W/"graphs-{graphs_version()}"')
+    def _get_graphs(self, params):
+        self._json_response(200, {"graphs": list_graphs()})
+
+    @routes.route('GET', '/v1/graph',
+                  etag=lambda self, params: f'W/"graph-{graph_version(self._graph_id(params))}"')
+    def _get_graph(self, params):
+        self._json_response(200, snapshot_graph_state(self._graph_id(params)))
+
+    @routes.route('POST', '/v1/graph')
+    def _post_graph(self, params):
+        try:
+            graph = self._read_body()
+            save_graph_state(graph, self._graph_id(params))
+            self._json_response(200, {
+                "status": "saved",
+                "revision": graph['revision'],
+                "created_at": graph['created_at'],
+                "node_count": len(graph.get('nodes', [])),
+                "relationship_count": len(graph.get('relationships', []))
+            })
+        except Exception as e:
+            print(f"Graph save error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('DELETE', '/v1/graph')
+    def _delete_graph(self, params):
+        graph_id = self._graph_id(params)
+        deleted = delete_graph(graph_id)
+        self._json_response(200 if deleted else 404, {"deleted": deleted, "id": graph_id})
+
+    @routes.route('POST', '/v1/graph/delta')
+    def _post_graph_delta(self, params):
+        # Delta save: {"base_revision": 12, "nodes": [...], "removed_nodes": [3],
+        #              "relationships": [...], "removed_relationships": [["1", "2", "knows"]]}
+        try:
+            result = push_graph_changes(self._read_body(), self._graph_id(params))
+            self._json_response(200, dict(result, status="saved"))
+        except ChangeConflict as e:
+            self._json_response(409, {
+                "error": str(e),
+                "revision": e.revision,
+                "reset": e.reset,
+                "conflicts": {"nodes": e.nodes, "relationships": e.relationships}
+            })
+        except ValueError as e:
+            self._json_response(400, {"error": str(e)})
+        except Exception as e:
+            print(f"Graph delta error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('GET', '/v1/graph/changes', query={'since': int})
+    def _get_graph_changes(self, params):
+        # Delta pull: GET /v1/graph/changes?id=X&since=12 -> what revisions 13.. changed
         graph_id = self._graph_id(params)
+        result = get_graph_changes(graph_id, params.get('since', 0))
+        if result is None:
+            self._json_response(404, {"error": f"Graph {graph_id} not found"})
+        else:
+            self._json_response(200, result)
 
-        if path == '/v1/graph':
-            deleted = delete_graph(graph_id)
-            self._json_response(200 if deleted else 404, {"deleted": deleted, "id": graph_id})
+    @routes.route('POST', '/v1/graph/merge')
+    def _post_graph_merge(self, params):
+        try:
+            new_data = self._read_body()
+            stats = {}
+            updated_graph = merge_into_graph(new_data, self._graph_id(params), stats=stats)
+            self._json_response(200, {
+                "status": "merged",
+                "node_count": len(updated_graph.get('nodes', [])),
+                "relationship_count": len(updated_graph.get('relationships', [])),
+                "added_nodes": stats['added_nodes'],
+                "dropped_relationships": stats['dropped_relationships']
+            })
+        except Exception as e:
+            print(f"Graph merge error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('GET', '/v1/graph/summary',
+                  etag=lambda self, params: f'W/"summary-{graph_version(self._graph_id(params))}"')
+    def _get_graph_summary(self, params):
+        self._json_response(200, get_graph_summary(self._graph_id(params)))
+
+    # ============ GRANULAR GRAPH QUERY ENDPOINTS ============
+
+    @routes.route('GET', '/v1/graph/search', query={'limit': int})
+    def _get_graph_search(self, params):
+        # Ranked node search: GET /v1/graph/search?id=X&q=query&limit=50&type=Task
+        query = params.get('q', '')
+        results = search_nodes(self._graph_id(params), query, params.get('limit', 50),
+                               node_type=params.get('type'))
+        self._json_response(200, {"query": query, "count": len(results), "nodes": results})
+
+    @routes.route('GET', '/v1/graph/similar', query={'k': int})
+    def _get_graph_similar(self, params):
+        # Embedding similarity: GET /v1/graph/similar?id=X&q=text&k=10&type=Task
+        # or nodes similar to an existing one: GET /v1/graph/similar?id=X&name=Y&k=10
+        query = params.get('q', '')
+        node_name = params.get('name')
+        results = similar_nodes(self._graph_id(params), query, node_name, params.get('k', 10),
+                                node_type=params.get('type'))
+        if results is None:
+            self._json_response(404, {"error": "Node not found"})
+        else:
+            self._json_response(200, {"query": query, "name": node_name, "count": len(results), "nodes": results})
+
+    @routes.route('GET', '/v1/graph/node', query={'node_id': int, 'depth': int})
+    def _get_graph_node(self, params):
+        # Get node with neighbors: GET /v1/graph/node?id=X&name=Y&depth=2
+        result = get_node_with_neighbors(self._graph_id(params), params.get('node_id'), params.get('name', ''),
+                                         params.get('depth', 1))
+        if result:
+            self._json_response(200, result)
+        else:
+            self._json_response(404, {"error": "Node not found"})
+
+    @routes.route('GET', '/v1/graph/relations')
+    def _get_graph_relations(self, params):
+        # Get nodes by relation: GET /v1/graph/relations?id=X&node=Y&relation=Z&direction=both
+        result = get_nodes_by_relation(self._graph_id(params), params.get('node', ''), params.get('relation'),
+                                       params.get('direction', 'both'))
+        self._result_or_404(result)
+
+    @routes.route('GET', '/v1/graph/labels')
+    def _get_graph_labels(self, params):
+        # Get all labels/types: GET /v1/graph/labels?id=X
+        self._json_response(200, get_graph_labels(self._graph_id(params)))
+
+    @routes.route('GET', '/v1/graph/traverse',
+                  query={'depth': int, 'max_paths': int, 'max_nodes': int, 'max_edges': int})
+    def _get_graph_traverse(self, params):
+        # Traverse from node: GET /v1/graph/traverse?id=X&start=Y&direction=out&depth=3&relation=Z
+        #   &order=dfs|bfs|best&max_paths=100&max_nodes=10000&max_edges=100000
+        order = params.get('order', 'dfs')
+        if order not in TRAVERSAL_ORDERS:
+            self._json_response(400, {"error": f"order must be one of {', '.join(TRAVERSAL_ORDERS)}"})
+            return
+        limits = {limit: params[limit] for limit in ('max_paths', 'max_nodes', 'max_edges') if limit in params}
+        result = traverse_graph(self._graph_id(params), params.get('start', ''), params.get('direction', 'out'),
+                                params.get('depth', 3), params.get('relation'), order=order, **limits)
+        self._result_or_404(result)
+
+    @routes.route('GET', '/v1/graph/path', query={'max_depth': int})
+    def _get_graph_path(self, params):
+        # Shortest path: GET /v1/graph/path?id=X&from=A&to=B&direction=out&relation=Z&max_depth=6
+        result = find_shortest_path(self._graph_id(params), params.get('from', ''), params.get('to', ''),
+                                    params.get('direction', 'out'), params.get('relation'),
+                                    params.get('max_depth'))
+        self._result_or_404(result)
+
+    @routes.route('GET', '/v1/graph/paths', query={'k': int, 'max_paths': int})
+    def _get_graph_paths(self, params):
+        # All simple paths: GET /v1/graph/paths?id=X&from=A&to=B&k=4&direction=out&relation=Z&max_paths=100
+        result = find_all_paths(self._graph_id(params), params.get('from', ''), params.get('to', ''),
+                                params.get('k', 4), params.get('direction', 'out'),
+                                params.get('relation'), params.get('max_paths', 100))
+        self._result_or_404(result)
+
+    @routes.route('GET', '/v1/graph/neighborhood', query={'hops': int, 'fan_out': int_list, 'max_nodes': int})
+    def _get_graph_neighborhood(self, params):
+        # k-hop subgraph: GET /v1/graph/neighborhood?id=X&name=A&hops=2&fan_out=25,10&direction=both&relation=Z
+        result = get_neighborhood(self._graph_id(params), params.get('name', ''), params.get('hops', 2),
+                                  params.get('direction', 'both'), params.get('relation'),
+                                  params.get('fan_out') or None, params.get('max_nodes', 10000))
+        self._result_or_404(result)
+
+    @routes.route('GET', '/v1/graph/nodes', query={'limit': int})
+    def _get_graph_nodes(self, params):
+        # Property filter: GET /v1/graph/nodes?id=X&type=Task&status=pending&priority__gte=3&limit=100
+        #   (any other parameter is a property filter; __gt, __gte, __lt, __lte for ranges)
+        filters = {k: v for k, v in params.items() if k not in ('id', 'type', 'limit')}
+        try:
+            result = filter_nodes(self._graph_id(params), params.get('type'), filters, params.get('limit', 100))
+            self._json_response(200, result)
+        except ValueError as e:
+            self._json_response(400, {"error": str(e)})
+
+    @routes.route('GET', '/v1/graph/query', query={'limit': int, 'params': json_value})
+    def _get_graph_query(self, params):
+        # Pattern query: GET /v1/graph/query?id=X&q=MATCH (a)-[:R]->(b) RETURN a.name, b.name&limit=100
+        #   &params={"key": "value"} (JSON)
+        try:
+            result = run_query(self._graph_id(params), params.get('q', ''), params.get('params') or {},
+                               params.get('limit'))
+            self._json_response(200, result)
+        except QueryError as e:
+            self._json_response(400, {"error": str(e)})
+
+    @routes.route('POST', '/v1/graph/query')
+    def _post_graph_query(self, params):
+        # Pattern query: {"query": "MATCH (t:Task)-[:DEPENDS_ON]->(d) WHERE d.status = $s RETURN t.name",
+        #                 "params": {"s": "failed"}, "limit": 100, "workspace": "ws"}
+        try:
+            request = self._read_body()
+            base_dir = self._workspace_dir(request) if request.get('workspace') else None
+            limit = request.get('limit')
+            result = run_query(request.get('graph', self._graph_id(params)), request.get('query', ''),
+                               request.get('params') or {}, int(limit) if limit else None, base_dir)
+            self._json_response(200, result)
+        except QueryError as e:
+            self._json_response(400, {"error": str(e)})
+        except Exception as e:
+            print(f"Graph query error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('POST', '/v1/graph/batch')
+    def _post_graph_batch(self, params):
+        # Many read-only queries in one round trip:
+        # {"graph": "id", "workspace": "ws", "parallel": false,
+        #  "queries": [{"op": "search", "q": "auth"}, {"op": "node", "name": "X", "graph": "other"}]}
+        try:
+            request = self._read_body()
+            queries = request.get('queries', [])
+            if not isinstance(queries, list) or len(queries) > BATCH_MAX_QUERIES:
+                self._json_response(400, {"error": f"queries must be a list of at most {BATCH_MAX_QUERIES} queries"})
+                return
+            base_dir = self._workspace_dir(request) if request.get('workspace') else None
+            results = run_batch(queries, request.get('graph', self._graph_id(params)), base_dir,
+                                parallel=bool(request.get('parallel')))
+            self._json_response(200, {"count": len(results), "results": results})
+        except Exception as e:
+            print(f"Graph batch error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    def _result_or_404(self, result):
+        if 'error' in result:
+            self._json_response(404, result)
+        else:
+            self._json_response(200, result)
+
+    # ============ AGENT GRAPHS AND WORKSPACES ============
 
-        elif path == '/v1/agent/graph':
+    @routes.route('GET', '/v1/agent/graphs')
+    def _get_agent_graphs(self, params):
+        self._json_response(200, {"graphs": list_graphs(self._workspace_dir(params))})
+
+    @routes.route('GET', '/v1/agent/graph')
+    def _get_agent_graph(self, params):
+        self._json_response(200, snapshot_graph_state(self._graph_id(params), self._workspace_dir(params)))
+
+    @routes.route('POST', '/v1/agent/graph')
+    def _post_agent_graph(self, params):
+        graph_id = self._graph_id(params)
+        try:
+            graph = self._read_body()
             workspace_dir = self._workspace_dir(params)
-            deleted = delete_graph(graph_id, workspace_dir)
-            self._json_response(200 if deleted else 404, {"deleted": deleted, "workspace": params.get('workspace', 'default')})
+            save_graph_state(graph, graph_id, workspace_dir)
+            # Broadcast graph update to connected clients
+            broadcast_sse('graph_update', {
+                'action': 'save',
+                'graph_id': graph_id,
+                'workspace': params.get('workspace', 'default'),
+                'node_count': len(graph.get('nodes', [])),
+                'relationship_count': len(graph.get('relationships', []))
+            })
+            self._json_response(200, {
+                "status": "saved",
+                "node_count": len(graph.get('nodes', [])),
+                "relationship_count": len(graph.get('relationships', []))
+            })
+        except Exception as e:
+            self._json_response(500, {"error": {"message": str(e)}})
 
-        elif path == '/v1/workspaces':
-            workspace_name = params.get('name', '')
+    @routes.route('POST', '/v1/agent/graph/merge')
+    def _post_agent_graph_merge(self, params):
+        graph_id = self._graph_id(params)
+        try:
+            new_data = self._read_body()
+            workspace_dir = self._workspace_dir(params)
+            stats = {}
+            updated_graph = merge_into_graph(new_data, graph_id, workspace_dir, stats=stats)
+            # Broadcast graph update to connected clients
+            broadcast_sse('graph_update', {
+                'action': 'merge',
+                'graph_id': graph_id,
+                'workspace': params.get('workspace', 'default'),
+                'node_count': len(updated_graph.get('nodes', [])),
+                'relationship_count': len(updated_graph.get('relationships', [])),
+                'added_nodes': stats['added_nodes']
+            })
+            self._json_response(200, {
+                "status": "merged",
+                "node_count": len(updated_graph.get('nodes', [])),
+                "relationship_count": len(updated_graph.get('relationships', [])),
+                "added_nodes": stats['added_nodes'],
+                "dropped_relationships": stats['dropped_relationships']
+            })
+        except Exception as e:
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('DELETE', '/v1/agent/graph')
+    def _delete_agent_graph(self, params):
+        deleted = delete_graph(self._graph_id(params), self._workspace_dir(params))
+        self._json_response(200 if deleted else 404, {"deleted": deleted, "workspace": params.get('workspace', 'default')})
+
+    @routes.route('GET', '/v1/workspaces')
+    def _get_workspaces(self, params):
+        self._json_response(200, {"workspaces": list_workspaces()})
+
+    @routes.route('POST', '/v1/workspaces')
+    def _post_workspaces(self, params):
+        try:
+            req = self._read_body()
+            workspace_name = req.get('name', '').strip()
             if not workspace_name:
                 self._json_response(400, {"error": "Workspace name required"})
                 return
-            # Stop the loop if running and remove from registry
-            with _loops_lock:
-                if workspace_name in thinking_loops:
-                    loop = thinking_loops[workspace_name]
-                    if loop.running:
-                        loop.stop()
-                    del thinking_loops[workspace_name]
-            result = delete_workspace(workspace_name)
-            if 'error' in result:
-                self._json_response(400, result)
-            else:
-                self._json_response(200, result)
+            result = create_workspace(workspace_name)
+            self._json_response(200, result)
+        except Exception as e:
+            self._json_response(500, {"error": str(e)})
+
+    @routes.route('DELETE', '/v1/workspaces')
+    def _delete_workspaces(self, params):
+        workspace_name = params.get('name', '')
+        if not workspace_name:
+            self._json_response(400, {"error": "Workspace name required"})
+            return
+        # Stop the loop if running and remove from registry
+        with _loops_lock:
+            if workspace_name in thinking_loops:
+                loop = thinking_loops[workspace_name]
+                if loop.running:
+                    loop.stop()
+                del thinking_loops[workspace_name]
+        result = delete_workspace(workspace_name)
+        if 'error' in result:
+            self._json_response(400, result)
+        else:
+            self._json_response(200, result)
+
+    # ============ THINKING LOOP ============
 
+    @routes.route('POST', '/v1/loop/start')
+    def _post_loop_start(self, params):
+        try:
+            req = self._read_body()
+            workspace = req.get('workspace', 'default')
+            loop = get_loop(workspace)
+            result = loop.start(
+                prompt=req.get('prompt', ''),
+                interval=req.get('interval', 0)
+            )
+            self._json_response(200, result)
+        except Exception as e:
+            self._json_response(500, {"error": str(e)})
+
+    @routes.route('POST', '/v1/loop/stop')
+    def _post_loop_stop(self, params):
+        try:
+            req = self._read_body()
+            workspace = req.get('workspace', 'default')
+            loop = get_loop(workspace)
+            result = loop.stop()
+            self._json_response(200, result)
+        except Exception as e:
+            self._json_response(500, {"error": str(e)})
+
+    @routes.route('POST', '/v1/loop/configure')
+    def _post_loop_configure(self, params):
+        try:
+            req = self._read_body()
+            workspace = req.get('workspace', 'default')
+            loop = get_loop(workspace)
+            result = loop.configure(
+                prompt=req.get('prompt'),
+                interval=req.get('interval')
+            )
+            self._json_response(200, result)
+        except Exception as e:
+            self._json_response(500, {"error": str(e)})
+
+    @routes.route('GET', '/v1/loop/status')
+    def _get_loop_status(self, params):
+        workspace = params.get('workspace')
+        if workspace:
+            # Single workspace status
+            loop = get_loop(workspace)
+            self._json_response(200, loop.status())
         else:
-            self.send_response(404)
-            self.end_headers()
+            # All loops status
+            self._json_response(200, {"loops": _all_loop_statuses()})
+
+    @routes.route('GET', '/v1/loop/actions', query={'limit': int})
+    def _get_loop_actions(self, params):
+        loop = get_loop(params.get('workspace', 'default'))
+        self._json_response(200, {"actions": loop.actions[-params.get('limit', 50):]})
+
+    @routes.route('GET', '/v1/loop/stream', compress=False)
+    def _get_loop_stream(self, params):
+        # ?workspace=X limits the stream to that workspace's events (plus every loop's status);
+        # it opens with an all_status event holding every loop's status
+        self._start_event_stream(event_hub, params.get('workspace'), params,
+                                 lambda: ('all_status', _all_loop_statuses()))
+        self._serve_event_stream()
+
+    # ============ FILES AND SERVER ============
+
+    @routes.route('POST', '/v1/upload')
+    def _post_upload(self, params):
+        try:
+            req = self._read_body()
+            filename = req.get('filename', 'file')
+            data_b64 = req.get('data', '')
+
+            # Sanitize filename
+            safe_name = os.path.basename(filename)
+            unique_name = f"{uuid.uuid4().hex[:8]}_{safe_name}"
+
+            os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
+            dest = os.path.join(ATTACHMENTS_DIR, unique_name)
+
+            file_bytes = base64.b64decode(data_b64)
+            with open(dest, 'wb') as f:
+                f.write(file_bytes)
+
+            # Determine type from extension
+            ext = os.path.splitext(safe_name)[1].lower()
+            image_exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp'}
+            pdf_exts = {'.pdf'}
+            if ext in image_exts:
+                file_type = 'image'
+            elif ext in pdf_exts:
+                file_type = 'pdf'
+            else:
+                file_type = 'file'
+
+            self._json_response(200, {
+                "path": dest,
+                "filename": safe_name,
+                "type": file_type,
+                "size": len(file_bytes),
+                "url": f"/v1/attachments/{unique_name}"
+            })
+        except Exception as e:
+            print(f"Upload error: {e}")
+            self._json_response(500, {"error": {"message": str(e)}})
+
+    @routes.route('GET', '/v1/attachments/{filename:path}', compress=False)
+    def _get_attachment(self, params):
+        safe_name = os.path.basename(params['filename'])
+        filepath = os.path.join(ATTACHMENTS_DIR, safe_name)
+        if os.path.isfile(filepath):
+            mime_type = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+            self._send_file(filepath, mime_type)
+        else:
+            self._json_response(404, {"error": "File not found"})
+
+    @routes.route('GET', '/health')
+    def _get_health(self, params):
+        self._json_response(200, {"status": "ok", "claude_binary": CLAUDE_BINARY})
+
+    @routes.route('GET', '/v1/metrics')
+    def _get_metrics(self, params):
+        # Per-route request counts and handler times, slowest total first
+        self._json_response(200, {"routes": route_timings()})
 
     def log_message(self, format, *args):
         print(f"[{self.log_date_time_string()}] {format % args}")
+
+
+# ── Route middleware (outermost first) ───────────────────────────────────
+
+@routes.use
+def _timing(handler, route, params, call_next):
+    """Time each request into _route_stats and log slow ones; streamed responses are skipped."""
+    started = handler.request_started = time.perf_counter()
+    try:
+        return call_next()
+    finally:
+        if not handler.response_streamed:
+            elapsed = (time.perf_counter() - started) * 1000
+            with _route_stats_lock:
+                stat = _route_stats.setdefault(route.name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+                stat['count'] += 1
+                stat['total_ms'] += elapsed
+                stat['max_ms'] = max(stat['max_ms'], elapsed)
+            if elapsed > SLOW_REQUEST_MS:
+                print(f"Slow request: {handler.command} {handler.path} took {elapsed:.0f}ms")
+
+
+@routes.use
+def _caching(handler, route, params, call_next):
+    """Answer 304 for routes with an etag option when the client's copy is current."""
+    etag_fn = route.options.get('etag')
+    if etag_fn is not None:
+        etag = etag_fn(handler, params)
+        if etag is not None and handler._not_modified(etag):
+            return None
+        handler.response_etag = etag
+    return call_next()
+
+
+@routes.use
+def _compression(handler, route, params, call_next):
+    """Pick the response Content-Encoding; routes with compress=False send bytes as they are."""
+    if route.options.get('compress', True):
+        handler.response_encoding = handler._accepted_encoding()
+    return call_next()
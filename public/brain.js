@@ -25,7 +25,8 @@ function closeBrainDashboard() {
 function connectBrainSSE() {
   if (brainSSE) brainSSE.close();
 
-  brainSSE = new EventSource('http://localhost:8765/v1/loop/stream');
+  // Only this workspace's actions and graph updates (every loop's status still arrives)
+  brainSSE = new EventSource(`http://localhost:8765/v1/loop/stream?workspace=${encodeURIComponent(brainWorkspace)}`);
 
   brainSSE.addEventListener('status', (e) => {
     const data = JSON.parse(e.data);
@@ -73,6 +74,11 @@ function connectBrainSSE() {
     }
   });
 
+  // Sent after a reconnect when the events missed in between are no longer available
+  brainSSE.addEventListener('resync', () => {
+    refreshBrainStatus();
+  });
+
   brainSSE.onerror = () => {
     // SSE reconnects automatically, update indicator
     const indicator = document.getElementById('brain-connection');
@@ -167,6 +173,7 @@ async function refreshBrainWorkspaces() {
 
 async function switchBrainWorkspace(workspace) {
   brainWorkspace = workspace;
+  if (brainSSE) connectBrainSSE();
   await refreshBrainGraphs();
 }
 
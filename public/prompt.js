@@ -1401,7 +1401,45 @@ function onSuggestionExecuted() {
 
 // ============ GROUNDING CHECK ============
 
-function getGroundingCheckPrompt(nodes) {
+// ============ RELEVANT NODES (server-side similarity) ============
+
+// Prompts carry at most this many graph nodes, picked by /v1/graph/similar
+const PROMPT_NODE_LIMIT = 40;
+
+async function fetchSimilarNodes(query, k = PROMPT_NODE_LIMIT) {
+  /**
+   * Ask the server for the k nodes of the current graph most similar to query.
+   * Returns null if the server has no answer (graph not saved yet, offline).
+   */
+  try {
+    const gid = encodeURIComponent(currentGraphId || "default");
+    const response = await fetch(
+      `http://localhost:8765/v1/graph/similar?id=${gid}&q=${encodeURIComponent(query)}&k=${k}`,
+    );
+    if (!response.ok) return null;
+    const data = await response.json();
+    return data.nodes || null;
+  } catch (e) {
+    console.warn("Similarity lookup failed:", e.message);
+    return null;
+  }
+}
+
+async function getRelevantNodeIds(query, k = PROMPT_NODE_LIMIT) {
+  /**
+   * Ids of the k nodes most relevant to query, or null to use the whole graph
+   * (small graphs, or when the server copy does not match the local one).
+   */
+  const nodes = merged_object?.nodes || [];
+  if (nodes.length <= k) return null;
+  const similar = await fetchSimilarNodes(query, k);
+  if (!similar?.length) return null;
+  const localIds = new Set(nodes.map((n) => n.id));
+  const ids = new Set(similar.map((n) => n.id).filter((id) => localIds.has(id)));
+  return ids.size ? ids : null;
+}
+
+function getGroundingCheckPrompt(nodes, relatedNodes = []) {
   const nodeList = nodes.map((n) => ({
     id: n.id,
     name: n.properties?.name || n.name,
@@ -1418,7 +1456,14 @@ function getGroundingCheckPrompt(nodes) {
 
 CONCEPTS TO EVALUATE:
 ${nodeList.map((n) => `[ID:${n.id}] ${n.name} (${n.grounding}): ${n.description}${n.hypothesis ? " | Hypothesis: " + n.hypothesis : ""}${n.mechanism ? " | Mechanism: " + n.mechanism : ""}${n.detection ? " | Detection: " + n.detection : ""}`).join("\n")}
-
+${
+  relatedNodes.length
+    ? `
+MOST SIMILAR EXISTING CONCEPTS (context for the novelty test, do not evaluate):
+${relatedNodes.map((n) => `- ${n.name}: ${n.properties?.description || ""}`).join("\n")}
+`
+    : ""
+}
 EVALUATION CRITERIA BY TYPE:
 
 For ESTABLISHED concepts:
@@ -1511,11 +1556,20 @@ async function runGroundingCheck(targetNodes = null) {
     let processedCount = 0;
 
     for (const batch of batches) {
+      const batchIds = new Set(batch.map((n) => n.id));
+      const similar = await fetchSimilarNodes(
+        batch.map((n) => n.properties?.name || n.name).join(" "),
+        batchSize + 8,
+      );
+      const related = (similar || [])
+        .filter((n) => !batchIds.has(n.id))
+        .slice(0, 8);
+
       const response = await fetch("http://localhost:8765/v1/completions", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
-          prompt: getGroundingCheckPrompt(batch),
+          prompt: getGroundingCheckPrompt(batch, related),
           model: "claude-opus-4-6",
         }),
       });
@@ -1908,18 +1962,28 @@ function renderPendingAttachments() {
     .join("");
 }
 
-function getChatPrompt(userQuestion, includeHistory = true, attachments = []) {
-  const nodes = merged_object.nodes.map((n) => ({
+function getChatPrompt(
+  userQuestion,
+  includeHistory = true,
+  attachments = [],
+  relevantIds = null,
+) {
+  // relevantIds (from getRelevantNodeIds) limits the prompt to the most relevant nodes
+  const graphNodes = relevantIds
+    ? merged_object.nodes.filter((n) => relevantIds.has(n.id))
+    : merged_object.nodes;
+  const nodes = graphNodes.map((n) => ({
     id: n.id,
     name: n.properties?.name || n.name,
     description: n.properties?.description || n.description,
     type: n.labels?.[0],
   }));
 
+  const nodesById = new Map(graphNodes.map((n) => [n.id, n]));
   const relationships = merged_object.relationships
     .map((r) => {
-      const source = merged_object.nodes.find((n) => n.id === r.startNodeId);
-      const target = merged_object.nodes.find((n) => n.id === r.endNodeId);
+      const source = nodesById.get(r.startNodeId);
+      const target = nodesById.get(r.endNodeId);
       return {
         from: source?.properties?.name,
         to: target?.properties?.name,
@@ -1979,7 +2043,7 @@ FIRST: Analyze the knowledge graph to determine its primary domain, then adopt t
 - Creative/Artistic content → Think interpretively: themes, meanings, aesthetic considerations
 
 KNOWLEDGE GRAPH (Your Conceptual Framework):
-===========================================
+===========================================${relevantIds ? `\n(Showing the ${nodes.length} of ${merged_object.nodes.length} concepts most relevant to this message; query the graph API for the rest.)` : ""}
 CONCEPTS (${nodes.length}):
 ${nodes.map((n) => `- ${n.name} [${n.type}]: ${n.description || "No description"}`).join("\n")}
 
@@ -2082,14 +2146,17 @@ function sendChatRequest(userQuestion, attachments = []) {
   showChatModal(true);
   setChatLoading(true);
 
-  fetch("http://localhost:8765/v1/completions", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      prompt: getChatPrompt(userQuestion, true, attachments),
-      model: "claude-opus-4-6",
-    }),
-  })
+  getRelevantNodeIds(userQuestion)
+    .then((relevantIds) =>
+      fetch("http://localhost:8765/v1/completions", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          prompt: getChatPrompt(userQuestion, true, attachments, relevantIds),
+          model: "claude-opus-4-6",
+        }),
+      }),
+    )
     .then((response) => response.json())
     .then((data) => {
       if (data.error)
@@ -2328,155 +2395,151 @@ Begin implementation:`;
     });
 }
 
-let taskPollers = {}; // Track active polling intervals
+let taskPollers = {}; // Track active task watchers (watchTask handles)
 
 function pollTaskStatus(localTaskId, serverTaskId, originalTask, projectName) {
   // Clear any existing poller for this task
   if (taskPollers[localTaskId]) {
-    clearInterval(taskPollers[localTaskId]);
+    taskPollers[localTaskId].close();
   }
 
   // Show the task monitor
   showTaskMonitor(true);
 
-  const pollInterval = setInterval(() => {
-    fetch(`http://localhost:8765/v1/tasks/${serverTaskId}`)
-      .then((response) => response.json())
-      .then(async (data) => {
-        // Update task with live info
-        const taskMsg = chatHistory.find(
-          (msg) => msg.role === "task" && msg.taskId === localTaskId,
-        );
-        if (taskMsg) {
-          taskMsg.outputLines = data.output_lines || 0;
-          taskMsg.lastOutput = data.last_output || "";
-          taskMsg.liveFiles = data.files || [];
-        }
+  // Progress is pushed over the task's event stream (or polled if that is unavailable)
+  taskPollers[localTaskId] = watchTask(serverTaskId, async (data) => {
+    // Update task with live info
+    const taskMsg = chatHistory.find(
+      (msg) => msg.role === "task" && msg.taskId === localTaskId,
+    );
+    if (taskMsg) {
+      taskMsg.outputLines = data.output_lines || 0;
+      taskMsg.lastOutput = data.last_output || "";
+      taskMsg.liveFiles = data.files || [];
+    }
 
-        // Update the task monitor in main UI
-        updateTaskMonitor(data);
+    // Update the task monitor in main UI
+    updateTaskMonitor(data);
 
-        // Refresh the modal if it's open
-        if (document.getElementById("chat-modal")) {
-          showChatModal();
-        }
+    // Refresh the modal if it's open
+    if (document.getElementById("chat-modal")) {
+      showChatModal();
+    }
 
-        if (data.status === "completed") {
-          clearInterval(taskPollers[localTaskId]);
-          delete taskPollers[localTaskId];
+    if (data.status === "completed") {
+      taskPollers[localTaskId].close();
+      delete taskPollers[localTaskId];
 
-          // Hide task monitor
-          showTaskMonitor(false);
+      // Hide task monitor
+      showTaskMonitor(false);
 
-          // Build result with file info
-          const result = data.result || {};
-          let resultText = result.response || "";
+      // Build result with file info
+      const result = data.result || {};
+      let resultText = result.response || "";
 
-          if (result.files && result.files.length > 0) {
-            resultText += `\n\n📁 **Files created:**\n`;
-            resultText += result.files.map((f) => `- ${f}`).join("\n");
-          }
+      if (result.files && result.files.length > 0) {
+        resultText += `\n\n📁 **Files created:**\n`;
+        resultText += result.files.map((f) => `- ${f}`).join("\n");
+      }
 
-          resultText += `\n\n📂 **Project location:** \`${result.working_dir}\``;
+      resultText += `\n\n📂 **Project location:** \`${result.working_dir}\``;
 
-          updateTaskStatus(localTaskId, "completed", resultText, {
-            type: "implementation",
-            workingDir: result.working_dir,
-            files: result.files || [],
-            serverTaskId: serverTaskId,
-          });
+      updateTaskStatus(localTaskId, "completed", resultText, {
+        type: "implementation",
+        workingDir: result.working_dir,
+        files: result.files || [],
+        serverTaskId: serverTaskId,
+      });
+
+      // Auto-pull from server — task may have written to graph via API
+      try {
+        const pullResult = await pullFromServer();
+        if (pullResult?.added > 0) {
+          console.log(
+            `Auto-pulled ${pullResult.added} nodes from server after implementation task`,
+          );
+        }
+      } catch (e) {
+        console.warn("Auto-pull after implementation task failed:", e);
+      }
+
+      // Add to graph if requested
+      if (originalTask.addToGraph) {
+        // Try to parse graph data from the response first
+        const responseText = result.response || "";
+        const graphMatch = responseText.match(
+          /```graph\s*\n?([\s\S]*?)```/,
+        );
+        let graphParsed = false;
 
-          // Auto-pull from server — task may have written to graph via API
+        if (graphMatch) {
           try {
-            const pullResult = await pullFromServer();
-            if (pullResult?.added > 0) {
-              console.log(
-                `Auto-pulled ${pullResult.added} nodes from server after implementation task`,
-              );
+            const graphData = JSON.parse(graphMatch[1].trim());
+            if (graphData.nodes && graphData.nodes.length > 0) {
+              mergeNewNodes(graphData, null, "task-implementation");
+              renderGraph(merged_object);
+              graphParsed = true;
             }
           } catch (e) {
-            console.warn("Auto-pull after implementation task failed:", e);
-          }
-
-          // Add to graph if requested
-          if (originalTask.addToGraph) {
-            // Try to parse graph data from the response first
-            const responseText = result.response || "";
-            const graphMatch = responseText.match(
-              /```graph\s*\n?([\s\S]*?)```/,
+            console.warn(
+              "Failed to parse graph data from implementation task:",
+              e,
             );
-            let graphParsed = false;
-
-            if (graphMatch) {
-              try {
-                const graphData = JSON.parse(graphMatch[1].trim());
-                if (graphData.nodes && graphData.nodes.length > 0) {
-                  mergeNewNodes(graphData, null, "task-implementation");
-                  renderGraph(merged_object);
-                  graphParsed = true;
-                }
-              } catch (e) {
-                console.warn(
-                  "Failed to parse graph data from implementation task:",
-                  e,
-                );
-              }
-            }
+          }
+        }
 
-            // Fallback: if no graph block found, try parsing any JSON block with nodes/relationships
-            if (!graphParsed) {
-              const jsonMatch = responseText.match(
-                /```(?:json)?\s*\n?([\s\S]*?\{[\s\S]*?"nodes"[\s\S]*?\})\s*```/,
-              );
-              if (jsonMatch) {
-                try {
-                  const graphData = JSON.parse(jsonMatch[1].trim());
-                  if (graphData.nodes && graphData.nodes.length > 0) {
-                    mergeNewNodes(graphData, null, "task-implementation");
-                    renderGraph(merged_object);
-                    graphParsed = true;
-                  }
-                } catch (e) {
-                  console.warn("Failed to parse JSON graph fallback:", e);
-                }
+        // Fallback: if no graph block found, try parsing any JSON block with nodes/relationships
+        if (!graphParsed) {
+          const jsonMatch = responseText.match(
+            /```(?:json)?\s*\n?([\s\S]*?\{[\s\S]*?"nodes"[\s\S]*?\})\s*```/,
+          );
+          if (jsonMatch) {
+            try {
+              const graphData = JSON.parse(jsonMatch[1].trim());
+              if (graphData.nodes && graphData.nodes.length > 0) {
+                mergeNewNodes(graphData, null, "task-implementation");
+                renderGraph(merged_object);
+                graphParsed = true;
               }
-            }
-
-            // Last resort: create a stub project node
-            if (!graphParsed) {
-              const graphNodes = [
-                {
-                  id: 1000,
-                  labels: ["Project"],
-                  properties: {
-                    name: projectName,
-                    description: originalTask.description,
-                    path: result.working_dir,
-                    files: (result.files || []).slice(0, 10).join(", "),
-                  },
-                },
-              ];
-              mergeNewNodes(
-                { nodes: graphNodes, relationships: [] },
-                null,
-                "implementation",
-              );
-              renderGraph(merged_object);
+            } catch (e) {
+              console.warn("Failed to parse JSON graph fallback:", e);
             }
           }
-        } else if (data.status === "failed") {
-          clearInterval(taskPollers[localTaskId]);
-          delete taskPollers[localTaskId];
-          showTaskMonitor(false);
-          updateTaskStatus(localTaskId, "failed", data.error || "Task failed");
         }
-      })
-      .catch((err) => {
-        console.warn("Poll error:", err);
-      });
-  }, 2000); // Poll every 2 seconds
 
-  taskPollers[localTaskId] = pollInterval;
+        // Last resort: create a stub project node
+        if (!graphParsed) {
+          const graphNodes = [
+            {
+              id: 1000,
+              labels: ["Project"],
+              properties: {
+                name: projectName,
+                description: originalTask.description,
+                path: result.working_dir,
+                files: (result.files || []).slice(0, 10).join(", "),
+              },
+            },
+          ];
+          mergeNewNodes(
+            { nodes: graphNodes, relationships: [] },
+            null,
+            "implementation",
+          );
+          renderGraph(merged_object);
+        }
+      }
+    } else if (data.status === "failed" || data.status === "cancelled") {
+      taskPollers[localTaskId].close();
+      delete taskPollers[localTaskId];
+      showTaskMonitor(false);
+      updateTaskStatus(
+        localTaskId,
+        "failed",
+        data.error || (data.status === "cancelled" ? "Task cancelled" : "Task failed"),
+      );
+    }
+  });
 }
 
 function showTaskMonitor(visible) {
@@ -2502,7 +2565,9 @@ function updateTaskMonitor(data) {
   }
 
   if (previewEl) {
-    const lastOutput = data.last_output || "Starting...";
+    const lastOutput =
+      data.last_output ||
+      (data.queue_position ? `Queued (#${data.queue_position})...` : "Starting...");
     const files = data.files || [];
 
     let html = `<pre>${escapeHtml(lastOutput.slice(-500))}</pre>`;
@@ -2945,6 +3010,10 @@ SEARCHING & EXPLORING (use these for large graphs instead of loading everything)
     → Get all nodes that have a specific relation to/from a node. direction: in, out, or both
     Returns: {"center": "...", "count": N, "results": [{"node": {...}, "relation": "...", "direction": "..."}]}
 
+  curl -s "http://localhost:8765/v1/graph/nodes?id=${gid}&type=Task&status=pending&priority__gte=3"
+    → Nodes of a type whose properties match: key=value for equality, key__gt/__gte/__lt/__lte for numbers and ISO dates.
+    Returns: {"count": N, "nodes": [{"id": ..., "name": "...", "type": "...", "properties": {...}}]}
+
   curl -s "http://localhost:8765/v1/graph/labels?id=${gid}"
     → List all node types and relationship types with counts. Useful for understanding graph schema.
     Returns: {"node_types": [{"type": "...", "count": N}], "relationship_types": [...]}
@@ -2953,6 +3022,29 @@ SEARCHING & EXPLORING (use these for large graphs instead of loading everything)
     → Traverse paths from a starting node. direction: in, out, or both. relation: optional filter.
     Returns: {"start": "...", "paths": [["NodeA", "--[REL]-->", "NodeB", ...], ...]}
 
+  curl -s "http://localhost:8765/v1/graph/path?id=${gid}&from=NODE_A&to=NODE_B&direction=both"
+    → Shortest path between two nodes (one call instead of chaining /node lookups). relation: optional filter.
+    Returns: {"found": true, "length": N, "path": ["NodeA", "--[REL]-->", "NodeX", "<--[REL]--", "NodeB"]}
+
+  curl -s "http://localhost:8765/v1/graph/paths?id=${gid}&from=NODE_A&to=NODE_B&k=4&direction=both"
+    → All paths of at most k hops between two nodes.
+
+  curl -s "http://localhost:8765/v1/graph/neighborhood?id=${gid}&name=NODE_NAME&hops=2&fan_out=20,5"
+    → Subgraph within k hops of a node, capped at fan_out new neighbors per node per hop.
+    Returns: {"nodes": [{"name": "...", "depth": N, ...}], "relationships": [...], "truncated": false}
+
+  curl -s -X POST "http://localhost:8765/v1/graph/query?id=${gid}" \\
+    -d '{"query": "MATCH (t:Task {status: \\"pending\\"})-[:DEPENDS_ON]->(d:Task) WHERE d.status = $s RETURN t.name, d.name LIMIT 20", "params": {"s": "failed"}}'
+    → Multi-hop pattern match in one call, returning only the RETURNed fields. Patterns: (v:Type {key: value}), -[r:TYPE]->, <-[]-, -[]-.
+    WHERE supports AND/OR/NOT, = <> < > <= >=, CONTAINS, STARTS WITH, IN [...], IS NULL. Also DISTINCT, ORDER BY ... DESC, LIMIT.
+    Returns: {"columns": [...], "rows": [{"t.name": "...", "d.name": "..."}], "plan": {...}, "truncated": false}
+
+  curl -s -X POST "http://localhost:8765/v1/graph/batch?id=${gid}" \\
+    -d '{"queries": [{"op": "search", "q": "QUERY"}, {"op": "node", "name": "NODE_NAME", "depth": 2}, {"op": "relations", "node": "NODE_NAME"}]}'
+    → Run several of the lookups above in ONE call (prefer this over many separate curls).
+    ops: search, similar, nodes, node, relations, labels, summary, traverse, path, paths, neighborhood, query (same parameters as the GET endpoints)
+    Returns: {"results": [{"op": "search", "result": {...}}, {"op": "node", "error": "..."}, ...]} in query order
+
 WRITING TO THE GRAPH (add new knowledge):
   curl -s -X POST "http://localhost:8765/v1/graph/merge?id=${gid}" \\
     -H "Content-Type: application/json" \\
@@ -3004,7 +3096,11 @@ WORKFLOW:
     await syncToServer();
 
     // Execute Claude task
-    const result = await executeClaudeTask(fullPrompt, { async: true });
+    // Grounding runs in batches; let chat requests go ahead of it
+    const result = await executeClaudeTask(fullPrompt, {
+      async: true,
+      priority: mode === "ground" ? "batch" : "chat",
+    });
 
     if (result.task_id) {
       const taskStartTime = Date.now();
@@ -3031,25 +3127,21 @@ WORKFLOW:
         }
       }, 1000);
 
-      // Poll for completion (inline to avoid function name collision)
+      // Follow progress until completion (inline to avoid function name collision)
       const taskId = result.task_id;
-      const pollInterval = setInterval(async () => {
+      const watcher = watchTask(taskId, async (task) => {
         try {
-          const response = await fetch(
-            `http://localhost:8765/v1/tasks/${taskId}`,
-          );
-          const task = await response.json();
-
           // Update progress
           const taskMsg = chatHistory.find((m) => m.taskId === taskId);
           if (taskMsg) {
             taskMsg.outputLines = task.output_lines || 0;
             taskMsg.lastOutput = task.last_output?.slice(-200) || "";
+            taskMsg.queuePosition = task.queue_position;
           }
           showChatModal();
 
           if (task.status === "completed") {
-            clearInterval(pollInterval);
+            watcher.close();
             clearInterval(elapsedInterval);
             await (async (task) => {
               try {
@@ -3191,25 +3283,26 @@ WORKFLOW:
 
               showChatModal();
             })(task);
-          } else if (task.status === "failed") {
-            clearInterval(pollInterval);
+          } else if (task.status === "failed" || task.status === "cancelled") {
+            watcher.close();
             clearInterval(elapsedInterval);
             const taskMsg = chatHistory.find((m) => m.taskId === taskId);
             if (taskMsg) {
               taskMsg.status = "failed";
-              taskMsg.error = task.error || "Task failed";
+              taskMsg.error =
+                task.error || (task.status === "cancelled" ? "Task cancelled" : "Task failed");
               saveChatHistory();
             }
             addChatMessage(
               "system",
-              `Task failed: ${task.error || "Unknown error"}`,
+              `Task ${task.status}: ${task.error || (task.status === "cancelled" ? "cancelled" : "Unknown error")}`,
             );
             showChatModal();
           }
         } catch (err) {
-          console.warn("Poll error:", err);
+          console.warn("Task update error:", err);
         }
-      }, 2000);
+      });
     }
   } catch (e) {
     // Mark task as failed
@@ -3710,7 +3803,7 @@ function renderClaudeTaskMessage(msg) {
     progressHtml = `
             <div class="claude-task-progress">
                 <span class="progress-spinner"></span>
-                <span class="progress-lines">${msg.outputLines || 0} lines</span>
+                <span class="progress-lines">${msg.queuePosition ? `Queued #${msg.queuePosition}` : `${msg.outputLines || 0} lines`}</span>
                 <span class="progress-elapsed">${formatElapsed(elapsed)}</span>
             </div>
             ${msg.lastOutput ? `<div class="claude-task-preview"><pre>${escapeHtml(msg.lastOutput)}</pre></div>` : ""}
@@ -114,13 +114,186 @@ async function migrateLegacyChats() {
     });
 }
 
+// ============ CONDITIONAL REQUESTS ============
+
+// url -> { etag, data } from the last 200 response (data only kept when asked for)
+const etagCache = new Map();
+
+// GET a JSON resource, sending the ETag of the last response so an unchanged
+// resource comes back as a body-less 304. Returns { ok, status, notModified, data };
+// on a 304, data is the previous response's if keepData was set, otherwise null.
+async function fetchJSONIfChanged(url, { keepData = false } = {}) {
+    const cached = etagCache.get(url);
+    const response = await fetch(url, {
+        // Bypass the browser cache so the 304 reaches us instead of a cached copy
+        cache: 'no-store',
+        headers: cached ? { 'If-None-Match': cached.etag } : {}
+    });
+    if (response.status === 304 && cached) {
+        return { ok: true, status: 304, notModified: true, data: cached.data };
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        etagCache.set(url, { etag, data: keepData ? data : null });
+    } else {
+        etagCache.delete(url);
+    }
+    return { ok: response.ok, status: response.status, notModified: false, data };
+}
+
 // ============ GRAPH OPERATIONS (Server-backed) ============
 
 function generateGraphId() {
     return 'graph-' + Date.now() + '-' + Math.random().toString(36).substring(2, 11);
 }
 
+// ============ DELTA SYNC ============
+// The server numbers every write to a graph (its revision) and keeps a changelog,
+// so saves send only what changed since the last revision the server acknowledged
+// and pulls fetch only what changed since then. syncState holds that revision and
+// the nodes and relationships as of it, serialized and keyed like the server's
+// changelog (nodes by id, relationships by source, target and lowercased type).
+
+let syncState = null;
+let saveChain = Promise.resolve();
+
+function relSyncKey(rel) {
+    const src = rel.source || rel.startNode || rel.startNodeId || rel.from;
+    const tgt = rel.target || rel.endNode || rel.endNodeId || rel.to;
+    return [String(src ?? 'None'), String(tgt ?? 'None'), String(rel.type || rel.label || 'RELATED_TO').toLowerCase()];
+}
+
+function nodeSyncKey(id) {
+    return `${typeof id}:${id}`;
+}
+
+function snapshotForSync(graph) {
+    // null if some node has no usable id; such graphs are always saved whole
+    const nodes = new Map();
+    for (const node of graph.nodes || []) {
+        if (!(typeof node.id === 'string' || Number.isInteger(node.id))) return null;
+        const key = nodeSyncKey(node.id);
+        if (nodes.has(key)) return null;
+        nodes.set(key, { id: node.id, node, json: JSON.stringify(node) });
+    }
+    const relationships = new Map();
+    for (const rel of graph.relationships || []) {
+        const edge = relSyncKey(rel);
+        const key = JSON.stringify(edge);
+        const json = JSON.stringify(rel);
+        const existing = relationships.get(key);
+        // The server keeps one relationship per key once it is changed, like this
+        relationships.set(key, { edge, rel, json: existing ? existing.json + '\n' + json : json });
+    }
+    return { nodes, relationships };
+}
+
+function rememberSyncedGraph(graphId, graph, revision, createdAt) {
+    const snapshot = snapshotForSync(graph);
+    syncState = snapshot && {
+        graphId,
+        revision: revision || 0,
+        createdAt: createdAt ?? null,
+        history: (graph.history || []).slice(),
+        ...snapshot
+    };
+}
+
+function diffForSync(graph) {
+    const current = snapshotForSync(graph);
+    if (!current) return null;
+    const delta = { nodes: [], removed_nodes: [], relationships: [], removed_relationships: [] };
+    for (const [key, entry] of current.nodes) {
+        if (syncState.nodes.get(key)?.json !== entry.json) delta.nodes.push(entry.node);
+    }
+    for (const [key, entry] of syncState.nodes) {
+        if (!current.nodes.has(key)) delta.removed_nodes.push(entry.id);
+    }
+    for (const [key, entry] of current.relationships) {
+        if (syncState.relationships.get(key)?.json !== entry.json) delta.relationships.push(entry.rel);
+    }
+    for (const [key, entry] of syncState.relationships) {
+        if (!current.relationships.has(key)) delta.removed_relationships.push(entry.edge);
+    }
+    return { delta, current };
+}
+
+function historyForSync(history) {
+    // History entries are only ever appended or replaced wholesale, so compare by reference
+    const synced = syncState.history;
+    let start = 0;
+    while (start < synced.length && start < history.length && synced[start] === history[start]) start++;
+    if (start === synced.length && start === history.length) return null;
+    return { history_start: start, history: history.slice(start) };
+}
+
+async function pushGraphDelta(id, graph, title, retried = false) {
+    // Returns false if the graph has to be saved whole instead
+    const diff = diffForSync(graph);
+    if (!diff) return false;
+    const history = historyForSync(graph.history);
+    const { delta } = diff;
+    const empty = !delta.nodes.length && !delta.removed_nodes.length &&
+        !delta.relationships.length && !delta.removed_relationships.length;
+    if (empty && !history && !title) return true;
+
+    const body = {
+        base_revision: syncState.revision,
+        created_at: syncState.createdAt,
+        ...delta,
+        ...history,
+        historyIndex: graph.historyIndex
+    };
+    if (title) body.title = title;
+
+    const response = await fetch(`${SERVER_URL}/v1/graph/delta?id=${encodeURIComponent(id)}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+
+    if (response.status === 409 && !retried) {
+        // Someone else changed the same nodes or relationships: take the server's
+        // version of those, then push whatever local changes are left
+        const conflict = await response.json();
+        console.warn('Save conflicts with server changes, keeping the server version of:',
+            conflict.reset ? 'the whole graph' : conflict.conflicts);
+        await pullFromServer();
+        if (syncState?.graphId !== id) return false;
+        return pushGraphDelta(id, {
+            ...graph,
+            nodes: merged_object?.nodes || [],
+            relationships: merged_object?.relationships || []
+        }, title, true);
+    }
+    if (!response.ok) throw new Error(`Server error: ${response.status}`);
+
+    const result = await response.json();
+    const base = syncState.revision;
+    syncState = {
+        ...syncState,
+        ...diff.current,
+        history: graph.history.slice(),
+        revision: result.revision
+    };
+    console.log('Saved graph changes to server:', id, result);
+    if (result.revision !== base + 1) {
+        // Others wrote in between: fetch their changes (ours come back unchanged)
+        syncState.revision = base;
+        await pullFromServer();
+    }
+    return true;
+}
+
 async function saveGraph(graphData = {}, name = null) {
+    // One save at a time, so each delta is based on the revision the previous one produced
+    const run = saveChain.then(() => saveGraphNow(graphData, name));
+    saveChain = run.catch(() => {});
+    return run;
+}
+
+async function saveGraphNow(graphData, name) {
     const id = currentGraphId || generateGraphId();
     currentGraphId = id;
     localStorage.setItem('gestalt-currentGraphId', id);
@@ -135,6 +308,10 @@ async function saveGraph(graphData = {}, name = null) {
     };
 
     try {
+        if (syncState?.graphId === id && await pushGraphDelta(id, graph, graph.title)) {
+            return id;
+        }
+
         const response = await fetch(`${SERVER_URL}/v1/graph?id=${encodeURIComponent(id)}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
@@ -143,6 +320,7 @@ async function saveGraph(graphData = {}, name = null) {
 
         if (!response.ok) throw new Error(`Server error: ${response.status}`);
         const result = await response.json();
+        rememberSyncedGraph(id, graph, result.revision, result.created_at);
         console.log('Saved graph to server:', id, result);
         return id;
     } catch (e) {
@@ -162,6 +340,7 @@ async function loadGraph(graphId) {
         const graph = await response.json();
         currentGraphId = graphId;
         localStorage.setItem('gestalt-currentGraphId', graphId);
+        rememberSyncedGraph(graphId, graph, graph.revision, graph.created_at);
 
         // Return in the format expected by the app
         return {
@@ -186,10 +365,9 @@ async function loadGraph(graphId) {
 
 async function listGraphs() {
     try {
-        const response = await fetch(`${SERVER_URL}/v1/graphs`);
-        if (!response.ok) throw new Error(`Server error: ${response.status}`);
+        const { ok, status, data } = await fetchJSONIfChanged(`${SERVER_URL}/v1/graphs`, { keepData: true });
+        if (!ok) throw new Error(`Server error: ${status}`);
 
-        const data = await response.json();
         return (data.graphs || []).map(g => ({
             id: g.id,
             name: g.title || g.id,
@@ -216,6 +394,7 @@ async function deleteGraph(graphId) {
             currentGraphId = null;
             localStorage.removeItem('gestalt-currentGraphId');
         }
+        if (syncState?.graphId === graphId) syncState = null;
 
         // Also delete chat for this graph
         await deleteChatForGraph(graphId);
@@ -364,7 +543,8 @@ function triggerAutoSave() {
 // ============ CLAUDE CODE TASK EXECUTION ============
 
 async function executeClaudeTask(prompt, options = {}) {
-    const { workingDir, async: asyncMode = true } = options;
+    // priority: 'chat' (default), 'loop' or 'batch' — decides which queued tasks start first
+    const { workingDir, async: asyncMode = true, priority = 'chat' } = options;
 
     // Save current graph first so Claude can see latest state
     if (merged_object?.nodes?.length > 0) {
@@ -379,6 +559,7 @@ async function executeClaudeTask(prompt, options = {}) {
                 prompt: prompt,
                 working_dir: workingDir,
                 async: asyncMode,
+                priority,
                 graph_id: currentGraphId || 'default'
             })
         });
@@ -391,32 +572,100 @@ async function executeClaudeTask(prompt, options = {}) {
     }
 }
 
-async function pollTaskStatus(taskId, { onProgress, onComplete, interval = 2000 } = {}) {
+// Follow a task over /v1/tasks/<id>/stream: a status snapshot, then output chunks
+// and status changes as the server parses them. Falls back to polling /v1/tasks/<id>
+// when the stream cannot be opened. onUpdate(task) gets the task as GET /v1/tasks/<id>
+// returns it; output arriving in quick succession is passed on at most every
+// outputInterval ms. Stops by itself once the task has finished. Returns { close }.
+const TASK_FINISHED = ['completed', 'failed', 'interrupted', 'cancelled'];
+
+function watchTask(taskId, onUpdate, { interval = 2000, outputInterval = 250 } = {}) {
+    const url = `${SERVER_URL}/v1/tasks/${encodeURIComponent(taskId)}`;
+    let task = null;
+    let source = null;
+    let pollTimer = null;
+    let outputTimer = null;
+    let stopped = false;
+
+    const stop = () => {
+        stopped = true;
+        if (source) source.close();
+        clearTimeout(pollTimer);
+    };
+    const emit = () => {
+        outputTimer = null;
+        Promise.resolve(onUpdate(task)).catch(e => console.warn('Task update handler failed:', e));
+    };
+    const setTask = (next, { immediate = true } = {}) => {
+        if (stopped) return;
+        task = next;
+        if (TASK_FINISHED.includes(task.status)) stop();
+        if (immediate || stopped) {
+            clearTimeout(outputTimer);
+            emit();
+        } else if (!outputTimer) {
+            outputTimer = setTimeout(emit, outputInterval);
+        }
+    };
     const poll = async () => {
         try {
-            const response = await fetch(`${SERVER_URL}/v1/tasks/${taskId}`);
-            const task = await response.json();
+            const { ok, notModified, data } = await fetchJSONIfChanged(url, { keepData: true });
+            if (ok && !notModified) setTask(data);
+        } catch (e) {
+            console.warn('Task poll failed:', e.message);
+        }
+        if (!stopped) pollTimer = setTimeout(poll, interval);
+    };
 
-            if (onProgress) onProgress(task);
+    if (typeof EventSource === 'undefined') {
+        poll();
+    } else {
+        let opened = false;
+        source = new EventSource(`${url}/stream`);
+        source.onopen = () => { opened = true; };
+        source.addEventListener('status', (e) => setTask(JSON.parse(e.data)));
+        source.addEventListener('output', (e) => {
+            if (!task) return;
+            const { text, output_lines } = JSON.parse(e.data);
+            const lines = ((task.last_output || '') + text).split('\n');
+            setTask({ ...task, last_output: lines.slice(-20).join('\n'), output_lines }, { immediate: false });
+        });
+        source.onerror = () => {
+            // Once open, EventSource reconnects (resuming with Last-Event-ID) by itself
+            if (opened || stopped) return;
+            source.close();
+            source = null;
+            poll();
+        };
+    }
 
-            if (task.status === 'completed') {
-                await reloadGraphFromServer();
-                if (onComplete) onComplete(task);
-                return task;
-            } else if (task.status === 'failed') {
-                throw new Error(task.error || 'Task failed');
-            } else {
-                return new Promise(resolve => {
-                    setTimeout(() => resolve(poll()), interval);
-                });
-            }
-        } catch (e) {
-            console.error('Poll error:', e);
-            throw e;
+    return {
+        close() {
+            stop();
+            clearTimeout(outputTimer);
         }
     };
+}
 
-    return poll();
+function pollTaskStatus(taskId, { onProgress, onComplete, interval = 2000 } = {}) {
+    return new Promise((resolve, reject) => {
+        watchTask(taskId, async (task) => {
+            if (onProgress) onProgress(task);
+
+            if (task.status === 'completed') {
+                try {
+                    await pullFromServer();
+                    if (onComplete) onComplete(task);
+                    resolve(task);
+                } catch (e) {
+                    reject(e);
+                }
+            } else if (TASK_FINISHED.includes(task.status)) {
+                console.error('Task error:', task.error || task.status);
+                reject(new Error(task.error || `Task ${task.status}`));
+            }
+        }, { interval });
+    });
 }
 
 // ============ RELOAD FROM SERVER ============
@@ -425,17 +674,21 @@ async function reloadGraphFromServer() {
     const gid = currentGraphId || 'default';
 
     try {
-        const response = await fetch(`${SERVER_URL}/v1/graph?id=${encodeURIComponent(gid)}`);
-        if (!response.ok) throw new Error(`Server error: ${response.status}`);
-
-        const serverGraph = await response.json();
+        const { ok, status, notModified, data: serverGraph } =
+            await fetchJSONIfChanged(`${SERVER_URL}/v1/graph?id=${encodeURIComponent(gid)}`);
+        const oldCount = merged_object?.nodes?.length || 0;
+        if (notModified) {
+            // Nothing changed on the server since the last reload
+            return { reloaded: false, added: 0, total: oldCount, nodeCount: oldCount };
+        }
+        if (!ok) throw new Error(`Server error: ${status}`);
 
         if (serverGraph?.nodes?.length > 0) {
-            const oldCount = merged_object?.nodes?.length || 0;
             merged_object = {
                 nodes: serverGraph.nodes,
                 relationships: serverGraph.relationships || []
             };
+            rememberSyncedGraph(gid, serverGraph, serverGraph.revision, serverGraph.created_at);
 
             const newCount = merged_object.nodes.length;
             if (newCount !== oldCount) {
@@ -443,21 +696,90 @@ async function reloadGraphFromServer() {
             }
 
             renderGraph(merged_object);
-            return { reloaded: true, nodeCount: newCount };
+            return { reloaded: true, added: Math.max(0, newCount - oldCount), total: newCount, nodeCount: newCount };
         }
 
-        return { reloaded: false, nodeCount: merged_object?.nodes?.length || 0 };
+        return { reloaded: false, added: 0, total: oldCount, nodeCount: oldCount };
     } catch (e) {
         console.warn('Failed to reload from server:', e.message);
         return null;
     }
 }
 
-// Legacy aliases for compatibility
-async function syncToServer() {
-    return saveGraph({});
+async function pullFromServer() {
+    // Apply what changed on the server since the last synced revision; falls back
+    // to a full reload if there is none or the server's changelog no longer reaches it
+    const gid = currentGraphId || 'default';
+    if (syncState?.graphId !== gid || !merged_object) return reloadGraphFromServer();
+
+    try {
+        const response = await fetch(
+            `${SERVER_URL}/v1/graph/changes?id=${encodeURIComponent(gid)}&since=${syncState.revision}`);
+        if (!response.ok) throw new Error(`Server error: ${response.status}`);
+        const changes = await response.json();
+        if (changes.reset || changes.created_at !== syncState.createdAt) return reloadGraphFromServer();
+
+        const nodes = merged_object.nodes || [];
+        const relationships = merged_object.relationships || [];
+        let added = 0, updated = 0, removed = 0;
+
+        const removedNodes = new Set(changes.removed_nodes.map(nodeSyncKey));
+        const nodeUpserts = new Map(changes.nodes.map(node => [nodeSyncKey(node.id), node]));
+        const keptNodes = [];
+        for (const node of nodes) {
+            const key = nodeSyncKey(node.id);
+            if (nodeUpserts.has(key)) {
+                keptNodes.push(nodeUpserts.get(key));
+                nodeUpserts.delete(key);
+                updated++;
+            } else if (removedNodes.has(key)) {
+                removed++;
+            } else {
+                keptNodes.push(node);
+            }
+        }
+        keptNodes.push(...nodeUpserts.values());
+        added = nodeUpserts.size;
+
+        const removedRels = new Set(changes.removed_relationships.map(edge => JSON.stringify(edge)));
+        const relUpserts = new Map(changes.relationships.map(rel => [JSON.stringify(relSyncKey(rel)), rel]));
+        const keptRels = [];
+        for (const rel of relationships) {
+            const key = JSON.stringify(relSyncKey(rel));
+            if (relUpserts.has(key)) {
+                keptRels.push(relUpserts.get(key));
+                relUpserts.delete(key);
+            } else if (!removedRels.has(key)) {
+                keptRels.push(rel);
+            }
+        }
+        keptRels.push(...relUpserts.values());
+
+        // The server's version is now the synced one
+        for (const key of removedNodes) syncState.nodes.delete(key);
+        for (const node of changes.nodes) {
+            syncState.nodes.set(nodeSyncKey(node.id), { id: node.id, node, json: JSON.stringify(node) });
+        }
+        for (const key of removedRels) syncState.relationships.delete(key);
+        for (const rel of changes.relationships) {
+            const edge = relSyncKey(rel);
+            syncState.relationships.set(JSON.stringify(edge), { edge, rel, json: JSON.stringify(rel) });
+        }
+        const changed = syncState.revision !== changes.revision;
+        syncState.revision = changes.revision;
+
+        if (changed) {
+            merged_object = { ...merged_object, nodes: keptNodes, relationships: keptRels };
+            renderGraph(merged_object);
+        }
+        return { reloaded: changed, added, updated, removed, total: keptNodes.length, nodeCount: keptNodes.length };
+    } catch (e) {
+        console.warn('Failed to pull changes from server:', e.message);
+        return null;
+    }
 }
 
-async function pullFromServer() {
-    return reloadGraphFromServer();
+// Legacy alias for compatibility
+async function syncToServer() {
+    return saveGraph({});
 }
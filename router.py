@@ -0,0 +1,151 @@
+"""Route table for the HTTP handler: precompiled paths, typed query parameters, middleware."""
+
+import json
+import re
+from functools import partial
+from urllib.parse import unquote
+
+# {name} matches one path segment, {name:path} the rest of the path
+_PARAM_RE = re.compile(r'\{(\w+)(?::(path))?\}')
+
+
+class BadRequest(ValueError):
+    """A query parameter could not be parsed; answered with 400."""
+
+
+def int_list(value):
+    """Comma-separated integers, e.g. fan_out=25,10."""
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def flag(value):
+    """A boolean switch, e.g. follow=1 (1/0, true/false, yes/no, on/off)."""
+    value = value.lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError("expected 1 or 0")
+
+
+def json_value(value):
+    """A JSON document, e.g. params={"status": "failed"}."""
+    return json.loads(value)
+
+
+def parse_query(query_string):
+    """Split a query string into a dict of URL-decoded values (last one wins)."""
+    params = {}
+    if query_string:
+        for part in query_string.split('&'):
+            if '=' in part:
+                k, v = part.split('=', 1)
+                params[k] = unquote(v)
+    return params
+
+
+def _compile(pattern):
+    """Regex for a path pattern with {param} placeholders, or None if it has none."""
+    if '{' not in pattern:
+        return None
+    regex, pos = '', 0
+    for match in _PARAM_RE.finditer(pattern):
+        regex += re.escape(pattern[pos:match.start()])
+        regex += f"(?P<{match.group(1)}>{'.+' if match.group(2) else '[^/]+'})"
+        pos = match.end()
+    return re.compile(regex + re.escape(pattern[pos:]) + '$')
+
+
+class Route:
+    """One endpoint: method, path pattern, handler function and its options.
+
+    query maps parameter names to a parser (int, float, int_list,
+    json_value or any callable raising ValueError); parsed values replace
+    the strings in the params dict handed to fn. Other keyword options
+    (e.g. etag, compress, pool) are read by middleware.
+    """
+
+    def __init__(self, method, pattern, fn, query=None, **options):
+        self.method = method
+        self.pattern = pattern
+        self.fn = fn
+        self.query = query or {}
+        self.options = options
+        self.regex = _compile(pattern)
+        self.name = f"{method} {pattern}"
+
+    def parse(self, params):
+        for key, parser in self.query.items():
+            if params.get(key) == '':
+                # ?limit= means the same as leaving limit out
+                del params[key]
+            elif key in params:
+                try:
+                    params[key] = parser(params[key])
+                except ValueError as e:
+                    raise BadRequest(f"Invalid {key} parameter {params[key]!r}: {e}")
+        return params
+
+
+class Router:
+    """Maps (method, path) to routes and runs them through middleware.
+
+    Paths without parameters are found with one dict lookup; patterned
+    paths are tried in registration order after that.
+    """
+
+    def __init__(self):
+        self._static = {}    # (method, path) -> Route
+        self._dynamic = {}   # method -> [Route, ...]
+        self.middleware = []
+
+    def add(self, method, pattern, fn, query=None, **options):
+        route = Route(method, pattern, fn, query, **options)
+        if route.regex is None:
+            self._static[(method, pattern)] = route
+        else:
+            self._dynamic.setdefault(method, []).append(route)
+        return route
+
+    def route(self, method, pattern, query=None, **options):
+        """Decorator registering fn(handler, params) for method and pattern."""
+        def register(fn):
+            self.add(method, pattern, fn, query, **options)
+            return fn
+        return register
+
+    def use(self, middleware):
+        """Add middleware(handler, route, params, call_next); the first added runs outermost."""
+        self.middleware.append(middleware)
+        return middleware
+
+    def match(self, method, path):
+        """(route, path params) for a request, or (None, None)."""
+        route = self._static.get((method, path))
+        if route is not None:
+            return route, {}
+        for route in self._dynamic.get(method, ()):
+            match = route.regex.match(path)
+            if match:
+                return route, match.groupdict()
+        return None, None
+
+    def dispatch(self, handler, method, target, not_found):
+        """Run the route for a request target ('/path?query').
+
+        Path parameters are added to the query params. Calls
+        not_found() if nothing matches and raises BadRequest for bad
+        query parameters.
+        """
+        path, _, query_string = target.partition('?')
+        path = path.split('#', 1)[0]
+        route, path_params = self.match(method, path)
+        if route is None:
+            return not_found()
+        params = parse_query(query_string)
+        params.update((k, unquote(v)) for k, v in path_params.items())
+        route.parse(params)
+        call = partial(route.fn, handler, params)
+        for middleware in reversed(self.middleware):
+            call = partial(middleware, handler, route, params, call)
+        return call()
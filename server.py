@@ -4,20 +4,34 @@ Claude Code API server for gpt-graph.
 Uses local Claude account (no API key needed - uses `claude login` credentials).
 """
 
+import os
+import sys
 from http.server import HTTPServer
 from socketserver import ThreadingMixIn
 
+from async_server import CLAUDE_WORKERS, REQUEST_WORKERS, AsyncServer
 from graphs import GRAPHS_DIR
 from handler import CORSRequestHandler
 
+# 'async' (one event loop, bounded worker pools) or 'threaded' (a thread per connection)
+SERVER_MODE = os.environ.get('GPT_GRAPH_SERVER', 'async')
+
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
 
 
-def run_server(port=8765):
-    server = ThreadedHTTPServer(('localhost', port), CORSRequestHandler)
+def run_server(port=8765, mode=None):
+    mode = mode or ('threaded' if '--threaded' in sys.argv[1:] else SERVER_MODE)
+    if mode == 'threaded':
+        server = ThreadedHTTPServer(('localhost', port), CORSRequestHandler)
+    else:
+        server = AsyncServer('localhost', port)
     print(f"Claude Code API server running on http://localhost:{port}")
+    if mode == 'threaded':
+        print("Threaded mode: one thread per connection")
+    else:
+        print(f"asyncio mode: {REQUEST_WORKERS} request threads, {CLAUDE_WORKERS} for Claude calls")
     print("Using local Claude account (no API key needed)")
     print("\nEndpoints (all graph endpoints accept ?id=<graph_id>):")
     print(f"  POST http://localhost:{port}/v1/completions      - Text completions")
@@ -26,13 +40,22 @@ def run_server(port=8765):
     print(f"  GET  http://localhost:{port}/v1/graphs           - List all graphs")
     print(f"  GET  http://localhost:{port}/v1/graph?id=ID      - Get full graph state")
     print(f"  GET  http://localhost:{port}/v1/graph/summary    - Get graph summary (node/rel counts)")
-    print(f"  GET  http://localhost:{port}/v1/graph/search?q=  - Search nodes by name")
+    print(f"  GET  http://localhost:{port}/v1/graph/search?q=  - Ranked node search")
+    print(f"  GET  http://localhost:{port}/v1/graph/similar?q= - Top-k nodes by embedding similarity")
     print(f"  GET  http://localhost:{port}/v1/graph/node?name= - Get node + neighbors (depth=N)")
     print(f"  GET  http://localhost:{port}/v1/graph/relations  - Get nodes by relation to node")
+    print(f"  GET  http://localhost:{port}/v1/graph/nodes?type= - Filter nodes by type and property values")
     print(f"  GET  http://localhost:{port}/v1/graph/labels     - List all node/relation types")
     print(f"  GET  http://localhost:{port}/v1/graph/traverse   - Traverse from node")
+    print(f"  GET  http://localhost:{port}/v1/graph/path       - Shortest path between nodes")
+    print(f"  GET  http://localhost:{port}/v1/graph/paths      - All paths up to k hops")
+    print(f"  GET  http://localhost:{port}/v1/graph/neighborhood - k-hop subgraph around a node")
+    print(f"  GET  http://localhost:{port}/v1/graph/query?q=   - MATCH ... RETURN pattern query (also POST)")
     print(f"  POST http://localhost:{port}/v1/graph?id=ID      - Save graph state")
     print(f"  POST http://localhost:{port}/v1/graph/merge      - Merge new nodes")
+    print(f"  POST http://localhost:{port}/v1/graph/delta      - Save changes since a revision")
+    print(f"  GET  http://localhost:{port}/v1/graph/changes?since= - Changes since a revision")
+    print(f"  POST http://localhost:{port}/v1/graph/batch      - Many graph queries in one request")
     print(f"  GET  http://localhost:{port}/v1/agent/graphs     - List agent graphs")
     print(f"  GET  http://localhost:{port}/v1/agent/graph      - Get agent graph")
     print(f"  POST http://localhost:{port}/v1/agent/graph      - Save agent graph")
@@ -45,6 +68,7 @@ def run_server(port=8765):
     print(f"  GET  http://localhost:{port}/v1/loop/actions     - Loop action history")
     print(f"  GET  http://localhost:{port}/v1/loop/stream      - SSE activity stream")
     print(f"  GET  http://localhost:{port}/health")
+    print(f"  GET  http://localhost:{port}/v1/metrics         - Per-route request timings")
     print(f"\nGraph storage: {GRAPHS_DIR}")
     print(f"Project directory: ~/claude-projects/")
     print("\nPress Ctrl+C to stop")
@@ -0,0 +1,191 @@
+"""Server-sent event hub: per-client bounded queues, event ids and replay.
+
+Events are published under a topic (a workspace for /v1/loop/stream, a
+task id for /v1/tasks/<id>/stream) and go to the subscribers of that topic.
+publish() never touches a socket. It formats the event once, appends it to
+a short history and queues it for every matching subscriber; each
+subscriber's own writer (the request thread, or a coroutine under
+async_server.py) sends it. Events with a coalesce key replace the one
+still queued under that key, so a slow client gets the latest status
+rather than every intermediate one. A client whose queue still overflows
+is dropped; its EventSource reconnects with Last-Event-ID and the missed
+events are replayed from history, or it is told to resync (and sent a
+fresh snapshot) if they are gone.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Events queued per client before it is considered too slow and dropped
+CLIENT_QUEUE_SIZE = int(os.environ.get('GPT_GRAPH_SSE_QUEUE', '256'))
+# Recent events kept for Last-Event-ID replay
+HISTORY_SIZE = int(os.environ.get('GPT_GRAPH_SSE_HISTORY', '1024'))
+# Seconds between keepalive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+def format_event(event_type, data, event_id=None):
+    """Encode one event in the text/event-stream format."""
+    head = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{head}event: {event_type}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def parse_event_id(value):
+    """A Last-Event-ID header or query value as an int, or None."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+class Subscriber:
+    """One stream client: a bounded queue of encoded events and a wake-up hook.
+
+    wake is called (from the publishing thread) whenever events are queued;
+    by default it sets a threading.Event that get() waits on. Writers stop
+    once closed is set and there is nothing left to send.
+    """
+
+    def __init__(self, topic=None, queue_size=None):
+        self.topic = topic
+        self.queue_size = queue_size or CLIENT_QUEUE_SIZE
+        self.closed = False
+        self.ending = False
+        # Id of the last event published before this client subscribed
+        self.start_id = None
+        self._pending = OrderedDict()  # coalesce key (or event id) -> bytes
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.wake = self._ready.set
+
+    def matches(self, topic):
+        return topic is None or self.topic is None or topic == self.topic
+
+    def push(self, key, data):
+        """Queue data; returns False if the client had to be dropped."""
+        with self._lock:
+            if self.closed:
+                return False
+            if key in self._pending:
+                # Move to the end so events still go out in id order
+                del self._pending[key]
+            elif len(self._pending) >= self.queue_size:
+                self.closed = True
+                self._pending.clear()
+            if not self.closed:
+                self._pending[key] = data
+        self.wake()
+        return not self.closed
+
+    def drain(self):
+        """Take every queued event, oldest first."""
+        with self._lock:
+            self._ready.clear()
+            events = list(self._pending.values())
+            self._pending.clear()
+            if self.ending:
+                self.closed = True
+        return events
+
+    def get(self, timeout):
+        """Wait up to timeout seconds for events and take them ([] on timeout)."""
+        self._ready.wait(timeout)
+        return self.drain()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._pending.clear()
+        self.wake()
+
+    def end(self):
+        """Close once the events already queued have been taken."""
+        with self._lock:
+            self.ending = True
+        self.wake()
+
+
+class EventHub:
+    """Fan events out to subscribers without blocking the publisher."""
+
+    def __init__(self, history_size=None):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._history = deque(maxlen=history_size or HISTORY_SIZE)  # (id, topic, key, bytes)
+        # Millisecond clock start, so ids from before a restart are never mistaken for new ones
+        self.last_id = int(time.time() * 1000)
+
+    def publish(self, event_type, data, topic=None, coalesce=None):
+        """Queue an event for subscribers of topic (None: every subscriber).
+
+        coalesce is a key under which a newer event replaces an older one
+        that a client has not been sent yet.
+        """
+        with self._lock:
+            self.last_id += 1
+            event_id = self.last_id
+            encoded = format_event(event_type, data, event_id)
+            key = coalesce if coalesce is not None else event_id
+            self._history.append((event_id, topic, key, encoded))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.matches(topic) and not subscriber.push(key, encoded):
+                print(f"Dropped slow event stream client ({subscriber.topic or 'all events'})")
+                self.unsubscribe(subscriber)
+        return event_id
+
+    def subscribe(self, topic=None, last_event_id=None):
+        """Register a subscriber and return (subscriber, replayed events).
+
+        Replayed events are the ones after last_event_id. The list is None
+        when there is nothing to resume from: no last_event_id, or one
+        whose successors are no longer all in history. Such a client
+        needs a snapshot of the current state (see snapshot()).
+        """
+        subscriber = Subscriber(topic)
+        replay = None
+        with self._lock:
+            subscriber.start_id = self.last_id
+            oldest = self._history[0][0] if self._history else self.last_id + 1
+            if last_event_id is not None and oldest - 1 <= last_event_id <= self.last_id:
+                replay = [encoded for event_id, event_topic, _, encoded in self._history
+                          if event_id > last_event_id and subscriber.matches(event_topic)]
+            self._subscribers.append(subscriber)
+        return subscriber, replay
+
+    @staticmethod
+    def snapshot(subscriber, event_type, data, last_event_id=None):
+        """Encode the state a new subscriber starts from.
+
+        Carries the subscriber's start id, so a later reconnect resumes
+        right after it. Preceded by a 'resync' event when the client asked
+        to resume (last_event_id) but could not, telling it to reload
+        anything else it shows.
+        """
+        encoded = format_event(event_type, data, subscriber.start_id)
+        if last_event_id is not None:
+            encoded = format_event('resync', {'last_event_id': subscriber.start_id}) + encoded
+        return encoded
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def end_topic(self, topic):
+        """Let the subscribers of topic finish sending what is queued, then close them."""
+        with self._lock:
+            ending = [s for s in self._subscribers if s.topic == topic]
+            self._subscribers = [s for s in self._subscribers if s.topic != topic]
+        for subscriber in ending:
+            subscriber.end()
+
+    def client_count(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -0,0 +1,148 @@
+"""Bounded, prioritised execution of Claude tasks.
+
+At most `limit` jobs run at once, each on a thread of its own. Waiting
+jobs start highest priority first: interactive chat, then thinking loop
+iterations, then batch work such as grounding. Within a priority the
+workspaces with waiting jobs take turns, so a workspace that queues many
+tasks does not hold up the others.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+# Claude tasks running at once; the rest wait in the queue
+MAX_RUNNING = int(os.environ.get('GPT_GRAPH_MAX_TASKS', '3'))
+# Task priorities, most urgent first
+PRIORITIES = ('chat', 'loop', 'batch')
+
+
+class TaskCancelled(RuntimeError):
+    """The task was cancelled before it finished."""
+
+
+class Job:
+    """A submitted function and, once it has run, its result or exception."""
+
+    def __init__(self, job_id, fn, priority, workspace):
+        self.id = job_id
+        self.fn = fn
+        self.priority = priority
+        self.workspace = workspace
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the job has run (or was cancelled) and return its result."""
+        self.done.wait(timeout)
+        if self.cancelled:
+            raise TaskCancelled(f"Task {self.id} was cancelled")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TaskScheduler:
+    """Run jobs on at most `limit` threads in priority and workspace order.
+
+    on_change(started, positions) is called, with the scheduler's lock
+    held, whenever the queue changes: started lists the ids of jobs about
+    to start, positions maps every waiting job's id to its 1-based place
+    in the order the jobs will start.
+    """
+
+    def __init__(self, limit=None, on_change=None):
+        self.limit = limit or MAX_RUNNING
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        # priority -> workspace -> waiting jobs; the first workspace goes next
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._queued = {}   # job id -> Job
+        self._running = {}  # job id -> Job
+
+    def submit(self, job_id, fn, priority='chat', workspace='default'):
+        """Queue fn() to run as job_id and return its Job; raises ValueError for an unknown priority."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r} (expected one of {', '.join(PRIORITIES)})")
+        job = Job(job_id, fn, priority, workspace)
+        with self._lock:
+            self._queues[priority].setdefault(workspace, deque()).append(job)
+            self._queued[job_id] = job
+            self._dispatch()
+        return job
+
+    def cancel(self, job_id):
+        """Take a job out of the queue; returns it, or None if it is not waiting (it may be running)."""
+        with self._lock:
+            job = self._queued.pop(job_id, None)
+            if job is None:
+                return None
+            waiting = self._queues[job.priority][job.workspace]
+            waiting.remove(job)
+            if not waiting:
+                del self._queues[job.priority][job.workspace]
+            job.cancelled = True
+            self._report([])
+        job.done.set()
+        return job
+
+    def is_running(self, job_id):
+        with self._lock:
+            return job_id in self._running
+
+    def stats(self):
+        with self._lock:
+            return {'running': len(self._running), 'queued': len(self._queued), 'limit': self.limit}
+
+    def _positions(self):
+        """{job id: place in the start order} for the waiting jobs (lock held)."""
+        order = []
+        for priority in PRIORITIES:
+            waiting = list(self._queues[priority].values())
+            for i in range(max(map(len, waiting), default=0)):
+                order.extend(jobs[i] for jobs in waiting if i < len(jobs))
+        return {job.id: n for n, job in enumerate(order, 1)}
+
+    def _next(self):
+        """Take the job that goes next (lock held), or None."""
+        for priority in PRIORITIES:
+            queues = self._queues[priority]
+            if queues:
+                workspace, waiting = queues.popitem(last=False)
+                job = waiting.popleft()
+                if waiting:
+                    # Back of the line: the other workspaces go first
+                    queues[workspace] = waiting
+                return job
+        return None
+
+    def _dispatch(self):
+        """Start waiting jobs while fewer than limit are running (lock held)."""
+        started = []
+        while len(self._running) < self.limit:
+            job = self._next()
+            if job is None:
+                break
+            del self._queued[job.id]
+            self._running[job.id] = job
+            started.append(job)
+        self._report([job.id for job in started])
+        for job in started:
+            threading.Thread(target=self._run, args=(job,), name=f"task-{job.id}", daemon=True).start()
+
+    def _report(self, started):
+        if self.on_change is not None:
+            self.on_change(started, self._positions())
+
+    def _run(self, job):
+        try:
+            job.result = job.fn()
+        except Exception as e:
+            job.error = e
+        finally:
+            with self._lock:
+                del self._running[job.id]
+                self._dispatch()
+            job.done.set()
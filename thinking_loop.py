@@ -8,7 +8,8 @@ import time
 import uuid
 
 from graphs import AGENT_GRAPHS_DIR, list_graphs, load_graph_state, save_graph_state, delete_graph, merge_into_graph
-from claude_task import active_tasks, execute_claude_task
+from claude_task import active_tasks, cancel_task, run_task
+from task_scheduler import TaskCancelled
 
 LOOP_DIR = os.path.expanduser("~/.gpt-graph")
 LOOPS_DIR = os.path.join(LOOP_DIR, "loops")
@@ -317,6 +318,8 @@ GRAPH API (curl localhost:8765) — workspace: {self.workspace}
 - POST /v1/agent/graph?workspace={self.workspace}&id=X       → save/overwrite graph X
 - POST /v1/agent/graph/merge?workspace={self.workspace}&id=X → merge nodes into graph X
 - DELETE /v1/agent/graph?workspace={self.workspace}&id=X     → delete graph X
+- POST /v1/graph/batch  {{"workspace": "{self.workspace}", "graph": "X", "queries": [{{"op": "search", "q": "..."}}, {{"op": "node", "name": "...", "depth": 2}}]}}
+                                                           → many lookups in one call (ops: search, similar, nodes, node, relations, traverse, path, paths, neighborhood, query, labels, summary; "graph" per query to mix graphs)
 
 Graph JSON format: {{"title": "...", "description": "...", "nodes": [...], "relationships": [...]}}
 
@@ -358,6 +361,9 @@ GUIDELINES:
         if not self.running:
             return {"error": "Loop not running"}
         self.running = False
+        # Stop the iteration in progress too, rather than letting it run to the end
+        if self.current_task_id:
+            cancel_task(self.current_task_id)
         self._log_action('stop', 'Loop stopped by user')
         self._broadcast_sse('status', {'running': False, 'iteration': self.iteration})
         return {"status": "stopped"}
@@ -398,22 +404,25 @@ GUIDELINES:
             self.current_task_id = task_id
             active_tasks[task_id] = {
                 'id': task_id,
-                'status': 'starting',
+                'status': 'queued',
+                'priority': 'loop',
                 'prompt': full_prompt[:200] + '...',
                 'working_dir': None,
                 'graph_id': 'loop',
                 'workspace': self.workspace,
                 'created_at': time.time(),
                 'last_output': '',
-                'output_lines': 0
+                'output_lines': 0,
+                'revision': 0
             }
 
             try:
-                result = execute_claude_task(
+                result = run_task(
                     full_prompt,
                     working_dir=None,
                     model="claude-opus-4-6",
-                    task_id=task_id
+                    task_id=task_id,
+                    priority='loop'
                 )
                 response = result.get('response', '')
                 exit_code = result.get('exit_code', -1)
@@ -424,6 +433,8 @@ GUIDELINES:
                     'response_length': len(response),
                     'response_preview': response[:300]
                 })
+            except TaskCancelled:
+                self._log_action('iteration_cancelled', f'Iteration {self.iteration} cancelled')
             except Exception as e:
                 self._log_action('iteration_error', str(e))
                 self._broadcast_sse('error', {